@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'common.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -163,6 +164,10 @@ ELASTICSEARCH_DSL = {
         'hosts': f'http://{config("ELASTICSEARCH_DSL_HOST")}:9200',
     },
 }
+# Сигналы моделей только ставят id товаров в очередь, в ES их отправляет products.tasks.index_queued_products
+ELASTICSEARCH_DSL_SIGNAL_PROCESSOR = 'products.indexing.QueuedSignalProcessor'
+SEARCH_INDEXING_INTERVAL = config('SEARCH_INDEXING_INTERVAL', default=0.5, cast=float)
+SEARCH_INDEXING_BATCH_SIZE = config('SEARCH_INDEXING_BATCH_SIZE', default=500, cast=int)
 
 CACHES = {
     "default": {
@@ -170,6 +175,24 @@ CACHES = {
         "LOCATION": config('CACHES_LOCATION'),
     }
 }
+# common.cache.cache_response: версии пространств имён сбрасываются сигналами моделей
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=60 * 5, cast=int)
+RESPONSE_CACHE_BROTLI = config('RESPONSE_CACHE_BROTLI', default=True, cast=bool)
+RESPONSE_CACHE_STALE_TTL = config('RESPONSE_CACHE_STALE_TTL', default=60 * 5, cast=int)
+RESPONSE_CACHE_REFRESH_AHEAD = config('RESPONSE_CACHE_REFRESH_AHEAD', default=30, cast=int)
+RESPONSE_CACHE_LOCK_TIMEOUT = config('RESPONSE_CACHE_LOCK_TIMEOUT', default=30, cast=int)
+# База Redis для счётчиков slug заказов: cache.clear() очищает только базу кэша (0),
+# база 1 занята брокером Celery
+COUNTERS_REDIS_DB = config('COUNTERS_REDIS_DB', default=2, cast=int)
+
+# Сколько секунд остатки неоплаченного заказа остаются за ним
+STOCK_RESERVATION_TTL = config('STOCK_RESERVATION_TTL', default=60 * 30, cast=int)
+
+# Сколько строк-шардов делят начисления на баланс магазина (комиссия площадки идёт с каждой оплаты)
+STORE_BALANCE_SHARDS = config('STORE_BALANCE_SHARDS', default=16, cast=int)
+
+# Максимум SQL-запросов на запрос к API в режиме разработки, 0 отключает проверку
+QUERY_BUDGET = config('QUERY_BUDGET', default=50 if DEBUG else 0, cast=int)
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -237,6 +260,23 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'products.tasks.send_daily_offer_email',
         'schedule': crontab(minute=0, hour=18)
     },
+    'index_queued_products': {
+        'task': 'products.tasks.index_queued_products',
+        'schedule': SEARCH_INDEXING_INTERVAL,
+        'options': {'expires': SEARCH_INDEXING_INTERVAL * 10},
+    },
+    'sync_product_stats_to_index': {
+        'task': 'products.tasks.sync_product_stats_to_index',
+        'schedule': crontab(),
+    },
+    'release_expired_stock_reservations': {
+        'task': 'orders.tasks.release_expired_stock_reservations',
+        'schedule': crontab(),
+    },
+    'compact_store_balance_shards': {
+        'task': 'stores.tasks.compact_store_balance_shards',
+        'schedule': crontab(),
+    },
 }
 
 # Yookassa
@@ -0,0 +1,150 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.base import SessionBase
+from django.db.models import Count, Q
+from elasticsearch_dsl import Search
+from elasticsearch_dsl.response import Response as SearchResponse
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from cards.models import Card
+from cart.cart import Cart
+from cart.models import CartItem
+from common.serializers import ProductSerializer
+from orders.models import Order, OrderItem
+from orders.views import OrderCreateView, create_order_payment
+from products.models import Product
+from stores.models import Store
+from stores.tasks import update_full_order_status
+from stores.views import StoreProductListView
+
+from .suite import BenchmarkError, benchmark
+
+
+User = get_user_model()
+factory = APIRequestFactory()
+
+
+def get_products(count):
+    '''Active products that can be ordered count times over'''
+    products = list(Product.objects.filter(is_active=True).filter(
+        Q(in_stock__isnull=True) | Q(in_stock__gte=100)).order_by('pk')[:count])
+    if len(products) < count:
+        raise BenchmarkError(f'Need {count} orderable products, run with a larger --products')
+    return products
+
+
+def get_customer():
+    '''Customer with the address and card generate_dataset gives every user'''
+    customer = User.objects.filter(addresses__isnull=False, cards__isnull=False, store__isnull=True).first()
+    if customer is None:
+        raise BenchmarkError('No customer with an address and a card')
+    Card.objects.filter(user=customer).update(balance=10 ** 9)
+    return customer
+
+
+def create_order(customer, products):
+    address, card = customer.addresses.first(), customer.cards.first()
+    order = Order.objects.create(
+        customer=customer, name='Benchmark', phone_number='79990000000', email=customer.email,
+        address=address, card=card, status=1,
+        total_order_price=sum(product.get_real_price() for product in products),
+    )
+    for product in products:
+        OrderItem.objects.create(order=order, product=product, price=product.get_real_price(), status=1)
+    return order
+
+
+@benchmark('product_serializer', params=(20, 1000))
+def product_serializer(count):
+    products = list(Product.objects.for_cards()[:count])
+    if len(products) < count:
+        raise BenchmarkError(f'Need {count} products, run with a larger --products')
+    context = {'request': Request(factory.get('/api/products/'))}
+    return lambda: ProductSerializer(products, many=True, context=context).data
+
+
+@benchmark('cart_get_cart_items', params=(1, 10, 50))
+def cart_get_cart_items(count):
+    request = SimpleNamespace(session=SessionBase())
+    cart = Cart(request)
+    for product in get_products(count):
+        cart.add(product)
+    return lambda: Cart(request).get_cart_items()
+
+
+@benchmark('order_create_post', params=(1, 10, 50), rollback=True)
+def order_create_post(count):
+    customer = get_customer()
+    CartItem.objects.filter(user=customer).delete()
+    CartItem.objects.bulk_create(CartItem(user=customer, product=product) for product in get_products(count))
+    data = {
+        'name': 'Benchmark', 'phone_number': '79990000000',
+        'address': customer.addresses.first().pk, 'card': customer.cards.first().pk,
+    }
+    view = OrderCreateView.as_view()
+
+    def run():
+        request = factory.post('/api/orders/create/', data, format='json')
+        force_authenticate(request, customer)
+        # Уведомления уходят в Celery и в замер не входят
+        with mock.patch('orders.views.send_order_created_notifications.delay'):
+            response = view(request)
+        if response.status_code != 201:
+            raise BenchmarkError(f'Order was not created: {response.data}')
+
+    return run
+
+
+@benchmark('create_order_payment', params=(1, 10), rollback=True)
+def order_payment(count):
+    if not Store.objects.filter(pk=1).exists():
+        raise BenchmarkError('create_order_payment needs the marketplace store with id 1')
+    customer = get_customer()
+    order = create_order(customer, get_products(count))
+
+    def run():
+        request = factory.post(f'/api/orders/{order.pk}/payment-create/')
+        force_authenticate(request, customer)
+        with mock.patch('orders.views.send_order_paid_notifications.delay'):
+            response = create_order_payment(request, order.pk)
+        if response.status_code >= 400:
+            raise BenchmarkError(f'Payment failed: {response.data}')
+
+    return run
+
+
+@benchmark('update_full_order_status', params=(1, 10), rollback=True)
+def full_order_status(count):
+    order = create_order(get_customer(), get_products(count))
+    OrderItem.objects.filter(order=order).update(status=3)
+    return lambda: update_full_order_status(order.pk)
+
+
+@benchmark('store_product_list_queryset')
+def store_product_list_queryset(param):
+    store = Store.objects.annotate(products_count=Count('store_products')).order_by('-products_count').first()
+    if store is None:
+        raise BenchmarkError('No stores')
+    product_ids = sorted(store.store_products.values_list('pk', flat=True))
+
+    def execute(search):
+        # Elasticsearch не входит в замер: поиск находит все товары магазина, страницами после search_after
+        body = search.to_dict()
+        after = body.get('search_after', [0])[0]
+        ids = [pk for pk in product_ids if pk > after][:body['size']]
+        return SearchResponse(search, {'hits': {'total': {'value': len(product_ids), 'relation': 'eq'}, 'hits': [
+            {'_id': str(pk), '_score': None, 'sort': [pk]} for pk in ids
+        ]}})
+
+    request = Request(factory.get('/', {'q': 'product'}))
+    view = StoreProductListView(request=request, format_kwarg=None, kwargs={'slug': store.slug})
+    view.store = store
+
+    def run():
+        with mock.patch.object(Search, 'execute', autospec=True, side_effect=execute):
+            return list(view.get_queryset())
+
+    return run
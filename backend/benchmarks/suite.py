@@ -0,0 +1,81 @@
+import statistics
+import time
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+BENCHMARKS = {}
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class Benchmark:
+    '''
+    prepare(param) does the untimed setup and returns the function to time.
+    With rollback=True every call runs in a savepoint that is rolled back, so calls that
+    change data (checkout, payment) start from the same state.
+    '''
+    def __init__(self, name, prepare, params=(None,), rollback=False):
+        self.name = name
+        self.prepare = prepare
+        self.params = params
+        self.rollback = rollback
+
+    def get_names(self):
+        return [self.get_name(param) for param in self.params]
+
+    def get_name(self, param):
+        return self.name if param is None else f'{self.name}[{param}]'
+
+    def call(self, func):
+        if not self.rollback:
+            return func()
+        with transaction.atomic():
+            result = func()
+            transaction.set_rollback(True)
+        return result
+
+    def run(self, param, number, repeat):
+        '''Timings in ms per call: best, median and spread of repeat rounds of number calls'''
+        func = self.prepare(param)
+
+        # Прогрев: кэши планов сериализаторов, соединение, проверка результата
+        with CaptureQueriesContext(connection) as queries:
+            self.call(func)
+
+        rounds = []
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            for _ in range(number):
+                self.call(func)
+            rounds.append((time.perf_counter() - started_at) / number * 1000)
+
+        return {
+            'min_ms': round(min(rounds), 4),
+            'median_ms': round(statistics.median(rounds), 4),
+            'mean_ms': round(statistics.mean(rounds), 4),
+            'stdev_ms': round(statistics.stdev(rounds), 4) if len(rounds) > 1 else 0.0,
+            'queries': len(queries),
+            'number': number,
+            'repeat': repeat,
+        }
+
+
+def benchmark(name, params=(None,), rollback=False):
+    '''Registers prepare(param) as a benchmark'''
+    def decorator(prepare):
+        BENCHMARKS[name] = Benchmark(name, prepare, params, rollback)
+        return prepare
+    return decorator
+
+
+def compare(results, baseline):
+    '''Median ratio against a previous run, > 1 means slower'''
+    return {
+        name: round(result['median_ms'] / baseline[name]['median_ms'], 3)
+        for name, result in results.items()
+        if name in baseline and baseline[name]['median_ms']
+    }
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.5 on 2026-10-18 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0007_alter_card_options_alter_transaction_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['card', '-timestamp', '-id'], name='transaction_card_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['related_seller', '-timestamp', '-id'], name='transaction_seller_keyset_idx'),
+        ),
+    ]
@@ -58,3 +58,8 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        # Keyset-пагинация истории транзакций пользователя и магазина
+        indexes = [
+            models.Index(fields=['card', '-timestamp', '-id'], name='transaction_card_keyset_idx'),
+            models.Index(fields=['related_seller', '-timestamp', '-id'], name='transaction_seller_keyset_idx'),
+        ]
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from common.compiled_serializers import CompiledListSerializer
 from common.serializers import UserSimpleSerializer, StoreSimpleSerializer
 
 from .models import Card, Transaction
@@ -45,6 +46,7 @@ class TransactionListSerializer(serializers.ModelSerializer):
 
 	class Meta:
 		model = Transaction
+		list_serializer_class = CompiledListSerializer
 		fields = ('id', 'uuid', 'card', 'transaction_type', 'amount', 
 				  'timestamp', 'status', 'related_order',)
 
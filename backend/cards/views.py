@@ -13,6 +13,8 @@ from rest_framework.decorators import api_view, permission_classes
 from django_filters.rest_framework import DjangoFilterBackend
 from yookassa import Configuration, Payment
 
+from common.eager_loading import EagerLoadingMixin
+from common.pagination import KeysetPagination
 from common.serializers import CardListSerializer
 
 from .serializers import (
@@ -38,7 +40,7 @@ class CardCreateView(generics.CreateAPIView):
         serializer.save(user=user)
 
 
-class CardListView(generics.ListAPIView):
+class CardListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = CardListSerializer
     permission_classes = (IsAuthenticated,)
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
@@ -48,7 +50,7 @@ class CardListView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return Card.objects.select_related('user').filter(user=user)
+        return Card.objects.filter(user=user)
 
 
 class CardDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -69,7 +71,8 @@ class CardDetailView(generics.RetrieveUpdateDestroyAPIView):
         order_by = self.request.query_params.get('ordering', '-timestamp')
         ordering = order_by if order_by in self.ordering_fields else '-timestamp'
         return Card.objects.select_related('user').prefetch_related(
-            Prefetch('card_transactions', queryset=Transaction.objects.filter(**filters).order_by(ordering))).all()
+            Prefetch('card_transactions', queryset=Transaction.objects.select_related('related_order').filter(
+                **filters).order_by(ordering))).all()
 
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
@@ -86,18 +89,22 @@ class CardDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Response(serializer.data)
 
 
-class TransactionDetailView(generics.RetrieveAPIView):
+class TransactionDetailView(EagerLoadingMixin, generics.RetrieveAPIView):
     serializer_class = TransactionDetailSerializer
     permission_classes = (CanSeeTransaction,)
     lookup_field = 'uuid'
     queryset = Transaction.objects.select_related(
         'card__user', 'related_order',
         'related_order_item', 'related_seller').all()
+    # CanSeeTransaction
+    extra_eager_loading = ('card__user',)
 
 
-class TransactionListView(generics.ListAPIView):
+class TransactionListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = TransactionListSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-timestamp', '-id')
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
     ordering = ['-timestamp']
     filterset_fields = {
@@ -113,8 +120,7 @@ class TransactionListView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return Transaction.objects.select_related(
-            'card__user').filter(card__user=user)
+        return Transaction.objects.filter(card__user=user)
 
 
 @api_view(['POST'])
@@ -1,5 +1,4 @@
 from .models import Product
-from django.db.models import Count, Avg, Sum
 
 
 class Cart(object):
@@ -51,13 +50,8 @@ class Cart(object):
     def get_cart_items(self):
         # Получить список словарей каждого товара из корзины пользоветаля
         product_ids = self.cart.keys()
-        products = Product.objects.annotate(
-                reviews_count=Count('reviews', distinct=True),
-                average_score=Avg('reviews__score'),
-                total_ordered_quantity=Sum('ordered_products__quantity')
-            ).prefetch_related('reviews', 'product_images'
-            ).select_related('seller', 'cosplay_character__fandom'
-            ).filter(is_active=True, id__in=product_ids)
+        # Карточки товаров сериализуются из кэша фрагментов, здесь нужны только цены
+        products = Product.objects.filter(is_active=True, id__in=product_ids)
 
         for product in products:
             self.cart[str(product.id)]['product'] = product
@@ -74,13 +68,8 @@ class Cart(object):
     
     def __iter__(self):
         product_ids = self.cart.keys()
-        products = Product.objects.annotate(
-                reviews_count=Count('reviews', distinct=True),
-                average_score=Avg('reviews__score'),
-                total_ordered_quantity=Sum('ordered_products__quantity')
-            ).prefetch_related('reviews', 'product_images'
-            ).select_related('seller', 'cosplay_character__fandom'
-            ).filter(is_active=True, id__in=product_ids)
+        # Карточки товаров сериализуются из кэша фрагментов, здесь нужны только цены
+        products = Product.objects.filter(is_active=True, id__in=product_ids)
         
         for product in products:
             self.cart[str(product.id)]['product'] = product
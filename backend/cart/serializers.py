@@ -1,19 +1,19 @@
 from rest_framework import serializers
 
-from common.serializers import ProductSerializer
+from products.fragments import ProductCardField
 
 from .models import CartItem
 
 
 class CartItemSerializer(serializers.Serializer):
-	product = ProductSerializer(many=False, read_only=True)
+	product = ProductCardField()
 	quantity = serializers.IntegerField()
 	price = serializers.IntegerField()
 	total_price = serializers.IntegerField()
 
 
 class CartItemAuthenticatedSerializer(serializers.Serializer):
-	product = ProductSerializer(many=False, read_only=True)
+	product = ProductCardField(source='product_id')
 	quantity = serializers.IntegerField()
 	price = serializers.SerializerMethodField()
 	total_price = serializers.SerializerMethodField()
@@ -1,10 +1,11 @@
 from django.shortcuts import get_object_or_404
-from django.db.models import Count, Avg, Prefetch, Sum
+from django.db.models import Prefetch
 
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 
+from products.fragments import get_product_cards_context
 from products.models import Product
 
 from .models import CartItem
@@ -84,21 +85,17 @@ def cart_list(request):
     user = request.user
 
     if user.is_authenticated:
+        # Для цены нужен только сам товар, карточки берутся из кэша фрагментов
         cart_items = CartItem.objects.prefetch_related(
-            Prefetch('product', queryset=Product.objects.annotate(
-                reviews_count=Count('reviews', distinct=True),
-                average_score=Avg('reviews__score'),
-                total_ordered_quantity=Sum('ordered_products__quantity')
-            ).prefetch_related('reviews', 'product_images'
-            ).select_related('seller', 'cosplay_character__fandom'
-            ).filter(is_active=True))).filter(user=user)
+            Prefetch('product', queryset=Product.objects.filter(is_active=True))).filter(user=user)
 
         cart_length = sum(item.quantity for item in cart_items)
         total_cart_price = sum(item.get_total_price() for item in cart_items)
 
         data = {
             'cart_length': cart_length,
-            'cart_items': CartItemAuthenticatedSerializer(cart_items, many=True).data,
+            'cart_items': CartItemAuthenticatedSerializer(cart_items, many=True, context=get_product_cards_context(
+                request, [item.product_id for item in cart_items])).data,
             'total_cart_price': total_cart_price
         }
     else:
@@ -109,7 +106,8 @@ def cart_list(request):
 
         data = {
             'cart_length': cart_length,
-            'cart_items': CartItemSerializer(cart_items, many=True).data,
+            'cart_items': CartItemSerializer(cart_items, many=True, context=get_product_cards_context(
+                request, [item['product'].id for item in cart_items])).data,
             'total_cart_price': total_cart_price
         }
         
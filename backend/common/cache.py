@@ -0,0 +1,189 @@
+import hashlib
+import logging
+import random
+import time
+from functools import wraps
+from io import BytesIO
+from urllib.parse import urlencode
+
+import brotli
+from kombu.exceptions import OperationalError
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+
+from backend.celery import app
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_VERSION_KEY = 'response-cache:version:{}'
+RESPONSE_CACHE_KEY = 'response-cache:{}'
+RESPONSE_CACHE_LOCK_KEY = 'response-cache:lock:{}'
+# Небольшие ответы не сжимаются: выигрыш меньше затрат на распаковку
+BROTLI_MIN_SIZE = 1024
+
+
+def get_namespace_versions(namespaces):
+    '''Current version counters of the cache namespaces'''
+    keys = {namespace: RESPONSE_CACHE_VERSION_KEY.format(namespace) for namespace in namespaces}
+    versions = cache.get_many(keys.values())
+
+    for namespace, key in keys.items():
+        if key not in versions:
+            # Начальное значение от времени, чтобы после вытеснения счётчика не вернуть старую версию
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+
+    return [versions[keys[namespace]] for namespace in namespaces]
+
+
+def bump_namespaces(*namespaces):
+    '''Invalidates every cached response of the namespaces after the transaction commits'''
+    def bump():
+        for namespace in namespaces:
+            key = RESPONSE_CACHE_VERSION_KEY.format(namespace)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, int(time.time() * 1000), None)
+
+    transaction.on_commit(bump)
+
+
+def get_response_cache_key(request):
+    query_params = sorted(
+        (key, value) for key, values in request.GET.lists()
+        for value in values if value != ''
+    )
+    raw_key = '|'.join([
+        request.get_host(), request.path, urlencode(query_params),
+        request.headers.get('Accept', ''),
+    ])
+    return RESPONSE_CACHE_KEY.format(hashlib.md5(raw_key.encode()).hexdigest())
+
+
+def get_cached_response(request, entry):
+    content, encoding = entry['content'], entry['encoding']
+    if encoding == 'br' and 'br' not in request.headers.get('Accept-Encoding', ''):
+        content, encoding = brotli.decompress(content), None
+
+    response = HttpResponse(content, content_type=entry['content_type'])
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+def get_request_data(request):
+    '''What get_response_cache_key() and the view read from a GET request, to rebuild it in Celery'''
+    return {
+        'path': request.path, 'query_string': request.META.get('QUERY_STRING', ''),
+        'host': request.get_host(), 'scheme': request.scheme, 'accept': request.headers.get('Accept', ''),
+    }
+
+
+def build_request(path, query_string, host, scheme, accept):
+    '''Anonymous GET request for recomputing a cached response outside of the request cycle'''
+    server_name, _, server_port = host.partition(':')
+    return WSGIRequest({
+        'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': query_string,
+        'HTTP_HOST': host, 'HTTP_ACCEPT': accept, 'SERVER_NAME': server_name,
+        'SERVER_PORT': server_port or ('443' if scheme == 'https' else '80'),
+        'wsgi.url_scheme': scheme, 'wsgi.input': BytesIO(),
+    })
+
+
+def store_response(response, cache_key, versions, timeout):
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+
+    content_type = response.get('Content-Type', '')
+    if response.status_code == 200 and content_type.startswith('application/json'):
+        content, encoding = response.content, None
+        if settings.RESPONSE_CACHE_BROTLI and len(content) >= BROTLI_MIN_SIZE:
+            content, encoding = brotli.compress(content, quality=5), 'br'
+        # Разброс времени жизни, чтобы ключи не истекали одновременно
+        fresh_for = timeout * random.uniform(0.9, 1.1)
+        entry = {
+            'content': content, 'content_type': content_type, 'encoding': encoding,
+            'versions': versions, 'expires_at': time.time() + fresh_for,
+        }
+        cache.set(cache_key, entry, int(fresh_for + settings.RESPONSE_CACHE_STALE_TTL))
+    return response
+
+
+def schedule_refresh(view_path, request, kwargs, namespaces, timeout, lock_key):
+    try:
+        refresh_cached_response.delay(view_path, kwargs, get_request_data(request), namespaces, timeout)
+    except OperationalError:
+        # Брокер недоступен: запись пересчитает первый запрос после истечения
+        logger.warning('Could not schedule response cache refresh for %s', request.path)
+        cache.delete(lock_key)
+
+
+def cache_response(*namespaces, timeout=None):
+    '''
+    Caches rendered JSON responses of GET requests until they expire or one of the namespaces is bumped.
+    Stores the final bytes (optionally Brotli-compressed), so hits skip the view entirely.
+    Wraps views made by View.as_view(), Celery rebuilds them by the class path to refresh entries.
+
+    Only one worker recomputes an outdated entry (single-flight lock), the others keep serving
+    the stale copy for RESPONSE_CACHE_STALE_TTL seconds. Without any copy they compute the response
+    themselves instead of waiting for the lock. Entries close to expiry are refreshed by Celery.
+    '''
+    timeout = timeout or settings.RESPONSE_CACHE_TIMEOUT
+
+    def decorator(view_func):
+        view_class = view_func.view_class
+        view_path = f'{view_class.__module__}.{view_class.__qualname__}'
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            cache_key = get_response_cache_key(request)
+            lock_key = RESPONSE_CACHE_LOCK_KEY.format(cache_key)
+            # Версии читаются до вычисления: сброс во время расчёта оставит запись устаревшей
+            versions = get_namespace_versions(namespaces)
+            entry = cache.get(cache_key)
+            is_valid = entry is not None and entry['versions'] == versions
+
+            if is_valid and entry['expires_at'] > time.time():
+                if (entry['expires_at'] - time.time() < settings.RESPONSE_CACHE_REFRESH_AHEAD
+                        and cache.add(lock_key, 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT)):
+                    schedule_refresh(view_path, request, kwargs, namespaces, timeout, lock_key)
+                response = get_cached_response(request, entry)
+            elif cache.add(lock_key, 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+                try:
+                    response = store_response(view_func(request, *args, **kwargs), cache_key, versions, timeout)
+                finally:
+                    cache.delete(lock_key)
+            elif entry is not None:
+                # Ключ пересчитывает другой воркер, пока отдаём устаревшую копию
+                response = get_cached_response(request, entry)
+            else:
+                # Копии нет совсем: считаем сами, а не держим воркер в ожидании блокировки
+                response = store_response(view_func(request, *args, **kwargs), cache_key, versions, timeout)
+
+            patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+@app.task
+def refresh_cached_response(view_path, kwargs, request_data, namespaces, timeout):
+    '''Recomputes a cached response before it expires'''
+    request = build_request(**request_data)
+    cache_key = get_response_cache_key(request)
+    try:
+        view = import_string(view_path).as_view()
+        store_response(view(request, **kwargs), cache_key, get_namespace_versions(namespaces), timeout)
+    finally:
+        cache.delete(RESPONSE_CACHE_LOCK_KEY.format(cache_key))
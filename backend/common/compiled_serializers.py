@@ -0,0 +1,225 @@
+import copy
+from collections import OrderedDict
+
+from django.db import models
+from rest_framework import serializers
+from rest_framework.fields import SkipField, is_simple_callable
+from rest_framework.relations import (
+    HyperlinkedIdentityField, HyperlinkedRelatedField, ManyRelatedField, PKOnlyObject, RelatedField
+)
+from rest_framework.settings import api_settings
+
+
+# Поля, у которых to_representation сводится к приведению типа
+FAST_CONVERTERS = {
+    serializers.CharField: str,
+    serializers.SlugField: str,
+    serializers.IntegerField: int,
+}
+# Встроенные поля DRF, результат которых не зависит от контекста сериализатора
+CONTEXT_FREE_MODULES = ('rest_framework.fields', 'rest_framework.relations')
+
+PLAIN_SERIALIZER_KWARGS = {'instance', 'data', 'context', 'partial', 'read_only'}
+# common.sparse_fields.SparseFieldsetSerializerMixin
+SPARSE_FIELDSET_KWARGS = ('fields', 'omit')
+
+# Планы сериализаторов по классу и выборке полей: поля ModelSerializer строятся один раз на процесс, а не на запрос
+_plans = {}
+MAX_PLANS = 512
+
+
+class UnsupportedField(Exception):
+    pass
+
+
+def build_getter(field):
+    # Связанные поля и составные source читаются штатно: там PKOnlyObject и обход цепочки атрибутов
+    if field.source == '*' or len(field.source_attrs) != 1 or isinstance(field, RelatedField):
+        return field.get_attribute
+
+    attr = field.source_attrs[0]
+
+    def getter(instance):
+        try:
+            value = getattr(instance, attr)
+        except (AttributeError, KeyError):
+            return field.get_attribute(instance)
+        if is_simple_callable(value):
+            value = value()
+        return value
+
+    return getter
+
+
+def is_default_representation(serializer):
+    if isinstance(serializer, serializers.ListSerializer):
+        return type(serializer).to_representation in (serializers.ListSerializer.to_representation,
+                                                      CompiledListSerializer.to_representation)
+    return type(serializer).to_representation is serializers.Serializer.to_representation
+
+
+class SerializerPlan:
+    '''
+    Precomputed accessors and converters of a read-only serializer.
+    bind() turns the plan into a plain function producing the same data as to_representation
+    for the given context.
+    '''
+    def __init__(self, serializer):
+        if not is_default_representation(serializer):
+            raise UnsupportedField(type(serializer).__name__)
+
+        self.serializer = serializer
+        self.has_methods = False
+        self.steps = []
+        for field in serializer._readable_fields:
+            self.steps.append((field.field_name, build_getter(field)) + self.build_converter(field))
+        self.memo_key = (type(serializer), tuple(step[0] for step in self.steps))
+
+    def build_converter(self, field):
+        if isinstance(field, serializers.ListSerializer):
+            if not is_default_representation(field):
+                raise UnsupportedField(type(field).__name__)
+            return 'many', SerializerPlan(field.child)
+        if isinstance(field, serializers.BaseSerializer):
+            return 'nested', SerializerPlan(field)
+        if isinstance(field, serializers.SerializerMethodField):
+            self.has_methods = True
+            return 'method', field.method_name
+        if isinstance(field, serializers.FileField):
+            return 'file', field
+        if hasattr(field, 'compile_representation'):
+            # Поле само строит конвертер под контекст ответа (products.fragments.ProductCardField)
+            return 'compiled', field
+        if (type(field).__module__ not in CONTEXT_FREE_MODULES
+                or isinstance(field, (HyperlinkedRelatedField, HyperlinkedIdentityField))
+                or (isinstance(field, ManyRelatedField)
+                    and isinstance(field.child_relation, HyperlinkedRelatedField))):
+            raise UnsupportedField(type(field).__name__)
+        return 'value', FAST_CONVERTERS.get(type(field), field.to_representation)
+
+    def bind(self, context, serializer=None, memo=None):
+        '''
+        memo is an identity map shared by all nested serializers of one response:
+        an object repeated across the page (seller, character, fandom) is serialized once.
+        '''
+        if memo is None:
+            memo = {}
+        if serializer is None and self.has_methods:
+            # Методы вложенного сериализатора видят контекст текущего запроса, как в DRF
+            serializer = copy.copy(self.serializer)
+            serializer.parent = None
+            serializer._context = context
+
+        steps = []
+        for field_name, getter, kind, payload in self.steps:
+            if kind == 'many':
+                child = payload.bind(context, memo=memo)
+                converter = lambda data, child=child: [
+                    child(item) for item in (data.all() if isinstance(data, models.Manager) else data)
+                ]
+            elif kind == 'nested':
+                converter = memoize(payload.bind(context, memo=memo), payload.memo_key, memo)
+            elif kind == 'method':
+                converter = getattr(serializer, payload)
+            elif kind == 'file':
+                converter = bind_file_converter(payload, context, memo)
+            elif kind == 'compiled':
+                converter = payload.compile_representation(context)
+            else:
+                converter = payload
+            steps.append((field_name, getter, converter))
+
+        def to_representation(instance):
+            ret = OrderedDict()
+            for field_name, getter, converter in steps:
+                try:
+                    attribute = getter(instance)
+                except SkipField:
+                    continue
+
+                check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+                ret[field_name] = None if check_for_none is None else converter(attribute)
+            return ret
+
+        return to_representation
+
+
+def memoize(converter, memo_key, memo):
+    def memoized(instance):
+        pk = getattr(instance, 'pk', None)
+        if pk is None:
+            return converter(instance)
+
+        key = (memo_key, pk)
+        if key not in memo:
+            memo[key] = converter(instance)
+        return memo[key]
+
+    return memoized
+
+
+def bind_file_converter(field, context, memo):
+    '''Same output as FileField.to_representation with the request taken from the context'''
+    request = context.get('request', None)
+    use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+
+    def converter(value):
+        if not value:
+            return None
+        if not use_url:
+            return value.name
+
+        key = ('file', id(value.storage), value.name)
+        if key not in memo:
+            try:
+                url = value.url
+            except AttributeError:
+                url = None
+            if url is not None and request is not None:
+                url = request.build_absolute_uri(url)
+            memo[key] = url
+        return memo[key]
+
+    return converter
+
+
+def get_plan(serializer):
+    # Сериализаторы с другими аргументами (source, required и т.п.) могут отличаться набором полей
+    if len(serializer._args) > 1 or set(serializer._kwargs) - PLAIN_SERIALIZER_KWARGS - set(SPARSE_FIELDSET_KWARGS):
+        return SerializerPlan(serializer)
+
+    # Выборка полей (?fields=/?omit=) входит в ключ плана
+    sparse_kwargs = {key: serializer._kwargs[key] for key in SPARSE_FIELDSET_KWARGS if key in serializer._kwargs}
+    plan_key = (type(serializer),) + tuple(sorted(sparse_kwargs.items()))
+    if plan_key not in _plans and len(_plans) >= MAX_PLANS:
+        # Произвольные выборки из query params не должны раздувать кэш планов
+        return SerializerPlan(serializer)
+    if plan_key not in _plans:
+        try:
+            _plans[plan_key] = SerializerPlan(type(serializer)(**sparse_kwargs))
+        except UnsupportedField:
+            _plans[plan_key] = None
+
+    if _plans[plan_key] is None:
+        raise UnsupportedField(type(serializer).__name__)
+    return _plans[plan_key]
+
+
+def compile_serializer(serializer):
+    '''
+    Builds a plain function returning the same data as serializer.to_representation.
+    Serializers with custom to_representation or fields depending on the context are left as is.
+    '''
+    try:
+        plan = get_plan(serializer)
+    except UnsupportedField:
+        return serializer.to_representation
+    return plan.bind(serializer.context, serializer)
+
+
+class CompiledListSerializer(serializers.ListSerializer):
+    '''Read path of many=True serializers through compile_serializer'''
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        to_representation = compile_serializer(self.child)
+        return [to_representation(item) for item in iterable]
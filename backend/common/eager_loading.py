@@ -0,0 +1,189 @@
+import logging
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+
+from .compiled_serializers import MAX_PLANS, PLAIN_SERIALIZER_KWARGS, SPARSE_FIELDSET_KWARGS
+
+
+logger = logging.getLogger(__name__)
+
+# Планы по классу сериализатора и выборке полей, как и у compiled_serializers
+_plans = {}
+_warned = set()
+
+
+class EagerLoadingPlan:
+    '''select_related and prefetch_related lookups needed to serialize a model without extra queries'''
+    def __init__(self, select_related=(), prefetch_related=()):
+        self.select_related = set(select_related)
+        self.prefetch_related = set(prefetch_related)
+
+    @property
+    def paths(self):
+        return self.select_related | self.prefetch_related
+
+    def uses(self, path):
+        '''True if the relation path or a longer path through it is loaded by the plan'''
+        return any(planned == path or planned.startswith(path + '__') for planned in self.paths)
+
+
+def add_relation_path(plan, model, attrs, prefix='', in_prefetch=False, pk_only=False):
+    '''
+    Adds the relations along attrs to the plan: forward FK and one-to-one go to select_related,
+    reverse FK and M2M (and everything below them) to prefetch_related.
+    Returns the model, path and prefetch flag reached, or None if attrs leave the relations.
+    '''
+    current_model, path, to_prefetch = model, prefix, in_prefetch
+    for index, attr in enumerate(attrs):
+        try:
+            model_field = current_model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            # Свойства, методы и аннотации модели
+            return None
+        if not model_field.is_relation or attr == getattr(model_field, 'attname', None) != model_field.name:
+            return None
+        if pk_only and index == len(attrs) - 1:
+            # Достаточно значения внешнего ключа
+            return None
+
+        to_prefetch = to_prefetch or model_field.one_to_many or model_field.many_to_many
+        path = f'{path}__{attr}' if path else attr
+        (plan.prefetch_related if to_prefetch else plan.select_related).add(path)
+        current_model = model_field.related_model
+    return current_model, path, to_prefetch
+
+
+def build_plan(serializer, model, plan=None, prefix='', in_prefetch=False):
+    '''
+    Walks the readable fields of the serializer along model relations, nested serializers included.
+    Method fields and annotations declare the relations they read in Meta.eager_loading.
+    '''
+    if plan is None:
+        plan = EagerLoadingPlan()
+
+    hints = getattr(getattr(serializer, 'Meta', None), 'eager_loading', {})
+    for field in serializer._readable_fields:
+        for lookup in hints.get(field.field_name, ()):
+            add_relation_path(plan, model, lookup.split('__'), prefix, in_prefetch)
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if field.source == '*':
+            if isinstance(nested, serializers.BaseSerializer):
+                build_plan(nested, model, plan, prefix, in_prefetch)
+            continue
+
+        reached = add_relation_path(plan, model, field.source_attrs, prefix, in_prefetch,
+                                    pk_only=isinstance(field, PrimaryKeyRelatedField))
+        if reached is not None and reached[1] != prefix and isinstance(nested, serializers.BaseSerializer):
+            nested_model, path, to_prefetch = reached
+            build_plan(nested, nested_model, plan, path, to_prefetch)
+
+    return plan
+
+
+def get_eager_loading_plan(serializer):
+    '''Cached plan of a ModelSerializer instance, None for serializers without a model'''
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None:
+        return None
+
+    kwargs = serializer._kwargs
+    if set(kwargs) - PLAIN_SERIALIZER_KWARGS - set(SPARSE_FIELDSET_KWARGS):
+        return build_plan(serializer, model)
+
+    sparse_kwargs = {key: kwargs[key] for key in SPARSE_FIELDSET_KWARGS if key in kwargs}
+    plan_key = (type(serializer),) + tuple(sorted(sparse_kwargs.items()))
+    if plan_key not in _plans:
+        if len(_plans) >= MAX_PLANS:
+            return build_plan(serializer, model)
+        _plans[plan_key] = build_plan(type(serializer)(**sparse_kwargs), model)
+    return _plans[plan_key]
+
+
+def get_manual_lookups(queryset):
+    '''Relation paths already loaded by select_related()/prefetch_related() of the queryset'''
+    paths = []
+    for lookup in queryset._prefetch_related_lookups:
+        paths.append(lookup.prefetch_through if isinstance(lookup, Prefetch) else lookup)
+
+    def walk(tree, prefix=''):
+        for name, subtree in tree.items():
+            path = f'{prefix}__{name}' if prefix else name
+            paths.append(path)
+            walk(subtree, path)
+
+    if isinstance(queryset.query.select_related, dict):
+        walk(queryset.query.select_related)
+    return paths
+
+
+def apply_eager_loading(queryset, plan):
+    '''Adds the lookups of the plan that the queryset does not load yet'''
+    manual = get_manual_lookups(queryset)
+    manual_prefetches = get_manual_lookups(queryset.select_related(None))
+
+    def is_loaded(path):
+        return any(loaded == path or loaded.startswith(path + '__') for loaded in manual)
+
+    def is_prefetched_through(path):
+        return any(path.startswith(prefetched + '__') for prefetched in manual_prefetches)
+
+    select_related, prefetch_related = [], []
+    for path in plan.select_related:
+        if not is_loaded(path):
+            # Связь уже загружается через prefetch, JOIN к ней не поможет
+            (prefetch_related if is_prefetched_through(path) else select_related).append(path)
+    prefetch_related += [path for path in plan.prefetch_related if not is_loaded(path)]
+    select_related, prefetch_related = sorted(select_related), sorted(prefetch_related)
+    if select_related and queryset.query.select_related is not True:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+class EagerLoadingMixin:
+    '''
+    Adds the select_related/prefetch_related the view's serializer needs to the queryset of
+    list() and get_object(), whatever get_queryset() returns.
+    Relations loaded by hand but never serialized are logged once per view, the ones used
+    elsewhere (permissions) are listed in extra_eager_loading.
+    '''
+    extra_eager_loading = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        plan = get_eager_loading_plan(self.get_eager_loading_serializer())
+        if plan is None:
+            return queryset
+
+        self.warn_unused_eager_loading(queryset, plan)
+        return apply_eager_loading(queryset, plan)
+
+    def get_eager_loading_serializer(self):
+        '''Serializer without data, with the same sparse fieldset as the response'''
+        kwargs = {}
+        if hasattr(self, 'get_sparse_fieldset'):
+            include, omit = self.get_sparse_fieldset()
+            if include is not None:
+                kwargs['fields'] = include
+            if omit:
+                kwargs['omit'] = omit
+        return self.get_serializer_class()(**kwargs)
+
+    def warn_unused_eager_loading(self, queryset, plan):
+        unused = [
+            path for path in get_manual_lookups(queryset)
+            if not plan.uses(path) and not any(
+                extra == path or extra.startswith(path + '__') or path.startswith(extra + '__')
+                for extra in self.extra_eager_loading
+            )
+        ]
+        key = (type(self), tuple(unused))
+        if unused and key not in _warned:
+            _warned.add(key)
+            logger.warning('%s loads relations its serializer never uses: %s',
+                           type(self).__name__, ', '.join(unused))
@@ -0,0 +1,54 @@
+import timeit
+from unittest import mock
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from common.compiled_serializers import CompiledListSerializer
+from common.serializers import ProductSerializer
+
+
+Product = apps.get_model('products', 'Product')
+
+
+class Command(BaseCommand):
+    help = 'Compare the compiled list serializer with the DRF one on a page of products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=20, help='Products per page')
+        parser.add_argument('--number', type=int, default=200, help='Serializations per measurement')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        products = list(Product.objects.with_stats().select_related(
+            'seller', 'cosplay_character__fandom'
+        ).prefetch_related('product_images')[:options['count']])
+        if not products:
+            raise CommandError('No products to serialize, run initialize_db or generate_dataset first')
+
+        context = {'request': Request(RequestFactory().get('/api/products/'))}
+        renderer = JSONRenderer()
+
+        def compiled():
+            return renderer.render(ProductSerializer(products, many=True, context=context).data)
+
+        def drf():
+            # Вложенные many=True сериализаторы тоже возвращаются к обычному пути DRF
+            with mock.patch.object(CompiledListSerializer, 'to_representation',
+                                   serializers.ListSerializer.to_representation):
+                return renderer.render(ProductSerializer(products, many=True, context=context).data)
+
+        if compiled() != drf():
+            raise CommandError('Compiled serializer output differs from ProductSerializer')
+
+        results = {}
+        for name, func in (('drf', drf), ('compiled', compiled)):
+            best = min(timeit.repeat(func, number=options['number'], repeat=options['repeat']))
+            results[name] = best / options['number'] * 1000
+            self.stdout.write(f'{name:>8}: {results[name]:.3f} ms per page of {len(products)} products')
+
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {results["drf"] / results["compiled"]:.2f}x'))
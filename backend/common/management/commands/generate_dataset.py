@@ -0,0 +1,370 @@
+import argparse
+import itertools
+import random
+import time
+from bisect import bisect_left
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils.text import slugify
+
+from fandoms.models import FANDOM_TYPE_CHOICES
+from orders.payment import Ledger
+from orders.slugs import order_item_slugs, order_slugs
+from products.models import PRODUCT_SIZE_CHOICES, PRODUCT_TYPE_CHOICES, SHOES_SIZE_CHOICES
+from products.stats import refresh_product_stats
+
+
+User = get_user_model()
+Address = apps.get_model('users', 'Address')
+Store = apps.get_model('stores', 'Store')
+Employee = apps.get_model('stores', 'Employee')
+Fandom = apps.get_model('fandoms', 'Fandom')
+Character = apps.get_model('fandoms', 'Character')
+Product = apps.get_model('products', 'Product')
+ProductImage = apps.get_model('products', 'ProductImage')
+Review = apps.get_model('products', 'Review')
+Answer = apps.get_model('products', 'Answer')
+Card = apps.get_model('cards', 'Card')
+Transaction = apps.get_model('cards', 'Transaction')
+Order = apps.get_model('orders', 'Order')
+OrderItem = apps.get_model('orders', 'OrderItem')
+Favorite = apps.get_model('favorites', 'Favorite')
+CartItem = apps.get_model('cart', 'CartItem')
+
+SUFFIXES = {'k': 10 ** 3, 'm': 10 ** 6}
+# Распределение оценок отзывов на маркетплейсах смещено к пятёркам
+SCORE_WEIGHTS = (5, 4, 8, 20, 63)
+
+
+def parse_count(value):
+    '''"500", "100k", "2M" -> int'''
+    value = value.strip().lower()
+    multiplier = SUFFIXES.get(value[-1:], 1)
+    try:
+        count = int(float(value[:-1] if multiplier > 1 else value) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid count: {value}')
+    if count < 0:
+        raise argparse.ArgumentTypeError(f'Invalid count: {value}')
+    return count
+
+
+def scatter(number, digits):
+    '''
+    Bijection of 0..10**digits-1 onto itself: unique random-looking slugs without
+    keeping the generated ones in memory, as long as the numbers are unique.
+    '''
+    modulus = 10 ** digits
+    return f'{(number * 387420489 + 104729) % modulus:0{digits}d}'
+
+
+class WeightedSampler:
+    '''rng.choices() with cumulative weights computed once for millions of draws'''
+    def __init__(self, rng, population, weights):
+        self.rng = rng
+        self.population = population
+        self.cum_weights = list(itertools.accumulate(weights))
+
+    def __call__(self):
+        point = self.rng.random() * self.cum_weights[-1]
+        return self.population[bisect_left(self.cum_weights, point)]
+
+    def sample(self, count):
+        '''Up to count distinct items, popular ones first'''
+        picked = {}
+        for _ in range(count * 3):
+            item = self()
+            picked[item] = None
+            if len(picked) == count:
+                break
+        return list(picked)
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic dataset for load tests and benchmarks with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=parse_count, default=1000, help='Number of users, accepts 100k, 2M')
+        parser.add_argument('--stores', type=parse_count, help='Number of stores, users / 50 by default')
+        parser.add_argument('--fandoms', type=parse_count, default=50)
+        parser.add_argument('--characters', type=parse_count, default=1000)
+        parser.add_argument('--products', type=parse_count, default=5000)
+        parser.add_argument('--orders', type=parse_count, default=10000)
+        parser.add_argument('--reviews', type=parse_count, help='Number of reviews, products * 2 by default')
+        parser.add_argument('--favorites', type=parse_count, help='Favorite products, users * 5 by default')
+        parser.add_argument('--cart-items', type=parse_count, help='Cart items, users by default')
+        parser.add_argument('--seed', type=int, default=42, help='Same seed and sizes give the same dataset')
+        parser.add_argument('--zipf', type=float, default=1.1, help='Exponent of the products popularity')
+        parser.add_argument('--pareto', type=float, default=1.2, help='Shape of the sellers catalogue sizes')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--index', action='store_true', help='Rebuild the Elasticsearch index afterwards')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        users_count = options['users']
+        stores_count = options['stores'] if options['stores'] is not None else max(users_count // 50, 1)
+        if stores_count > users_count:
+            raise CommandError('Every store needs its own owner, --stores cannot exceed --users')
+        if options['products'] and not (stores_count and options['characters'] and options['fandoms']):
+            raise CommandError('Products need at least one store, character and fandom')
+        if options['orders'] and not (users_count and options['products']):
+            raise CommandError('Orders need at least one user and product')
+
+        started_at = time.monotonic()
+        user_ids = self.create_users(users_count)
+        store_ids = self.create_stores(user_ids[:stores_count])
+        character_ids = self.create_characters(options['fandoms'], options['characters'])
+        products = self.create_products(options['products'], store_ids, character_ids, options['pareto'])
+
+        # Популярность по закону Ципфа: ранг товара случаен, вес 1 / rank^s
+        product_ids = list(products)
+        self.rng.shuffle(product_ids)
+        popular_products = WeightedSampler(
+            self.rng, product_ids, [1 / rank ** options['zipf'] for rank in range(1, len(product_ids) + 1)])
+        # Небольшая доля покупателей делает большую часть заказов
+        active_users = WeightedSampler(
+            self.rng, user_ids, [1 / rank ** 0.8 for rank in range(1, len(user_ids) + 1)])
+
+        cards = self.create_addresses_and_cards(user_ids)
+        self.create_reviews(
+            options['reviews'] if options['reviews'] is not None else options['products'] * 2,
+            user_ids, popular_products, store_ids, products)
+        self.create_user_products(
+            Favorite, options['favorites'] if options['favorites'] is not None else users_count * 5,
+            active_users, popular_products)
+        self.create_user_products(
+            CartItem, options['cart_items'] if options['cart_items'] is not None else users_count,
+            active_users, popular_products)
+        self.create_orders(options['orders'], active_users, cards, popular_products, products)
+
+        self.log('Product stats', refresh_product_stats(batch_size=self.batch_size))
+        if options['index']:
+            call_command('reindex_products', stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(f'Dataset generated in {time.monotonic() - started_at:.1f}s'))
+
+    def log(self, name, count):
+        self.stdout.write(f'{name}: {count}')
+
+    def bulk_create(self, model, objects):
+        '''Inserts objects from any iterable in batches, one transaction per batch'''
+        created = []
+        iterator = iter(objects)
+        while batch := list(itertools.islice(iterator, self.batch_size)):
+            with transaction.atomic():
+                created += model.objects.bulk_create(batch)
+        return created
+
+    def next_number(self, model):
+        '''Numbers for unique names and slugs continue after the rows already in the table'''
+        return (model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0) + 1
+
+    def create_users(self, count):
+        # Хеширование пароля дорогое, у всех сгенерированных пользователей он один
+        password = make_password('password123')
+        start = self.next_number(User)
+        users = self.bulk_create(User, (
+            User(username=f'user{number}', email=f'user{number}@example.com', password=password)
+            for number in range(start, start + count)
+        ))
+        self.log('Users', len(users))
+        return [user.pk for user in users]
+
+    def create_stores(self, owner_ids):
+        start = self.next_number(Store)
+        stores = self.bulk_create(Store, (
+            Store(
+                owner_id=owner_id, name=f'Store {number}', slug=f'store-{number}',
+                organization_type=self.rng.choice(Store.ORGANIZATION_TYPE_CHOICES)[0],
+                organization_name=f'Store {number} LLC',
+                taxpayer_number=scatter(number, 10), check_number=scatter(number, 20),
+                is_verified=self.rng.random() < 0.3,
+            )
+            for number, owner_id in enumerate(owner_ids, start)
+        ))
+        # Store.save() добавляет владельца в сотрудники, bulk_create его не вызывает
+        self.bulk_create(Employee, (
+            Employee(user_id=store.owner_id, store_id=store.pk, is_owner=True, is_admin=True) for store in stores
+        ))
+        self.log('Stores', len(stores))
+        return [store.pk for store in stores]
+
+    def create_characters(self, fandoms_count, characters_count):
+        start = self.next_number(Fandom)
+        fandoms = self.bulk_create(Fandom, (
+            Fandom(name=f'Fandom {number}', slug=f'fandom-{number}',
+                   fandom_type=self.rng.choice(FANDOM_TYPE_CHOICES)[0])
+            for number in range(start, start + fandoms_count)
+        ))
+        if not fandoms:
+            return []
+
+        # Крупные фандомы собирают большую часть персонажей
+        fandom_sampler = WeightedSampler(
+            self.rng, [fandom.pk for fandom in fandoms], [1 / rank for rank in range(1, len(fandoms) + 1)])
+        start = self.next_number(Character)
+        characters = self.bulk_create(Character, (
+            Character(name=f'Character {number}', slug=f'character-{number}', fandom_id=fandom_sampler())
+            for number in range(start, start + characters_count)
+        ))
+        self.log('Fandoms', len(fandoms))
+        self.log('Characters', len(characters))
+        return [character.pk for character in characters]
+
+    def build_product(self, number, seller_id, character_id):
+        product_type = self.rng.choice(PRODUCT_TYPE_CHOICES)[0]
+        in_stock = self.rng.choice((None, 0, self.rng.randint(1, 200)))
+        title = f'{product_type} {number}'
+        return Product(
+            slug=f'{slugify(title)}-{scatter(number, 10)}',
+            seller_id=seller_id,
+            cosplay_character_id=character_id,
+            title=title,
+            description=f'Synthetic product {number}',
+            # Логнормальные цены: много дешёвых товаров и длинный хвост дорогих
+            price=max(int(self.rng.lognormvariate(8, 0.8)), 100),
+            discount=self.rng.choice((5, 10, 15, 20, 30, 50)) if self.rng.random() < 0.3 else None,
+            product_type=product_type,
+            size=self.rng.choice(PRODUCT_SIZE_CHOICES)[0] if product_type in ('Full Set', 'Clothes') else None,
+            shoes_size=self.rng.choice(SHOES_SIZE_CHOICES)[0] if product_type == 'Shoes' else None,
+            in_stock=in_stock,
+            # Как в Product.save()
+            is_active=in_stock != 0,
+        )
+
+    def create_products(self, count, store_ids, character_ids, pareto_shape):
+        '''Returns {product_id: (seller_id, real price)}, sellers catalogues follow a Pareto distribution'''
+        if not count:
+            return {}
+
+        sellers = WeightedSampler(self.rng, store_ids, [self.rng.paretovariate(pareto_shape) for _ in store_ids])
+        characters = WeightedSampler(
+            self.rng, character_ids, [1 / rank for rank in range(1, len(character_ids) + 1)])
+        start = self.next_number(Product)
+        created = self.bulk_create(Product, (
+            self.build_product(number, sellers(), characters()) for number in range(start, start + count)
+        ))
+        images = self.bulk_create(ProductImage, (
+            ProductImage(product_id=product.pk, image=f'product_images/product_{product.pk}/{index}.jpg')
+            for product in created for index in range(self.rng.randint(1, 4))
+        ))
+        self.log('Products', len(created))
+        self.log('Product images', len(images))
+        return {product.pk: (product.seller_id, product.get_real_price()) for product in created}
+
+    def create_addresses_and_cards(self, user_ids):
+        '''One address and card per user, returns {user_id: (address_id, card_id)}'''
+        addresses = self.bulk_create(Address, (
+            Address(user_id=user_id, name='Home', address=f'{self.rng.randint(1, 200)} Synthetic street, {user_id}')
+            for user_id in user_ids
+        ))
+        cards = self.bulk_create(Card, (
+            Card(user_id=user_id, name='Main', card_number=scatter(user_id, 16),
+                 balance=int(self.rng.expovariate(1 / 50000)))
+            for user_id in user_ids
+        ))
+        self.bulk_create(Transaction, (
+            Transaction(card_id=card.pk, transaction_type='Deposit', amount=card.balance)
+            for card in cards if card.balance
+        ))
+        self.log('Addresses and cards', len(cards))
+        return {address.user_id: (address.pk, card.pk) for address, card in zip(addresses, cards)}
+
+    def create_reviews(self, count, user_ids, popular_products, store_ids, products):
+        if not (count and user_ids and products):
+            return
+
+        reviews = self.bulk_create(Review, (
+            Review(customer_id=self.rng.choice(user_ids), product_id=popular_products(),
+                   score=self.rng.choices((1, 2, 3, 4, 5), SCORE_WEIGHTS)[0], text='Synthetic review')
+            for _ in range(count)
+        ))
+        # Продавцы отвечают примерно на каждый пятый отзыв, чаще на плохие
+        answers = self.bulk_create(Answer, (
+            Answer(review_id=review.pk, seller_id=products[review.product_id][0], text='Thank you!')
+            for review in reviews if self.rng.random() < (0.5 if review.score <= 2 else 0.15)
+        ))
+        self.log('Reviews', len(reviews))
+        self.log('Answers', len(answers))
+
+    def create_user_products(self, model, count, active_users, popular_products):
+        '''Favorites and cart items, unique per user and product'''
+        if not count or not popular_products.population:
+            return
+
+        pairs = {}
+        for _ in range(count * 2):
+            pairs[(active_users(), popular_products())] = None
+            if len(pairs) == count:
+                break
+        extra = {'quantity': 1} if model is CartItem else {}
+        created = self.bulk_create(model, (
+            model(user_id=user_id, product_id=product_id, **extra) for user_id, product_id in pairs
+        ))
+        self.log(model._meta.verbose_name_plural.capitalize(), len(created))
+
+    def create_orders(self, count, active_users, cards, popular_products, products):
+        '''
+        Orders with 1-5 items of popular products, paid ones with the Purchase, Sale and
+        Commission transactions create_order_payment() would have written.
+        '''
+        if not count:
+            return
+
+        created_orders = created_items = 0
+        for batch_start in range(0, count, self.batch_size):
+            orders, order_items = [], []
+            # Slug из тех же счётчиков, что и у заказов приложения, иначе они столкнутся позже
+            for slug in order_slugs.generate(min(self.batch_size, count - batch_start)):
+                user_id = active_users()
+                address_id, card_id = cards[user_id]
+                items = [
+                    (product_id, self.rng.choices((1, 2, 3), (80, 15, 5))[0])
+                    for product_id in popular_products.sample(self.rng.choices((1, 2, 3, 4, 5), (50, 25, 12, 8, 5))[0])
+                ]
+                status = self.rng.choices(('0', '1', '2', '3', '4'), (5, 10, 10, 15, 60))[0]
+                orders.append(Order(
+                    slug=slug, customer_id=user_id, name=f'user{user_id}',
+                    phone_number='79990000000', email=f'user{user_id}@example.com',
+                    address_id=address_id, card_id=card_id, status=status,
+                    total_order_price=sum(products[product_id][1] * quantity for product_id, quantity in items),
+                ))
+                order_items.append(items)
+
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                items = []
+                item_slugs = iter(order_item_slugs.generate(sum(len(order_products) for order_products in order_items)))
+                for order, order_products in zip(orders, order_items):
+                    for product_id, quantity in order_products:
+                        items.append(OrderItem(
+                            slug=next(item_slugs), order_id=order.pk, product_id=product_id,
+                            quantity=quantity, price=products[product_id][1], status=order.status,
+                        ))
+                OrderItem.objects.bulk_create(items)
+                Transaction.objects.bulk_create(self.build_order_transactions(orders, items, products))
+
+            created_orders += len(orders)
+            created_items += len(items)
+
+        self.log('Orders', created_orders)
+        self.log('Order items', created_items)
+
+    def build_order_transactions(self, orders, items, products):
+        # Проводки той же книги, что пишет оплата заказа; балансы магазинов набор не меняет
+        ledger = Ledger()
+        paid_orders = {order.pk for order in orders if order.status in ('2', '3', '4')}
+        for order in orders:
+            if order.pk in paid_orders:
+                ledger.purchase(order)
+        for item in items:
+            if item.order_id in paid_orders:
+                ledger.sale(item, products[item.product_id][0])
+        return ledger.transactions
@@ -0,0 +1,105 @@
+import json
+import platform
+import subprocess
+from io import StringIO
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from benchmarks import cases  # noqa: F401
+from benchmarks.suite import BENCHMARKS, BenchmarkError, compare
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time serializers, checkout, payment and store querysets in isolation and write the results to JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help=f'Benchmarks to run, all by default: {", ".join(BENCHMARKS)}')
+        parser.add_argument('--number', type=int, default=20, help='Calls per round')
+        parser.add_argument('--repeat', type=int, default=5, help='Rounds, the median and best are reported')
+        parser.add_argument('--output', help='JSON file for the results')
+        parser.add_argument('--compare', help='JSON of a previous run to compare the medians with')
+        parser.add_argument('--generate', action='store_true',
+                            help='Fill the database with generate_dataset first, everything is rolled back after the run')
+        parser.add_argument('--products', default='2000', help='generate_dataset --products for --generate')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f'Unknown benchmarks: {", ".join(sorted(unknown))}')
+        baseline = self.load_results(options['compare']) if options['compare'] else None
+
+        # Данные бенчмарков (и сгенерированный набор) никогда не остаются в базе
+        try:
+            with transaction.atomic():
+                if options['generate']:
+                    call_command('generate_dataset', '--users=500', f'--products={options["products"]}',
+                                 '--orders=1000', f'--seed={options["seed"]}', stdout=StringIO())
+                results = self.run_benchmarks(options['names'] or list(BENCHMARKS),
+                                              options['number'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'revision': self.get_revision(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'results': results,
+        }
+        if baseline is not None:
+            report['compared_with'] = options['compare']
+            report['ratios'] = compare(results, baseline['results'])
+            for name, ratio in report['ratios'].items():
+                style = self.style.ERROR if ratio > 1.1 else self.style.SUCCESS if ratio < 0.9 else str
+                self.stdout.write(style(f'{name}: {ratio:.2f}x of {options["compare"]}'))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def run_benchmarks(self, names, number, repeat):
+        results = {}
+        for name in names:
+            benchmark = BENCHMARKS[name]
+            for param in benchmark.params:
+                full_name = benchmark.get_name(param)
+                try:
+                    # Каждый бенчмарк готовит свои данные в точке сохранения
+                    with transaction.atomic():
+                        results[full_name] = benchmark.run(param, number, repeat)
+                        transaction.set_rollback(True)
+                except BenchmarkError as error:
+                    results[full_name] = {'error': str(error)}
+                    self.stdout.write(self.style.WARNING(f'{full_name}: skipped, {error}'))
+                    continue
+
+                result = results[full_name]
+                self.stdout.write(f'{full_name:>36}: median {result["median_ms"]:.3f} ms, '
+                                  f'min {result["min_ms"]:.3f} ms, {result["queries"]} queries')
+        return results
+
+    def load_results(self, path):
+        try:
+            with open(path) as results:
+                return json.load(results)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Cannot read {path}: {error}')
+
+    def get_revision(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,58 @@
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    '''connection.execute_wrapper() counting statements, repeated ones usually mean an N+1'''
+    def __init__(self):
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements[sql] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return sum(self.statements.values())
+
+
+class QueryBudgetMiddleware:
+    '''
+    Dev-mode guard: raises QueryBudgetExceeded when a request runs more SQL queries than
+    settings.QUERY_BUDGET (0 disables the check). Views may set their own query_budget.
+    '''
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGET:
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+
+        budget = getattr(request, 'query_budget', settings.QUERY_BUDGET)
+        if counter.count > budget:
+            sql, repeats = counter.statements.most_common(1)[0]
+            raise QueryBudgetExceeded(
+                f'{request.method} {request.path} ran {counter.count} queries, the budget is {budget}. '
+                f'Most repeated ({repeats}x): {sql}'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # as_view() DRF и Django сохраняют класс представления в атрибутах функции
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        budget = getattr(view_class, 'query_budget', None)
+        if budget is not None:
+            request.query_budget = budget
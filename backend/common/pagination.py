@@ -0,0 +1,110 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    '''
+    Page number pagination with opt-in keyset pagination.
+    When the request has a cursor param (empty for the first page), the queryset is ordered by
+    the view's keyset_ordering, e.g. ('-timestamp', '-id'), and filtered by the last row of the
+    previous page instead of COUNT(*) and OFFSET, so page N costs the same as the first one.
+    Views without keyset_ordering (no index for their filter) and other ?ordering= values
+    are rejected with 400 instead of silently changing the order.
+    '''
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    unsupported_cursor_message = 'Cursor pagination is not available for this list, use page instead.'
+    unsupported_ordering_message = 'Cursor pagination only supports ordering={}.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_keyset = self.cursor_query_param in request.query_params
+        if not self.use_keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.keyset_ordering = tuple(getattr(view, 'keyset_ordering', None) or ())
+        if not self.keyset_ordering:
+            raise ValidationError({self.cursor_query_param: self.unsupported_cursor_message})
+        self.validate_ordering(request)
+        self.fields = [field.lstrip('-') for field in self.keyset_ordering]
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.keyset_ordering)
+        values = self.decode_cursor(request)
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values))
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.last_values = [self.get_cursor_value(rows[-1], field) for field in self.fields] if rows else None
+        return rows
+
+    def validate_ordering(self, request):
+        # Допустимы порядок курсора и его начало, например -created_at для ('-created_at', '-id')
+        ordering = request.query_params.get(OrderingFilter.ordering_param)
+        if not ordering:
+            return
+        requested = tuple(field.strip() for field in ordering.split(',') if field.strip())
+        if requested != self.keyset_ordering[:len(requested)]:
+            raise ValidationError({OrderingFilter.ordering_param: self.unsupported_ordering_message.format(
+                ','.join(self.keyset_ordering))})
+
+    def get_keyset_filter(self, values):
+        # (a, b) < (x, y)  ->  a < x OR (a = x AND b < y)
+        keyset_filter = Q()
+        for index, ordering in enumerate(self.keyset_ordering):
+            lookup = 'lt' if ordering.startswith('-') else 'gt'
+            condition = Q(**{f'{self.fields[index]}__{lookup}': values[index]})
+            for field, value in zip(self.fields[:index], values[:index]):
+                condition &= Q(**{field: value})
+            keyset_filter |= condition
+        return keyset_filter
+
+    def get_cursor_value(self, row, field):
+        value = getattr(row, field)
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            ordering, values = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if ordering != list(self.keyset_ordering) or not isinstance(values, list) or len(values) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def encode_cursor(self, values):
+        cursor = json.dumps([self.keyset_ordering, values], separators=(',', ':'))
+        return urlsafe_b64encode(cursor.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.use_keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_values))
+
+    def get_paginated_response(self, data):
+        if not self.use_keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            # Курсор ведёт только вперёд, общее количество не считается
+            ('previous', None),
+            ('results', data)
+        ]))
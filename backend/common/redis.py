@@ -0,0 +1,19 @@
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from redis.connection import parse_url
+
+
+@lru_cache(maxsize=None)
+def get_redis_connection():
+    '''Shared Redis client for queues, counters and locks (same server as the cache)'''
+    return redis.Redis.from_url(settings.CACHES['default']['LOCATION'])
+
+
+@lru_cache(maxsize=None)
+def get_counters_connection():
+    '''Client for counters that must outlive cache.clear(): same server, separate database'''
+    kwargs = parse_url(settings.CACHES['default']['LOCATION'])
+    kwargs['db'] = settings.COUNTERS_REDIS_DB
+    return redis.Redis(**kwargs)
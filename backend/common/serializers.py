@@ -4,6 +4,9 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from djoser.serializers import UserSerializer
 
+from .compiled_serializers import CompiledListSerializer
+from .sparse_fields import SparseFieldsetSerializerMixin
+
 
 User = get_user_model()
 Address = apps.get_model('users', 'Address')
@@ -30,7 +33,7 @@ class StoreSimpleSerializer(serializers.ModelSerializer):
         fields = ('id', 'slug', 'name', 'logo', 'is_verified', 'is_admin_store',)
 		
 
-class StoreListSerializer(serializers.ModelSerializer):
+class StoreListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     products_count = serializers.IntegerField()
     store_average_score = serializers.SerializerMethodField()
 
@@ -42,6 +45,7 @@ class StoreListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Store
+        list_serializer_class = CompiledListSerializer
         fields = ('id', 'slug', 'name', 'logo', 
                   'organization_type', 'organization_name',
                   'is_verified', 'is_admin_store',
@@ -65,12 +69,14 @@ class CharacterSerializer(serializers.ModelSerializer):
 class CardListSerializer(serializers.ModelSerializer):
 	class Meta:
 		model = Card
+		list_serializer_class = CompiledListSerializer
 		fields = ('id', 'uuid', 'name', 'card_number', 'balance', 'created_at')
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductImage
+        list_serializer_class = CompiledListSerializer
         fields = ('id', 'image')
 		
 
@@ -81,10 +87,11 @@ class ProductSimpleSerializer(serializers.ModelSerializer):
 
 	class Meta:
 		model = Product
+		list_serializer_class = CompiledListSerializer
 		fields = ('id', 'slug', 'title', 'product_images', 'cosplay_character', 'seller')
 		
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
 	seller = StoreSimpleSerializer(read_only=True, many=False)
 	product_images = ProductImageSerializer(many=True, read_only=True)
 	real_price = serializers.SerializerMethodField()
@@ -95,6 +102,13 @@ class ProductSerializer(serializers.ModelSerializer):
 
 	class Meta:
 		model = Product
+		list_serializer_class = CompiledListSerializer
+		# Аннотации Product.objects.with_stats() (common.eager_loading)
+		eager_loading = {
+			'reviews_count': ('stats',),
+			'average_score': ('stats',),
+			'total_ordered_quantity': ('stats',),
+		}
 		fields = ('id', 'slug', 'title', 'product_images', 
 				  'cosplay_character', 'seller', 'is_active',
 	              'price', 'real_price', 'discount', 'in_stock',
@@ -143,6 +157,7 @@ class ProductDetailSerializer(ProductSerializer):
 	total_ordered_quantity = serializers.IntegerField(read_only=True)
 	reviews_count = serializers.IntegerField(read_only=True)
 	average_score = serializers.SerializerMethodField()
+	score_distribution = serializers.SerializerMethodField()
 
 	def get_real_price(self, product):
 		return product.get_real_price()
@@ -152,13 +167,20 @@ class ProductDetailSerializer(ProductSerializer):
 			average_score = round(product.average_score, 1)
 			return average_score
 		return None
+
+	def get_score_distribution(self, product):
+		stats = getattr(product, 'stats', None)
+		if stats:
+			return stats.get_score_distribution()
+		return None
 	
 	class Meta(ProductSerializer.Meta):
 		model = Product
+		eager_loading = {**ProductSerializer.Meta.eager_loading, 'score_distribution': ('stats',)}
 		fields = ('id', 'slug', 'title', 'product_images', 'cosplay_character', 'seller',
 	              'price', 'real_price', 'discount', 'product_type', 'description', 
 				  'size', 'shoes_size', 'timestamp', 'reviews_count', 'in_stock',
-				  'average_score', 'total_ordered_quantity', 'is_active', 'reviews',)
+				  'average_score', 'score_distribution', 'total_ordered_quantity', 'is_active', 'reviews',)
 		
 
 class OrderItemSimpleSerializer(serializers.ModelSerializer):
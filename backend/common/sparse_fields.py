@@ -0,0 +1,112 @@
+from rest_framework import serializers
+
+
+def parse_field_paths(value):
+    '''"id,seller.name, title" -> ('id', 'seller.name', 'title')'''
+    return tuple(sorted({path.strip() for path in value.split(',') if path.strip()}))
+
+
+def prune_fields(fields, include=None, omit=()):
+    '''Removes serializer fields not listed in include or listed in omit, nested paths use dots'''
+    if include is not None:
+        top_level = {path.split('.', 1)[0] for path in include}
+        for name in list(fields):
+            if name not in top_level:
+                del fields[name]
+
+    for name in list(fields):
+        if name in omit:
+            del fields[name]
+            continue
+
+        nested_include = None
+        if include is not None and name not in include:
+            nested_include = tuple(path[len(name) + 1:] for path in include if path.startswith(name + '.'))
+        nested_omit = tuple(path[len(name) + 1:] for path in omit if path.startswith(name + '.'))
+        if nested_include is None and not nested_omit:
+            continue
+
+        field = fields[name]
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        if isinstance(field, serializers.Serializer):
+            prune_fields(field.fields, nested_include, nested_omit)
+        elif hasattr(field, 'sparse_include'):
+            # Поля с готовыми данными (products.fragments.ProductCardField) обрезают их сами
+            field.sparse_include, field.sparse_omit = nested_include, nested_omit
+
+
+def prune_data(data, include=None, omit=()):
+    '''prune_fields for already serialized data: dicts and lists of dicts'''
+    if isinstance(data, list):
+        return [prune_data(item, include, omit) for item in data]
+    if not isinstance(data, dict):
+        return data
+
+    pruned = {}
+    for name, value in data.items():
+        if name in omit or (include is not None and name not in {path.split('.', 1)[0] for path in include}):
+            continue
+        nested_include = None
+        if include is not None and name not in include:
+            nested_include = tuple(path[len(name) + 1:] for path in include if path.startswith(name + '.'))
+        nested_omit = tuple(path[len(name) + 1:] for path in omit if path.startswith(name + '.'))
+        if nested_include is not None or nested_omit:
+            value = prune_data(value, nested_include, nested_omit)
+        pruned[name] = value
+    return pruned
+
+
+class SparseFieldsetSerializerMixin:
+    '''Accepts fields/omit kwargs with the (dotted) field paths to keep or drop'''
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        self.sparse_include = fields
+        self.sparse_omit = omit or ()
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.sparse_include is not None or self.sparse_omit:
+            prune_fields(fields, self.sparse_include, self.sparse_omit)
+        return fields
+
+
+class SparseFieldsetMixin:
+    '''
+    ?fields=id,slug,seller.name and ?omit=reviews_count for list views.
+    The selection is passed to the serializer, needs_field() lets get_queryset
+    skip joins, prefetches and annotations of the dropped fields.
+    '''
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+
+    def get_sparse_fieldset(self):
+        if not hasattr(self, '_sparse_fieldset'):
+            params = getattr(self.request, 'query_params', {})
+            include = params.get(self.fields_query_param)
+            self._sparse_fieldset = (
+                parse_field_paths(include) if include else None,
+                parse_field_paths(params.get(self.omit_query_param, '')),
+            )
+        return self._sparse_fieldset
+
+    def needs_field(self, *paths):
+        '''True if any of the paths (or a part of it) will be serialized'''
+        include, omit = self.get_sparse_fieldset()
+        for path in paths:
+            if any(path == omitted or path.startswith(omitted + '.') for omitted in omit):
+                continue
+            if include is None or any(
+                path == included or included.startswith(path + '.') or path.startswith(included + '.')
+                for included in include
+            ):
+                return True
+        return False
+
+    def get_serializer(self, *args, **kwargs):
+        include, omit = self.get_sparse_fieldset()
+        if include is not None:
+            kwargs.setdefault('fields', include)
+        if omit:
+            kwargs.setdefault('omit', omit)
+        return super().get_serializer(*args, **kwargs)
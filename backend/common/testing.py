@@ -0,0 +1,38 @@
+from fandoms.models import Character, Fandom
+from products.models import Product
+from stores.models import Store
+from users.models import User
+
+
+def create_user(username, **kwargs):
+    return User.objects.create(username=username, email=f'{username}@example.com', **kwargs)
+
+
+def create_store(owner, name='Store', number=1):
+    '''Store with the requisites derived from number, they are unique across stores'''
+    return Store.objects.create(owner=owner, name=name, organization_type='LLC', organization_name=f'{name} LLC',
+                                taxpayer_number=f'{number:010}', check_number=f'{number:020}')
+
+
+def create_character(name='Character', fandom=None):
+    if fandom is None:
+        fandom = Fandom.objects.create(name='Fandom', fandom_type='Games')
+    return Character.objects.create(name=name, fandom=fandom)
+
+
+def create_product(store, character, title='Product', **kwargs):
+    return Product.objects.create(seller=store, title=title, description='Description', price=1000,
+                                  cosplay_character=character, product_type='Wig', **kwargs)
+
+
+def create_products(store, character, count, **kwargs):
+    '''Products titled Product 0 ... Product count-1'''
+    return [create_product(store, character, f'Product {i}', **kwargs) for i in range(count)]
+
+
+def create_catalog(products_count=0):
+    '''(owner, store, character, products) of one store selling products_count products'''
+    owner = create_user('owner')
+    store = create_store(owner)
+    character = create_character()
+    return owner, store, character, create_products(store, character, products_count)
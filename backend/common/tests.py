@@ -0,0 +1,339 @@
+import re
+import time
+from unittest import mock
+
+from rest_framework.test import APITestCase
+from rest_framework import generics, status
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from elasticsearch_dsl import Search
+from elasticsearch_dsl.response import Response as SearchResponse
+
+from .cache import RESPONSE_CACHE_LOCK_KEY, get_request_data, get_response_cache_key, refresh_cached_response
+from .eager_loading import EagerLoadingMixin, get_eager_loading_plan
+from .pagination import KeysetPagination
+from .serializers import ProductSerializer
+from .testing import create_catalog, create_character, create_product, create_store, create_user
+from cards.models import Card, Transaction
+from cart.models import CartItem
+from favorites.models import Favorite
+from favorites.serializers import FavoriteListSerializer
+from fandoms.models import Fandom
+from orders.models import Order, OrderItem
+from products.fragments import get_product_cards_context
+from products.models import Answer, Product, ProductImage, Review
+from stores.models import Employee
+from users.models import Address
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        _, self.store, self.character, _ = create_catalog()
+
+    def test_responses_are_cached_until_namespace_is_bumped(self):
+        url = reverse('stores:store-list')
+        response = self.client.get(url, {'ordering': 'name', 'search': ''})
+
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(url, {'ordering': 'name'})
+        self.assertEqual(cached_response.content, response.content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_product(self.store, self.character)
+
+        response = self.client.get(url, {'ordering': 'name'})
+        self.assertEqual(response.data['results'][0]['products_count'], 1)
+
+    def test_stale_copy_is_served_while_another_worker_recomputes(self):
+        url = reverse('stores:store-list')
+        response = self.client.get(url)
+        cache_key = get_response_cache_key(response.wsgi_request)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.store.name = 'Renamed store'
+            self.store.save()
+        cache.add(RESPONSE_CACHE_LOCK_KEY.format(cache_key), 1)
+
+        with self.assertNumQueries(0):
+            stale_response = self.client.get(url)
+        self.assertEqual(stale_response.content, response.content)
+
+        refresh_cached_response('stores.views.StoreListView', {}, get_request_data(response.wsgi_request),
+                                ['stores'], settings.RESPONSE_CACHE_TIMEOUT)
+        self.assertEqual(self.client.get(url).json()['results'][0]['name'], 'Renamed store')
+
+    @mock.patch('common.cache.refresh_cached_response.delay')
+    def test_entries_close_to_expiry_are_refreshed_in_background(self, delay):
+        url = reverse('stores:store-list')
+        response = self.client.get(url, {'ordering': 'name'})
+        cache_key = get_response_cache_key(response.wsgi_request)
+        entry = cache.get(cache_key)
+        entry['expires_at'] = time.time() + settings.RESPONSE_CACHE_REFRESH_AHEAD / 2
+        cache.set(cache_key, entry)
+
+        self.client.get(url, {'ordering': 'name'})
+        self.client.get(url, {'ordering': 'name'})
+        delay.assert_called_once_with('stores.views.StoreListView', {}, {
+            'path': url, 'query_string': 'ordering=name', 'host': 'testserver', 'scheme': 'http', 'accept': '',
+        }, ('stores',), settings.RESPONSE_CACHE_TIMEOUT)
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = create_user('customer')
+        for product in create_catalog(5)[3]:
+            Favorite.objects.create(user=self.user, product=product)
+        self.client.force_authenticate(self.user)
+
+    def test_sparse_fieldset_trims_output_and_queries(self):
+        cache.clear()
+        url = reverse('favorites:favorite-list')
+        with self.assertNumQueries(4):
+            full_response = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,product.title,product.real_price',
+                                              'omit': 'product.real_price'})
+
+        # Карточки товаров уже в кэше фрагментов: COUNT и сами избранные, без товаров
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('JOIN', queries[-1]['sql'])
+
+        self.assertIn('seller', full_response.data['results'][0]['product'])
+        self.assertEqual(response.data['results'][0], {'id': response.data['results'][0]['id'],
+                                                       'product': {'title': 'Product 4'}})
+
+    @mock.patch.object(KeysetPagination, 'page_size', 2)
+    def test_cursor_pages_cover_collection_without_count(self):
+        url = reverse('favorites:favorite-list')
+        self.assertEqual(self.client.get(url).data['count'], 5)
+
+        ids, next_url = [], f'{url}?cursor='
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertNotIn('count', response.data)
+            ids += [favorite['id'] for favorite in response.data['results']]
+            next_url = response.data['next']
+
+        expected_ids = list(Favorite.objects.filter(user=self.user).order_by('-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected_ids)
+        self.assertEqual(self.client.get(url, {'cursor': 'invalid'}).status_code, status.HTTP_404_NOT_FOUND)
+        # Курсор не меняет порядок молча: несовместимая сортировка отклоняется
+        self.assertEqual(self.client.get(url, {'cursor': '', 'ordering': 'product__title'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'cursor': '', 'ordering': '-id'}).status_code, status.HTTP_200_OK)
+
+
+class CompiledSerializerTests(TestCase):
+    def test_compiled_list_output_matches_drf(self):
+        owner, store, character, _ = create_catalog()
+        for i in range(3):
+            product = create_product(store, character, f'Product {i}', discount=i * 10)
+            Review.objects.create(customer=owner, product=product, score=i + 3, text='Good')
+            Favorite.objects.create(user=owner, product=product)
+
+        products = Product.objects.with_stats().select_related('seller', 'cosplay_character__fandom')
+        data = ProductSerializer(products, many=True).data
+        self.assertEqual(data, [ProductSerializer(product).data for product in products])
+        # Общий продавец и персонаж сериализуются один раз на ответ
+        self.assertIs(data[0]['seller'], data[2]['seller'])
+        self.assertIs(data[0]['cosplay_character'], data[1]['cosplay_character'])
+        favorites = list(Favorite.objects.all())
+        context = get_product_cards_context(None, [favorite.product_id for favorite in favorites])
+        self.assertEqual(FavoriteListSerializer(favorites, many=True, context=context).data,
+                         [FavoriteListSerializer(favorite, context=context).data for favorite in favorites])
+        # Без карточек в контексте поле не загружает их по одной на позицию
+        with self.assertRaises(ImproperlyConfigured):
+            FavoriteListSerializer(favorites, many=True).data
+
+
+class EagerLoadingTests(TestCase):
+    def test_plan_follows_serializer_fields(self):
+        plan = get_eager_loading_plan(ProductSerializer())
+        self.assertEqual(plan.select_related, {'seller', 'cosplay_character', 'cosplay_character__fandom', 'stats'})
+        self.assertEqual(plan.prefetch_related, {'product_images'})
+
+        plan = get_eager_loading_plan(ProductSerializer(fields=('id', 'seller.name')))
+        self.assertEqual((plan.select_related, plan.prefetch_related), ({'seller'}, set()))
+
+    def test_unused_manual_lookups_are_logged(self):
+        class View(EagerLoadingMixin, generics.ListAPIView):
+            serializer_class = ProductSerializer
+            queryset = Product.objects.prefetch_related('reviews')
+            filter_backends = ()
+
+        with self.assertLogs('common.eager_loading', 'WARNING') as logs:
+            queryset = View().filter_queryset(View.queryset)
+        self.assertIn('reviews', logs.output[0])
+        self.assertIn('product_images', queryset._prefetch_related_lookups)
+
+
+def get_url_patterns(patterns=None, namespace=None, prefix=''):
+    '''(name, route) of every URL pattern of the project apps, unnamed patterns go by route'''
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace in QueryScalingTests.app_namespaces:
+                yield from get_url_patterns(pattern.url_patterns, pattern.namespace, route)
+        elif isinstance(pattern, URLPattern) and namespace:
+            yield (f'{namespace}:{pattern.name}' if pattern.name else route), route
+
+
+class QueryScalingTests(APITestCase):
+    '''
+    Every endpoint is requested with N and 2N related objects and must run the same number
+    of queries. New URL patterns have to be added to get_url_kwargs() or skipped with a reason.
+    '''
+    app_namespaces = ('users', 'stores', 'cards', 'fandoms', 'products', 'orders', 'cart', 'favorites')
+    skipped = {
+        'products:product-facets': 'Elasticsearch aggregations only',
+        'products:product-suggest': 'Elasticsearch suggestions only',
+    }
+    # Больше пяти карт у пользователя не бывает
+    n = 2
+
+    def setUp(self):
+        self.counter = 0
+        self.user = self.create_user(is_staff=True)
+        self.store = self.create_store(self.user)
+        self.fandom = Fandom.objects.create(name='Fandom', fandom_type='Games')
+        self.character = create_character(fandom=self.fandom)
+        self.card = Card.objects.create(user=self.user, card_number='1234567812345678', balance=1000)
+        self.address = Address.objects.create(user=self.user, address='Address')
+        self.product = self.create_product()
+        self.review = Review.objects.create(product=self.product, customer=self.user, text='Review', score=5)
+        self.answer = Answer.objects.create(review=self.review, seller=self.store, text='Answer')
+        self.order = self.create_order()
+        self.order_item = OrderItem.objects.create(order=self.order, product=self.product, price=1000,
+                                                   quantity=1, status=1)
+        self.transaction = Transaction.objects.create(card=self.card, transaction_type='Purchase', amount=1000,
+                                                      related_order=self.order, related_seller=self.store)
+        self.client.force_authenticate(self.user)
+
+    def next_number(self):
+        self.counter += 1
+        return self.counter
+
+    def create_user(self, **kwargs):
+        return create_user(f'user{self.next_number()}', **kwargs)
+
+    def create_store(self, owner):
+        number = self.next_number()
+        return create_store(owner, f'Store {number}', number)
+
+    def create_product(self, store=None, character=None):
+        product = create_product(store or self.store, character or self.character, f'Product {self.next_number()}')
+        ProductImage.objects.create(product=product, image='product_images/image.webp')
+        return product
+
+    def create_order(self):
+        return Order.objects.create(customer=self.user, name='Customer', email='customer@example.com',
+                                    phone_number='89990000000', address=self.address, card=self.card,
+                                    total_order_price=1000, status=1)
+
+    def grow(self, count):
+        '''Adds count objects to every collection the endpoints serialize'''
+        for _ in range(count):
+            customer = self.create_user()
+            seller = self.create_store(self.create_user())
+            Employee.objects.create(user=customer, store=self.store)
+            character = create_character(f'Character {self.next_number()}', self.fandom)
+            Fandom.objects.create(name=f'Fandom {self.next_number()}', fandom_type='Anime')
+            product = self.create_product(seller, character)
+            store_product = self.create_product()
+
+            review = Review.objects.create(product=self.product, customer=customer, text='Review', score=4)
+            Answer.objects.create(review=review, seller=self.store, text='Answer')
+            Answer.objects.create(review=self.review, seller=seller, text='Answer')
+
+            order = self.create_order()
+            order_item = OrderItem.objects.create(order=order, product=store_product, price=1000, quantity=1, status=1)
+            OrderItem.objects.create(order=self.order, product=product, price=1000, quantity=2, status=1)
+            Transaction.objects.create(card=self.card, transaction_type='Purchase', amount=1000,
+                                       related_order=order, related_seller=self.store, related_order_item=order_item)
+            Card.objects.create(user=self.user, card_number=f'{self.next_number():016}')
+            Address.objects.create(user=self.user, address='Address')
+            Favorite.objects.create(user=self.user, product=product)
+            CartItem.objects.create(user=self.user, product=product, quantity=1)
+
+    def get_url_kwargs(self):
+        return {
+            'users:inactive-user-detail': {'username': self.user.username},
+            'users:address-detail': {'uuid': self.address.uuid},
+            'users:user-detail': {'username': self.user.username},
+            'stores:store-detail-public': {'slug': self.store.slug},
+            'stores:store-detail-private': {'slug': self.store.slug},
+            'stores:store-delete': {'slug': self.store.slug},
+            'stores:employee-list': {'slug': self.store.slug},
+            'stores:employee-create': {'slug': self.store.slug},
+            'stores:employee-detail': {'slug': self.store.slug, 'username': self.user.username},
+            'stores:store-order-list': {'slug': self.store.slug},
+            'api/stores/<slug:slug>/orders/<slug:order_item_slug>/update-status/<int:new_status>/': {
+                'slug': self.store.slug, 'order_item_slug': self.order_item.slug, 'new_status': 2},
+            'stores:store-transaction-list': {'slug': self.store.slug},
+            'stores:store-product-list': {'slug': self.store.slug},
+            'stores:store-product-create': {'slug': self.store.slug},
+            'stores:store-product-detail': {'store_slug': self.store.slug, 'slug': self.product.slug},
+            'stores:store-answer-create': {'slug': self.store.slug, 'review_id': self.review.id},
+            'cards:card-detail': {'uuid': self.card.uuid},
+            'cards:create-deposit': {'card_uuid': self.card.uuid, 'amount': 100},
+            'cards:transaction-detail': {'uuid': self.transaction.uuid},
+            'fandoms:fandom-detail': {'slug': self.fandom.slug},
+            'fandoms:character-create': {'fandom_slug': self.fandom.slug},
+            'fandoms:character-detail': {'fandom_slug': self.fandom.slug, 'slug': self.character.slug},
+            'products:product-detail': {'slug': self.product.slug},
+            'products:review-create': {'pk': self.product.id},
+            'products:review-detail': {'product_id': self.product.id, 'pk': self.review.id},
+            'products:answer-detail': {'product_id': self.product.id, 'pk': self.answer.id},
+            'orders:order-detail': {'slug': self.order.slug},
+            'orders:order-item': {'slug': self.order_item.slug},
+            'orders:payment-create': {'order_id': self.order.id},
+            'cart:add-to-cart': {'product_id': self.product.id, 'quantity': 1},
+            'cart:delete-from-cart': {'product_id': self.product.id},
+            'cart:reduce-product-quantity-in-cart': {'product_id': self.product.id, 'quantity': 1},
+            'favorites:manage-favorite-item': {'product_id': self.product.id},
+        }
+
+    def get_search_response(self, search):
+        # Elasticsearch находит все активные товары
+        ids = list(Product.objects.filter(is_active=True).order_by('-id').values_list('id', flat=True))
+        return SearchResponse(search, {'hits': {'total': {'value': len(ids), 'relation': 'eq'}, 'hits': [
+            {'_id': str(product_id), '_score': 1.0, '_source': {'id': product_id}, 'sort': [product_id]}
+            for product_id in ids
+        ]}})
+
+    def count_queries(self):
+        counts = {}
+        url_kwargs = self.get_url_kwargs()
+        for name, route in get_url_patterns():
+            if name in self.skipped:
+                continue
+            parameters = re.findall(r'<(?:\w+:)?(\w+)>', route)
+            self.assertTrue(not parameters or name in url_kwargs, f'No URL kwargs for {name}')
+            path = '/' + re.sub(r'<(?:\w+:)?(\w+)>', lambda match: str(url_kwargs[name][match.group(1)]), route)
+
+            # Кэш ответов и карточек сбрасывается, чтобы считались запросы самого представления
+            cache.clear()
+            with mock.patch.object(Search, 'execute', autospec=True, side_effect=self.get_search_response), \
+                    CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path)
+            self.assertLess(response.status_code, 500, name)
+            counts[name] = len(queries)
+        return counts
+
+    def test_query_count_does_not_grow_with_related_objects(self):
+        self.grow(self.n)
+        counts = self.count_queries()
+        self.grow(self.n)
+        grown_counts = self.count_queries()
+
+        self.assertTrue(counts)
+        self.assertEqual({name: count for name, count in grown_counts.items() if count != counts[name]}, {},
+                         f'Query counts with {self.n} objects: {counts}')
@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from common.compiled_serializers import CompiledListSerializer
+from common.sparse_fields import SparseFieldsetSerializerMixin
 from common.serializers import ProductSerializer, FandomSerializer
 
 from .models import Fandom, Character
@@ -23,6 +25,7 @@ class FandomListSerializer(serializers.ModelSerializer):
 
 	class Meta:
 		model = Fandom
+		list_serializer_class = CompiledListSerializer
 		fields = ('id', 'slug', 'name', 'fandom_type', 'image',
 				  'characters_count', 'total_fandom_products_count')
 
@@ -33,6 +36,7 @@ class CharacterListSerializer(serializers.ModelSerializer):
 
 	class Meta:
 		model = Character
+		list_serializer_class = CompiledListSerializer
 		fields = ('id', 'slug', 'name', 'fandom', 'image', 'products_count')
 
 
@@ -54,7 +58,7 @@ class FandomDetailSerializer(serializers.ModelSerializer):
 				  'total_fandom_products_count', 'characters',)
 
 
-class CharacterDetailSerializer(serializers.ModelSerializer):
+class CharacterDetailSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
 	fandom = FandomSerializer(read_only=True)
 	products_count = serializers.IntegerField(read_only=True)
 	products = ProductSerializer(many=True, read_only=True)
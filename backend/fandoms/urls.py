@@ -1,5 +1,6 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
+
+from common.cache import cache_response
 
 from . import views
 
@@ -7,10 +8,10 @@ from . import views
 app_name = 'fandoms'
 
 urlpatterns = [
-    path('', cache_page(60*5)(views.FandomListView.as_view()), name='fandom-list'),   
+    path('', cache_response('fandoms')(views.FandomListView.as_view()), name='fandom-list'),   
     path('create/', views.FandomCreateView.as_view(), name='fandom-create'),
-    path('characters/', cache_page(60*5)(views.CharacterListView.as_view()),  name='character-list'),
-    path('<slug:slug>/', cache_page(60*5)(views.FandomDetailView.as_view()), name='fandom-detail'),
+    path('characters/', cache_response('fandoms')(views.CharacterListView.as_view()),  name='character-list'),
+    path('<slug:slug>/', cache_response('fandoms')(views.FandomDetailView.as_view()), name='fandom-detail'),
     path('<slug:fandom_slug>/characters/create/', views.CharacterCreateView.as_view(), name='character-create'),
-    path('<slug:fandom_slug>/characters/<slug:slug>/', cache_page(60*5)(views.CharacterDetailView.as_view()), name='character-detail'),
+    path('<slug:fandom_slug>/characters/<slug:slug>/', cache_response('fandoms')(views.CharacterDetailView.as_view()), name='character-detail'),
 ]
\ No newline at end of file
@@ -1,6 +1,5 @@
-from django.db.models import Count, Avg, Prefetch, Q, Sum, FloatField, Case, When, F
+from django.db.models import Count, Prefetch, Q, FloatField, Case, When, F
 from django.shortcuts import get_object_or_404
-from django.db.models.functions import Coalesce
 
 from rest_framework import generics, filters
 from rest_framework.permissions import IsAdminUser
@@ -8,6 +7,9 @@ from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django_elasticsearch_dsl.search import Search
 
+from common.eager_loading import EagerLoadingMixin
+from products.fragments import get_product_cards
+from products.pagination import iter_search_ids
 from products.models import Product
 
 from . import serializers
@@ -20,7 +22,7 @@ class FandomCreateView(generics.CreateAPIView):
     permission_classes = (IsAdminUser,)
 
 
-class FandomListView(generics.ListAPIView):
+class FandomListView(EagerLoadingMixin, generics.ListAPIView):
     '''Returns a list of Fandoms'''
     serializer_class = serializers.FandomListSerializer
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter)
@@ -89,7 +91,7 @@ class CharacterCreateView(generics.CreateAPIView):
         serializer.save(fandom=fandom)
 
 
-class CharacterListView(generics.ListAPIView):
+class CharacterListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = serializers.CharacterListSerializer
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter)
     filterset_fields = {'fandom__fandom_type': ['exact']}
@@ -128,33 +130,24 @@ class CharacterDetailView(generics.RetrieveUpdateDestroyAPIView):
         order_by = self.request.query_params.get('ordering', '-total_ordered_quantity')
         ordering = order_by if order_by in self.ordering_fields else '-total_ordered_quantity'
 
-        search = Search(index='products')
-
         if search_query:
-            search = search.query("multi_match",
-                                  query=search_query,
-                                  fields=self.search_fields,
-                                  fuzziness="auto")
-        
-        results = search.execute()
-        product_ids = [hit.id for hit in results]
-
-        filters['pk__in'] = product_ids
+            # Все найденные товары персонажа, курсором search_after, а не первые size попаданий
+            character_ids = Character.objects.filter(
+                fandom=fandom, slug=self.kwargs['slug']).values_list('id', flat=True)[:1]
+            search = Search(index='products').filter('terms', **{'cosplay_character.id': list(character_ids)}).query(
+                "multi_match", query=search_query, fields=self.search_fields, fuzziness="auto")
+            filters['pk__in'] = list(iter_search_ids(search))
 
         return Character.objects.annotate(
             products_count=Count('products', filter=Q(products__is_active=True))
             ).select_related('fandom').prefetch_related(
-            Prefetch('products', queryset=Product.objects.annotate(
-                reviews_count=Count('reviews', distinct=True),
-                average_score=Coalesce(Avg('reviews__score'), 0, output_field=FloatField()),
-                total_ordered_quantity=Coalesce(Sum('ordered_products__quantity'), 0),
+            # Нужны только id (и внешний ключ для prefetch) для сортировки и пагинации, карточки берутся из кэша фрагментов
+            Prefetch('products', queryset=Product.objects.with_stats().only('id', 'cosplay_character').annotate(
                 actual_price=Case( 
                     When(discount__gt=0, then=F('price') - (F('price') * F('discount') / 100)),
                     default=F('price'),
                     output_field=FloatField()
                 )   
-                ).prefetch_related('product_images'
-                ).select_related('seller', 'cosplay_character__fandom'
                 ).filter(is_active=True, **filters).order_by(ordering, '-timestamp'))
             ).filter(fandom=fandom)
     
@@ -164,11 +157,15 @@ class CharacterDetailView(generics.RetrieveUpdateDestroyAPIView):
 
         page = self.paginate_queryset(products)
         if page is not None:
-            serializer = serializers.CharacterDetailSerializer(self.object)
+            serializer = serializers.CharacterDetailSerializer(self.object, omit=('products',),
+                                                               context={'request': request})
             data = serializer.data
-            data['products'] = serializers.ProductSerializer(page, many=True).data
+            data['products'] = get_product_cards([product.id for product in page], request)
             return self.get_paginated_response(data)
 
-        serializer = serializers.CharacterDetailSerializer(self.object, context={'request': request})
-        return Response(serializer.data)
+        serializer = serializers.CharacterDetailSerializer(self.object, omit=('products',),
+                                                           context={'request': request})
+        data = serializer.data
+        data['products'] = get_product_cards([product.id for product in products], request)
+        return Response(data)
 
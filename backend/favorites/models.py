@@ -23,4 +23,7 @@ class Favorite(models.Model):
 	class Meta:
 		unique_together = ('user', 'product')
 		ordering = ['-id']
+		indexes = [
+			models.Index(fields=['user', '-id'], name='favorite_user_keyset_idx'),
+		]
 
@@ -1,13 +1,16 @@
 from rest_framework import serializers
 
-from common.serializers import ProductSerializer
+from common.compiled_serializers import CompiledListSerializer
+from common.sparse_fields import SparseFieldsetSerializerMixin
+from products.fragments import ProductCardField
 
 from .models import Favorite
 
 
-class FavoriteListSerializer(serializers.ModelSerializer):
-	product = ProductSerializer(read_only=True)
+class FavoriteListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+	product = ProductCardField(source='product_id')
 
 	class Meta:
 		model = Favorite
+		list_serializer_class = CompiledListSerializer
 		fields = '__all__'
\ No newline at end of file
@@ -1,5 +1,4 @@
 from django.shortcuts import get_object_or_404
-from django.db.models import Count, Avg, Sum, Prefetch
 
 from rest_framework import generics, status, filters
 from rest_framework.decorators import api_view, permission_classes
@@ -7,6 +6,10 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 
+from common.eager_loading import EagerLoadingMixin
+from common.pagination import KeysetPagination
+from common.sparse_fields import SparseFieldsetMixin
+from products.fragments import ProductCardsMixin
 from products.models import Product
 
 from .serializers import FavoriteListSerializer
@@ -28,9 +31,11 @@ def manage_favorite_item(request, product_id):
     return Response({'message': message}, status=status.HTTP_200_OK)
     
 
-class FavoriteListView(generics.ListAPIView):
+class FavoriteListView(SparseFieldsetMixin, ProductCardsMixin, EagerLoadingMixin, generics.ListAPIView):
     serializer_class = FavoriteListSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-id',)
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
     filterset_fields = {'product__is_active': ['exact']}
     ordering = ['-id']
@@ -38,12 +43,8 @@ class FavoriteListView(generics.ListAPIView):
                        'product__price', 'product__discount']
 
     def get_queryset(self):
-        user = self.request.user
-        return Favorite.objects.filter(user=user).prefetch_related(
-            Prefetch('product', queryset=Product.objects.annotate(
-                reviews_count=Count('reviews', distinct=True),
-                average_score=Avg('reviews__score'),
-                total_ordered_quantity=Sum('ordered_products__quantity')
-            ).prefetch_related('reviews', 'product_images'
-            ).select_related('seller', 'cosplay_character__fandom'
-            ).all()))
+        # Карточки товаров берутся из кэша фрагментов, сами товары не загружаются
+        return Favorite.objects.filter(user=self.request.user)
+
+    def get_card_product_ids(self, page):
+        return [favorite.product_id for favorite in page] if self.needs_field('product') else []
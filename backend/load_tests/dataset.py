@@ -0,0 +1,60 @@
+import logging
+import random
+
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+
+class Dataset:
+    '''
+    Users and products of a database filled by `manage.py generate_dataset`:
+    users are user<number>@example.com with one password, the first ones own the stores.
+    '''
+    def __init__(self, first_user=1, sellers=20, users=1000, password='password123'):
+        self.first_user = first_user
+        self.sellers = sellers
+        self.users = users
+        self.password = password
+        self.products = []
+
+    @classmethod
+    def from_options(cls, options):
+        return cls(options.dataset_first_user, options.dataset_sellers,
+                   options.dataset_users, options.dataset_password)
+
+    def get_email(self, number):
+        return f'user{number}@example.com'
+
+    def random_seller(self):
+        return self.get_email(self.first_user + random.randrange(self.sellers))
+
+    def random_customer(self):
+        return self.get_email(self.first_user + self.sellers + random.randrange(self.users - self.sellers))
+
+    def random_product(self):
+        return random.choice(self.products)
+
+    def load_products(self, host, pages=10):
+        '''Ids and slugs of the active products to browse, from the first pages of the list'''
+        session = requests.Session()
+        products = {}
+        for ordering in ('-total_ordered_quantity', '-timestamp', 'actual_price'):
+            url, params = f'{host}/api/products/', {'ordering': ordering}
+            for _ in range(pages):
+                response = session.get(url, params=params)
+                if response.status_code != 200:
+                    break
+                data = response.json()
+                for card in data['results']:
+                    products[card['id']] = card['slug']
+                # Список пагинируется курсором, следующая страница только по ссылке next
+                url, params = data['next'], None
+                if not url:
+                    break
+
+        if not products:
+            raise RuntimeError(f'No products at {host}, run manage.py generate_dataset first')
+        self.products = list(products.items())
+        logger.info('Loaded %d products from %s', len(self.products), host)
@@ -0,0 +1,41 @@
+'''
+Load suite against a database filled by `manage.py generate_dataset`:
+
+    locust -f load_tests/locustfile.py --host http://localhost:8000 --headless -u 200 -r 20 -t 10m \
+        --dataset-first-user 11 --dataset-sellers 2000 --dataset-users 100000
+
+The run exits with code 1 when a p95 budget from thresholds.py or the failure ratio is exceeded.
+'''
+from locust import events
+from locust.runners import MasterRunner
+
+from dataset import Dataset
+from scenarios import AnonymousShopper, ApiUser, Customer, Seller  # noqa: F401
+from thresholds import fail_on_breaches
+
+
+@events.init_command_line_parser.add_listener
+def add_arguments(parser):
+    group = parser.add_argument_group('Dataset', 'Users created by manage.py generate_dataset')
+    group.add_argument('--dataset-first-user', type=int, default=1, help='Number of the first user<number>')
+    group.add_argument('--dataset-sellers', type=int, default=20, help='How many of the first users own a store')
+    group.add_argument('--dataset-users', type=int, default=1000, help='Number of generated users')
+    group.add_argument('--dataset-password', default='password123')
+    group.add_argument('--sla-scale', type=float, default=1.0, help='Multiplier of every p95 threshold')
+
+
+@events.test_start.add_listener
+def load_dataset(environment, **kwargs):
+    # В распределённом режиме нагрузку создают воркеры, мастеру данные не нужны
+    if isinstance(environment.runner, MasterRunner):
+        return
+    ApiUser.dataset = Dataset.from_options(environment.parsed_options)
+    ApiUser.dataset.load_products(environment.host)
+
+
+@events.quitting.add_listener
+def check_sla(environment, **kwargs):
+    # Статистика со всех воркеров собирается на мастере
+    if environment.parsed_options.worker:
+        return
+    fail_on_breaches(environment, environment.parsed_options.sla_scale)
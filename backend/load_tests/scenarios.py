@@ -0,0 +1,201 @@
+import random
+
+from locust import HttpUser, between, task
+from locust.exception import StopUser
+
+
+PRODUCT_TYPES = ('Full Set', 'Clothes', 'Wig', 'Shoes', 'Lenses', 'Details', 'Others')
+FANDOM_TYPES = ('Games', 'Anime', 'Series', 'Movies', 'Cartoons', 'Other')
+ORDERINGS = ('-total_ordered_quantity', '-timestamp', 'actual_price', '-actual_price', '-average_score')
+SEARCH_TERMS = ('wig', 'set', 'shoes', 'lenses', 'clothes', 'details', 'character', 'fandom')
+SENT_STATUS = 3
+
+
+def get_results(response):
+    data = response.json()
+    return data['results'] if isinstance(data, dict) else data
+
+
+def random_filters():
+    '''Filters of the product list sidebar, every request gets a different combination'''
+    filters = {'ordering': random.choice(ORDERINGS)}
+    if random.random() < 0.4:
+        filters['product_type__exact'] = random.choice(PRODUCT_TYPES)
+    if random.random() < 0.3:
+        filters['cosplay_character__fandom__fandom_type'] = random.choice(FANDOM_TYPES)
+    if random.random() < 0.3:
+        low = random.randrange(0, 10000, 500)
+        filters.update(price__gte=low, price__lte=low + random.choice((1000, 5000, 20000)))
+    if random.random() < 0.2:
+        filters['average_score__gte'] = random.choice((3, 4, 4.5))
+    return filters
+
+
+class ApiUser(HttpUser):
+    '''Base journey: the dataset is set by locustfile.py once per process'''
+    abstract = True
+    dataset = None
+
+    def login(self, email):
+        '''JWT for the rest of the session, the password is the one of the generated dataset'''
+        with self.client.post('/api/auth/jwt/create/', json={'email': email, 'password': self.dataset.password},
+                              catch_response=True) as response:
+            if response.status_code != 200:
+                response.failure(f'Login of {email} failed: {response.status_code}')
+                raise StopUser()
+            self.client.headers['Authorization'] = f'JWT {response.json()["access"]}'
+
+    def browse(self):
+        '''Product list with filters, sometimes the next page by cursor'''
+        response = self.client.get('/api/products/', params=random_filters(), name='/api/products/')
+        if response.ok and random.random() < 0.3 and response.json().get('next'):
+            self.client.get(response.json()['next'], name='/api/products/?cursor=')
+
+    def search(self):
+        query = random.choice(SEARCH_TERMS)
+        self.client.get('/api/products/suggest/', params={'q': query[:3]}, name='/api/products/suggest/')
+        params = {'q': query, **random_filters()}
+        self.client.get('/api/products/', params=params, name='/api/products/?q=')
+        self.client.get('/api/products/facets/', params=params, name='/api/products/facets/')
+
+    def view_product(self):
+        _, slug = self.dataset.random_product()
+        self.client.get(f'/api/products/{slug}/', name='/api/products/[slug]/')
+
+    def add_to_cart(self):
+        product_id, _ = self.dataset.random_product()
+        # 400 (нет на складе) и 404 (товар скрыт) ожидаемы для случайного товара
+        with self.client.post(f'/api/cart/add/{product_id}/1/', name='/api/cart/add/[id]/[quantity]/',
+                              catch_response=True) as response:
+            if response.status_code in (400, 404):
+                response.success()
+                return None
+        return product_id
+
+
+class AnonymousShopper(ApiUser):
+    '''Browsing, search and the session cart, some shoppers check out without an account'''
+    weight = 6
+    wait_time = between(1, 5)
+
+    @task(10)
+    def browse_products(self):
+        self.browse()
+
+    @task(5)
+    def search_products(self):
+        self.search()
+
+    @task(8)
+    def product_detail(self):
+        self.view_product()
+
+    @task(3)
+    def cart(self):
+        product_id = self.add_to_cart()
+        self.client.get('/api/cart/')
+        if product_id and random.random() < 0.3:
+            self.client.post(f'/api/cart/reduce/{product_id}/1/', name='/api/cart/reduce/[id]/[quantity]/')
+
+    @task(1)
+    def checkout(self):
+        if not self.add_to_cart():
+            return
+        self.client.get('/api/orders/create/')
+        response = self.client.post('/api/orders/create/', json={
+            'name': 'Loadtest',
+            'email': 'loadtest@example.com',
+            'phone_number': '79990000000',
+            'address': 'Synthetic street, 1',
+            'card': f'{random.randrange(10 ** 15, 10 ** 16)}',
+        })
+        if response.status_code == 201:
+            self.client.post(f'/api/orders/{response.json()["order_id"]}/payment-create/',
+                             name='/api/orders/[id]/payment-create/')
+
+
+class Customer(ApiUser):
+    '''Authenticated customer: favorites, cart, order history, checkout with the saved card and address'''
+    weight = 3
+    wait_time = between(1, 5)
+
+    def on_start(self):
+        self.login(self.dataset.random_customer())
+
+    @task(6)
+    def browse_products(self):
+        self.browse()
+
+    @task(4)
+    def product_detail(self):
+        self.view_product()
+
+    @task(2)
+    def favorites(self):
+        self.client.get('/api/favorites/')
+
+    @task(2)
+    def orders(self):
+        self.client.get('/api/orders/')
+
+    @task(3)
+    def cart(self):
+        product_id = self.add_to_cart()
+        self.client.get('/api/cart/')
+        if product_id and random.random() < 0.3:
+            self.client.post(f'/api/cart/reduce/{product_id}/1/', name='/api/cart/reduce/[id]/[quantity]/')
+
+    @task(1)
+    def checkout(self):
+        if not self.add_to_cart():
+            return
+        response = self.client.get('/api/orders/create/')
+        if response.status_code != 200:
+            return
+        data = response.json()
+        if not (data['addresses'] and data['cards']):
+            return
+        response = self.client.post('/api/orders/create/', json={
+            'name': 'Loadtest',
+            'phone_number': '79990000000',
+            'address': data['addresses'][0]['id'],
+            'card': data['cards'][0]['id'],
+        })
+        if response.status_code == 201:
+            self.client.post(f'/api/orders/{response.json()["order_id"]}/payment-create/',
+                             name='/api/orders/[id]/payment-create/')
+
+
+class Seller(ApiUser):
+    '''Store owner dashboard: orders, transactions, catalogue and shipping order items'''
+    weight = 1
+    wait_time = between(2, 8)
+
+    def on_start(self):
+        self.login(self.dataset.random_seller())
+        stores = get_results(self.client.get('/api/users/stores/'))
+        if not stores:
+            raise StopUser()
+        self.store_slug = stores[0]['store']['slug']
+
+    @task(4)
+    def store_orders(self):
+        response = self.client.get(f'/api/stores/{self.store_slug}/orders/', params={'cursor': ''},
+                                   name='/api/stores/[slug]/orders/')
+        if not response.ok or random.random() > 0.3:
+            return
+
+        created = [item for item in get_results(response) if str(item['status']) in ('1', '2')]
+        if created:
+            self.client.post(
+                f'/api/stores/{self.store_slug}/orders/{random.choice(created)["slug"]}/update-status/{SENT_STATUS}/',
+                name='/api/stores/[slug]/orders/[slug]/update-status/[status]/')
+
+    @task(3)
+    def store_transactions(self):
+        self.client.get(f'/api/stores/{self.store_slug}/transactions/', params={'cursor': ''},
+                        name='/api/stores/[slug]/transactions/')
+
+    @task(3)
+    def store_products(self):
+        self.client.get(f'/api/stores/{self.store_slug}/products/', name='/api/stores/[slug]/products/')
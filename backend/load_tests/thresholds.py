@@ -0,0 +1,56 @@
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# p95 времени ответа в мс по имени запроса (см. name= в scenarios.py)
+DEFAULT_P95 = 800
+P95_THRESHOLDS = {
+    ('GET', '/api/products/'): 300,
+    ('GET', '/api/products/?q='): 400,
+    ('GET', '/api/products/facets/'): 300,
+    ('GET', '/api/products/suggest/'): 100,
+    ('GET', '/api/products/[slug]/'): 250,
+    ('GET', '/api/products/batch/'): 150,
+    ('POST', '/api/auth/jwt/create/'): 500,
+    ('GET', '/api/cart/'): 200,
+    ('POST', '/api/cart/add/[id]/[quantity]/'): 200,
+    ('POST', '/api/cart/reduce/[id]/[quantity]/'): 200,
+    ('GET', '/api/favorites/'): 250,
+    ('GET', '/api/orders/'): 250,
+    ('GET', '/api/orders/create/'): 300,
+    ('POST', '/api/orders/create/'): 800,
+    ('POST', '/api/orders/[id]/payment-create/'): 800,
+    ('GET', '/api/users/stores/'): 200,
+    ('GET', '/api/stores/[slug]/orders/'): 400,
+    ('GET', '/api/stores/[slug]/transactions/'): 400,
+    ('GET', '/api/stores/[slug]/products/'): 400,
+    ('POST', '/api/stores/[slug]/orders/[slug]/update-status/[status]/'): 400,
+}
+MAX_FAILURE_RATIO = 0.01
+
+
+def check_thresholds(stats, scale=1.0):
+    '''Breached SLAs of the finished run as messages, scale relaxes or tightens every p95 budget'''
+    breaches = []
+    for (name, method), entry in sorted(stats.entries.items()):
+        if not entry.num_requests:
+            continue
+        budget = P95_THRESHOLDS.get((method, name), DEFAULT_P95) * scale
+        p95 = entry.get_response_time_percentile(0.95)
+        if p95 > budget:
+            breaches.append(f'{method} {name}: p95 {p95:.0f} ms > {budget:.0f} ms')
+
+    total = stats.total
+    if total.num_requests and total.fail_ratio > MAX_FAILURE_RATIO:
+        breaches.append(f'Failure ratio {total.fail_ratio:.2%} > {MAX_FAILURE_RATIO:.0%}')
+    return breaches
+
+
+def fail_on_breaches(environment, scale=1.0):
+    breaches = check_thresholds(environment.stats, scale)
+    for breach in breaches:
+        logger.error('SLA breached: %s', breach)
+    if breaches:
+        environment.process_exit_code = 1
+    return breaches
@@ -0,0 +1,71 @@
+from collections import namedtuple
+
+from cart.cart import Cart
+from cart.models import CartItem
+from products.models import Product
+from products.signals import order_items_bulk_created
+
+from . import inventory
+from .models import OrderItem
+from .slugs import order_item_slugs
+
+
+CheckoutLine = namedtuple('CheckoutLine', ('product', 'quantity', 'price'))
+
+
+class CheckoutError(Exception):
+    '''Cart that cannot be ordered, the message is returned to the client'''
+
+
+def get_cart_lines(request):
+    '''Lines of the user's or the session cart with their products, in one query'''
+    if request.user.is_authenticated:
+        cart_items = CartItem.objects.select_related('product').filter(user=request.user).order_by('pk')
+        return [CheckoutLine(item.product, item.quantity, item.product.get_real_price()) for item in cart_items]
+
+    session_cart = Cart(request).cart
+    products = Product.objects.in_bulk([int(product_id) for product_id in session_cart])
+    lines = []
+    for product_id, item in session_cart.items():
+        product = products.get(int(product_id))
+        if product is None:
+            raise CheckoutError('Product is not available to purchase.')
+        lines.append(CheckoutLine(product, item['quantity'], product.get_real_price()))
+    return lines
+
+
+def validate_lines(lines):
+    if not lines:
+        raise CheckoutError('Your cart is empty.')
+
+    for line in lines:
+        product = line.product
+        if not product.is_active or (product.in_stock is not None and product.in_stock < line.quantity):
+            raise CheckoutError('Product is not available to purchase.')
+
+
+def reserve_stock(lines):
+    '''Take the stock of the lines before the order is written, all or nothing, ids of the sold out products'''
+    try:
+        return inventory.take_stock(inventory.get_stock_quantities(lines))
+    except inventory.InsufficientStock:
+        raise CheckoutError('Product is not available to purchase.')
+
+
+def get_total_price(lines):
+    return sum(line.price * line.quantity for line in lines)
+
+
+def create_order_items(order, lines, sold_out=()):
+    '''All items of the order and its stock reservations with one INSERT each'''
+    # Slug всех позиций резервируются одним обращением к Redis, без проверок в базе
+    slugs = order_item_slugs.generate(len(lines))
+    order_items = [
+        OrderItem(slug=slug, order=order, product=line.product, quantity=line.quantity, price=line.price, status=1)
+        for line, slug in zip(lines, slugs)
+    ]
+    OrderItem.objects.bulk_create(order_items)
+    inventory.create_reservations(order, inventory.get_stock_quantities(lines), sold_out)
+
+    order_items_bulk_created(order_items)
+    return order_items
@@ -0,0 +1,135 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from products.models import Product
+from products.signals import products_stock_changed
+
+from .models import StockReservation
+
+
+class InsufficientStock(Exception):
+    '''Some product has less stock than requested, nothing was taken'''
+
+
+def get_stock_quantities(items):
+    '''{product_id: quantity} of order items or cart lines whose products have limited stock'''
+    quantities = defaultdict(int)
+    for item in items:
+        if item.product.in_stock is not None:
+            quantities[item.product.pk] += item.quantity
+    return dict(quantities)
+
+
+def lock_products(product_ids):
+    '''{product_id: in_stock} of the locked products'''
+    # Строки товаров блокируются по возрастанию id: параллельные заказы одних и тех же
+    # товаров встают в очередь, а не ловят взаимную блокировку
+    return dict(Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('pk', 'in_stock'))
+
+
+def get_quantity_case(quantities):
+    return Case(*[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+                default=Value(0), output_field=IntegerField())
+
+
+def take_stock(quantities):
+    '''
+    Decrement the stock of all products or none of them, ids of the products it sold out.
+    One conditional UPDATE takes the stock only where in_stock >= quantity, so concurrent
+    purchases cannot oversell, and deactivates the products whose stock reaches zero.
+    '''
+    if not quantities:
+        return set()
+
+    with transaction.atomic():
+        stock = lock_products(quantities)
+        enough_stock = Q()
+        for product_id, quantity in quantities.items():
+            enough_stock |= Q(pk=product_id, in_stock__gte=quantity)
+        # В UPDATE правая часть вычисляется по старым значениям: in_stock == quantity значит остаток станет 0
+        updated = Product.objects.filter(enough_stock, is_active=True).update(
+            in_stock=F('in_stock') - get_quantity_case(quantities),
+            is_active=Case(
+                *[When(pk=product_id, in_stock=quantity, then=Value(False)) for product_id, quantity in quantities.items()],
+                default=F('is_active')
+            ),
+        )
+        if updated < len(quantities):
+            raise InsufficientStock
+
+    products_stock_changed(quantities)
+    return {product_id for product_id, quantity in quantities.items() if stock[product_id] == quantity}
+
+
+def return_stock(quantities, reactivate=()):
+    '''
+    Put the stock back. Only the products in reactivate, the ones take_stock sold out, are
+    activated again: a product with zero stock may also be deactivated by its seller.
+    '''
+    if not quantities:
+        return
+
+    with transaction.atomic():
+        lock_products(quantities)
+        Product.objects.filter(pk__in=quantities, in_stock__isnull=False).update(
+            in_stock=F('in_stock') + get_quantity_case(quantities),
+            is_active=Case(When(pk__in=reactivate, then=Value(True)), default=F('is_active')),
+        )
+
+    products_stock_changed(quantities)
+
+
+def create_reservations(order, quantities, sold_out=()):
+    '''
+    Stock taken for the order is returned by the sweeper if it is not paid within STOCK_RESERVATION_TTL.
+    sold_out are the products take_stock deactivated for this order, the sweeper activates them again.
+    '''
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    return StockReservation.objects.bulk_create(
+        StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at,
+                         sold_out=product_id in sold_out)
+        for product_id, quantity in quantities.items()
+    )
+
+
+def commit_reservations(order, order_items):
+    '''
+    Keep the stock of a paid order: its reservations are deleted.
+    Stock the sweeper has already returned (and orders created before reservations) is taken again.
+    '''
+    with transaction.atomic():
+        reserved = defaultdict(int)
+        reservations = list(StockReservation.objects.select_for_update().filter(order=order))
+        for reservation in reservations:
+            reserved[reservation.product_id] += reservation.quantity
+        StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).delete()
+
+        missing = {
+            product_id: quantity - reserved[product_id]
+            for product_id, quantity in get_stock_quantities(order_items).items()
+            if quantity > reserved[product_id]
+        }
+        take_stock(missing)
+
+
+def release_expired_reservations(batch_size=500):
+    '''Return the stock of orders that were not paid in time, number of released reservations'''
+    with transaction.atomic():
+        # Занятые оплатой резервы пропускаются, их заберёт следующий запуск или оплата
+        reservations = list(StockReservation.objects.select_for_update(skip_locked=True).filter(
+            expires_at__lte=timezone.now()).order_by('pk')[:batch_size])
+        if not reservations:
+            return 0
+
+        quantities = defaultdict(int)
+        for reservation in reservations:
+            quantities[reservation.product_id] += reservation.quantity
+        StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).delete()
+        return_stock(quantities, {reservation.product_id for reservation in reservations if reservation.sold_out})
+
+    return len(reservations)
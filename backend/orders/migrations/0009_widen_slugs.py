@@ -0,0 +1,23 @@
+# Generated by Django 4.2.5 on 2026-10-18 10:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='slug',
+            field=models.SlugField(allow_unicode=True, editable=False, max_length=19, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='slug',
+            field=models.SlugField(allow_unicode=True, editable=False, max_length=18, unique=True),
+        ),
+    ]
@@ -1,12 +1,12 @@
 from django.db import models
-from django.db.utils import IntegrityError
-from django.utils.crypto import get_random_string
 
 from django.core.validators import MinLengthValidator
 
 from users.models import User
 from products.models import Product
 
+from .slugs import order_item_slugs, order_slugs
+
 
 ORDER_STATUS_CHOICES = (
 	(0, 'Cancelled'),
@@ -27,7 +27,7 @@ ORDER_ITEM_STATUS_CHOICES = (
 
 class Order(models.Model):
 	"""Order model"""
-	slug = models.SlugField(unique=True, allow_unicode=True, max_length=13, editable=False)
+	slug = models.SlugField(unique=True, allow_unicode=True, max_length=19, editable=False)
 	customer = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True)
 	name = models.CharField(max_length=100, blank=False, null=False)
 	phone_number = models.CharField(max_length=12, blank=False, null=False,
@@ -48,24 +48,19 @@ class Order(models.Model):
 
 	def save(self, *args, **kwargs):
 		if not self.slug:
-			while True:
-				digits_string = get_random_string(length=12, allowed_chars='1234567890')
-				self.slug = digits_string[:8] + '-' + digits_string[8:]
-				try:
-					super(Order, self).save(*args, **kwargs)
-				except IntegrityError:
-					continue
-				break
-		else:
-			super(Order, self).save(*args, **kwargs)
+			self.slug = order_slugs.generate()[0]
+		super(Order, self).save(*args, **kwargs)
 
 	class Meta:
 		ordering = ['-created_at']
+		indexes = [
+			models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_keyset_idx'),
+		]
 	
 
 class OrderItem(models.Model):
 	"""Order Product model"""
-	slug = models.SlugField(unique=True, allow_unicode=True, max_length=10, editable=False)
+	slug = models.SlugField(unique=True, allow_unicode=True, max_length=18, editable=False)
 	product = models.ForeignKey(Product, on_delete=models.PROTECT, 
 							    related_name='ordered_products')
 	order = models.ForeignKey(
@@ -86,15 +81,8 @@ class OrderItem(models.Model):
 	
 	def save(self, *args, **kwargs):
 		if not self.slug:
-			while True:
-				self.slug = get_random_string(length=10, allowed_chars='1234567890')
-				try:
-					super(OrderItem, self).save(*args, **kwargs)
-				except IntegrityError:
-					continue
-				break
-		else:
-			super(OrderItem, self).save(*args, **kwargs)
+			self.slug = order_item_slugs.generate()[0]
+		super(OrderItem, self).save(*args, **kwargs)
 
 	class Meta:
 		ordering = ['-created_at']
@@ -103,3 +91,17 @@ class OrderItem(models.Model):
 
 
 
+
+
+class StockReservation(models.Model):
+	"""Stock taken from a product for an unpaid order until expires_at"""
+	order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations')
+	product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_reservations')
+	quantity = models.PositiveIntegerField()
+	# Резерв забрал последний остаток и снял товар с продажи: при освобождении товар возвращается в продажу
+	sold_out = models.BooleanField(default=False)
+	created_at = models.DateTimeField(auto_now_add=True)
+	expires_at = models.DateTimeField(db_index=True)
+
+	def __str__(self):
+		return f'{self.order}: {self.product_id} x {self.quantity}'
@@ -0,0 +1,85 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from cards.models import Card, Transaction
+from products.signals import order_items_bulk_updated
+from stores.balances import credit_stores
+
+from . import inventory
+from .models import Order, OrderItem
+
+
+COMMISSION_RATE = 0.05
+# Магазин площадки: получает свои продажи целиком и комиссию с продаж остальных магазинов
+MAIN_STORE_ID = 1
+
+
+class PaymentError(Exception):
+    '''Order that cannot be paid, the message is returned to the client'''
+
+
+class Ledger:
+    '''Transactions and store proceeds of payments, computed in memory and posted at once'''
+
+    def __init__(self):
+        self.transactions = []
+        self.store_proceeds = defaultdict(int)
+
+    def purchase(self, order):
+        self.transactions.append(Transaction(card_id=order.card_id, transaction_type='Purchase',
+                                             amount=order.total_order_price, related_order_id=order.pk))
+
+    def sale(self, item, seller_id):
+        total = item.get_total_price()
+        self.transactions.append(Transaction(transaction_type='Sale', related_order_item_id=item.pk,
+                                             related_seller_id=seller_id, amount=total))
+        if seller_id == MAIN_STORE_ID:
+            self.store_proceeds[MAIN_STORE_ID] += total
+            return
+
+        commission = round(total * COMMISSION_RATE)
+        self.transactions.append(Transaction(transaction_type='Comission', related_order_item_id=item.pk,
+                                             related_seller_id=seller_id, amount=commission))
+        self.store_proceeds[seller_id] += total - commission
+        self.store_proceeds[MAIN_STORE_ID] += commission
+
+    def post(self):
+        '''One INSERT for the transactions, the proceeds go to the balance shards of the stores'''
+        Transaction.objects.bulk_create(self.transactions)
+        credit_stores(self.store_proceeds)
+
+
+def pay_order(order, order_items):
+    '''
+    Mark the unpaid order paid, debit the card, keep the reserved stock and post the ledger.
+    The number of statements does not depend on the number of items, order items need their product.
+    '''
+    with transaction.atomic():
+        # Заказ помечается оплаченным первым: UPDATE с условием на статус блокирует строку,
+        # и параллельная или повторная оплата того же заказа не списывает деньги и остатки ещё раз
+        now = timezone.now()
+        if not Order.objects.filter(pk=order.pk, status=1).update(status=2, updated_at=now):
+            raise PaymentError('Order is already paid.')
+
+        # Списание только при достаточном балансе, без чтения и save() карты
+        amount = order.total_order_price
+        if not Card.objects.filter(pk=order.card_id, balance__gte=amount).update(balance=F('balance') - amount):
+            raise PaymentError('Insufficient funds on the card.')
+
+        try:
+            inventory.commit_reservations(order, order_items)
+        except inventory.InsufficientStock:
+            raise PaymentError('Product is not available to purchase.')
+
+        ledger = Ledger()
+        ledger.purchase(order)
+        for item in order_items:
+            ledger.sale(item, item.product.seller_id)
+        ledger.post()
+
+        OrderItem.objects.filter(order=order).update(status=2, updated_at=now)
+
+    order_items_bulk_updated(order_items)
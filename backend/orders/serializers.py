@@ -4,18 +4,20 @@ from users.models import Address
 from users.serializers import AddressSerializer
 from cards.models import Card
 from cards.serializers import CardSimpleSerializer
+from common.compiled_serializers import CompiledListSerializer
+from common.sparse_fields import SparseFieldsetSerializerMixin
 from common.serializers import (
 	UserSimpleSerializer,
 	AddressSimpleSerializer,
 	CardListSerializer,
-	ProductSerializer,
 )
+from products.fragments import ProductCardField
 
 from .models import Order, OrderItem
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-	product = ProductSerializer(read_only=True)
+	product = ProductCardField(source='product_id')
 	total_price = serializers.SerializerMethodField()
 	order = serializers.SlugRelatedField(read_only=True, slug_field='slug')
 	
@@ -39,7 +41,7 @@ class OrderCartSerializer(serializers.Serializer):
 	cards = CardListSerializer(many=True)
 	
 
-class OrderListSerializer(serializers.ModelSerializer):
+class OrderListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
 	order_images = serializers.SerializerMethodField()
 	
 	def get_order_images(self, order):
@@ -52,6 +54,8 @@ class OrderListSerializer(serializers.ModelSerializer):
 
 	class Meta:
 		model = Order
+		list_serializer_class = CompiledListSerializer
+		eager_loading = {'order_images': ('order_items__product__product_images',)}
 		fields = ('id', 'slug', 'order_images', 'status',
 			      'created_at', 'updated_at', 'total_order_price')
 
@@ -75,6 +79,9 @@ class OrderCreateAuthenticatedSerializer(serializers.ModelSerializer):
 		super().__init__(*args, **kwargs)
 		user = self.context['request'].user
 
+		# Адреса и карты читаются один раз, их использует и оформление заказа
+		self.user_addresses = list(user.addresses.all())
+		self.user_cards = list(user.cards.all())
 		self.fields['address'].queryset = user.addresses.all()
 		self.fields['card'].queryset = user.cards.all()
 
@@ -84,25 +91,23 @@ class OrderCreateAuthenticatedSerializer(serializers.ModelSerializer):
 		if not user.phone_number:
 			self.fields['phone_number'] = serializers.CharField(required=True, max_length=12, min_length=11)
 
-		if not user.addresses.all():
+		if not self.user_addresses:
 			self.fields['address'] = serializers.CharField(required=True)
 
-		if not user.cards.all():
+		if not self.user_cards:
 			self.fields['card'] = serializers.CharField(max_length=16, min_length=16, required=True)
 
 	def validate_address(self, value):
-		user = self.context['request'].user
-		if value and user.addresses.all() and value not in user.addresses.all():
+		if value and self.user_addresses and value not in self.user_addresses:
 			raise serializers.ValidationError("This is not your address.")
 		return value
 	
 	def validate_card(self, value):
-		user = self.context['request'].user
-		if not user.cards.all():
+		if not self.user_cards:
 			if not value.isdigit():
 				raise serializers.ValidationError("Incorrect card number format.")
 		else:
-			if value and value not in user.cards.all():
+			if value and value not in self.user_cards:
 				raise serializers.ValidationError("This is not your card.")
 		return value
 	
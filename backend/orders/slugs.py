@@ -0,0 +1,67 @@
+import random
+import time
+from datetime import datetime, timezone
+
+from common.redis import get_counters_connection
+
+
+SLUG_COUNTER_KEY = 'slugs:{}:{}'
+SLUG_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+# Номеров на шард в миллисекунду, пока счётчик не начнёт обгонять часы
+SLUG_SEQUENCE_PER_MS = 1000
+
+# Счётчик не бывает меньше текущего времени: после рестарта Redis без последнего снимка
+# или очистки базы он продолжает с часов, а не с нуля, и не выдаёт уже занятые номера
+RESERVE_SCRIPT = '''
+local floor = tonumber(ARGV[2])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if current < floor then
+    redis.call('SET', KEYS[1], ARGV[2])
+end
+return redis.call('INCRBY', KEYS[1], ARGV[1])
+'''
+
+
+class SlugSequence:
+    '''
+    Unique time-ordered digit slugs, any number of them in one Redis call and without the database.
+    Each shard is a counter that never falls behind the clock (milliseconds since SLUG_EPOCH times
+    SLUG_SEQUENCE_PER_MS), so losing the counters cannot make them reissue slugs, and shard s hands
+    out counter * shards + s, so concurrent checkouts on different shards never overlap.
+    Slugs are longer than the random ones generated before, the two can never collide.
+    '''
+    shards = 16
+
+    def __init__(self, name, digits):
+        self.name = name
+        self.digits = digits
+        self.limit = 10 ** digits
+        self.script = None
+
+    def reserve(self, count):
+        '''count unique numbers, consecutive within the shard'''
+        if self.script is None:
+            self.script = get_counters_connection().register_script(RESERVE_SCRIPT)
+        shard = random.randrange(self.shards)
+        floor = int((time.time() - SLUG_EPOCH) * 1000) * SLUG_SEQUENCE_PER_MS
+        last = self.script(keys=[SLUG_COUNTER_KEY.format(self.name, shard)], args=[count, floor])
+        numbers = [sequence * self.shards + shard for sequence in range(last - count + 1, last + 1)]
+        if numbers and numbers[-1] >= self.limit:
+            raise OverflowError(f'{self.name} slugs are exhausted, {self.digits} digits are not enough')
+        return numbers
+
+    def format(self, number):
+        return f'{number:0{self.digits}d}'
+
+    def generate(self, count=1):
+        return [self.format(number) for number in self.reserve(count)] if count else []
+
+
+class OrderSlugSequence(SlugSequence):
+    def format(self, number):
+        digits = super().format(number)
+        return f'{digits[:9]}-{digits[9:]}'
+
+
+order_slugs = OrderSlugSequence('order', 18)
+order_item_slugs = SlugSequence('order_item', 18)
@@ -4,6 +4,7 @@ from django.contrib.auth import get_user_model
 
 from twilio.rest import Client
 from backend.celery import app
+from .inventory import release_expired_reservations
 from .models import Order
 
 User = get_user_model()
@@ -35,7 +36,7 @@ def send_email(subject, email_body, recipient_email):
 
 @app.task
 def send_order_created_notifications(user_is_authenticated, order_id):
-    order = Order.objects.get(id=order_id)
+    order = Order.objects.select_related('customer').get(id=order_id)
 
     if user_is_authenticated:
         recipient_name = order.customer.first_name
@@ -66,7 +67,7 @@ def send_order_created_notifications(user_is_authenticated, order_id):
 
 @app.task
 def send_order_paid_notifications(user_is_authenticated, order_id):
-    order = Order.objects.get(id=order_id)
+    order = Order.objects.select_related('customer').get(id=order_id)
 
     if user_is_authenticated:
         recipient_name = order.customer.first_name
@@ -93,3 +94,14 @@ def send_order_paid_notifications(user_is_authenticated, order_id):
         f"Подробнее о заказе по ссылке: {link}"
     )
     send_email(email_subject, email_body, recipient_email)
+
+
+@app.task
+def release_expired_stock_reservations(batch_size=500):
+    # Остатки неоплаченных вовремя заказов возвращаются на склад пачками
+    released = 0
+    while True:
+        count = release_expired_reservations(batch_size)
+        released += count
+        if count < batch_size:
+            return released
@@ -0,0 +1,160 @@
+from unittest import mock
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from .inventory import release_expired_reservations
+from .models import Order, StockReservation
+from .slugs import order_item_slugs, order_slugs
+from cards.models import Card, Transaction
+from cart.models import CartItem
+from common.redis import get_counters_connection
+from common.testing import create_catalog, create_product, create_store, create_user
+from products.models import Product, ProductStats
+from users.models import Address
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        _, self.store, character, _ = create_catalog()
+        self.products = [create_product(self.store, character, f'Product {i}', discount=10 if i % 2 else None)
+                         for i in range(10)]
+        self.customer = create_user('customer', first_name='Customer', phone_number='79999999999')
+        self.address = Address.objects.create(user=self.customer, address='Address')
+        self.card = Card.objects.create(user=self.customer, card_number='1234567812345678')
+
+    def checkout(self, products, authenticated=True):
+        if authenticated:
+            self.client.force_authenticate(self.customer)
+            data = {'address': self.address.id, 'card': self.card.id}
+        else:
+            self.client.force_authenticate(None)
+            data = {'name': 'Guest', 'email': 'guest@example.com', 'phone_number': '79999999999',
+                    'address': 'Address', 'card': '1234567812345678'}
+        for product in products:
+            self.client.post(reverse('cart:add-to-cart', args=(product.id, 2)))
+
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch('orders.views.send_order_created_notifications.delay'):
+            response = self.client.post(reverse('orders:order-create'), data)
+        return response, len(queries)
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        for authenticated in (True, False):
+            _, one_line_queries = self.checkout(self.products[:1], authenticated)
+            response, ten_lines_queries = self.checkout(self.products, authenticated)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(one_line_queries, ten_lines_queries)
+
+            order = Order.objects.get(pk=response.data['order_id'])
+            self.assertEqual(order.order_items.count(), 10)
+            self.assertEqual(order.total_order_price, sum(product.get_real_price() * 2 for product in self.products))
+
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(ProductStats.objects.get(product=self.products[0]).total_ordered_quantity, 8)
+        self.assertEqual(ProductStats.objects.get(product=self.products[1]).total_ordered_quantity, 4)
+
+    def test_unavailable_product_rejects_the_whole_cart(self):
+        # Остаток закончился уже после добавления в корзину
+        CartItem.objects.bulk_create(CartItem(user=self.customer, product=product, quantity=2)
+                                     for product in self.products[:3])
+        Product.objects.filter(pk=self.products[1].pk).update(in_stock=1)
+        response, _ = self.checkout([])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(user=self.customer).count(), 3)
+
+    def test_stock_is_reserved_until_the_order_expires(self):
+        product, withdrawn = self.products[:2]
+        Product.objects.filter(pk=product.pk).update(in_stock=2)
+        Product.objects.filter(pk=withdrawn.pk).update(in_stock=3)
+        product.refresh_from_db()
+        withdrawn.refresh_from_db()
+        response, _ = self.checkout([product, withdrawn])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        product.refresh_from_db()
+        self.assertEqual((product.in_stock, product.is_active), (0, False))
+        reservations = StockReservation.objects.filter(order_id=response.data['order_id']).order_by('product_id')
+        self.assertEqual([(reservation.product_id, reservation.quantity, reservation.sold_out)
+                          for reservation in reservations], [(product.pk, 2, True), (withdrawn.pk, 2, False)])
+
+        # Продавец сам снял товар с продажи, пока заказ не оплачен
+        Product.objects.filter(pk=withdrawn.pk).update(in_stock=0, is_active=False)
+
+        # Неоплаченный вовремя заказ возвращает остаток на склад
+        self.assertEqual(release_expired_reservations(), 0)
+        StockReservation.objects.update(expires_at=timezone.now())
+        self.assertEqual(release_expired_reservations(), 2)
+        product.refresh_from_db()
+        withdrawn.refresh_from_db()
+        self.assertEqual((product.in_stock, product.is_active), (2, True))
+        self.assertEqual((withdrawn.in_stock, withdrawn.is_active), (2, False))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_payment_query_count_does_not_depend_on_order_size(self):
+        marketplace = create_store(create_user('marketplace'), 'Marketplace', 2)
+        Card.objects.filter(pk=self.card.pk).update(balance=10 ** 6)
+        queries_count = []
+        for products in (self.products[:1], self.products):
+            order_id = self.checkout(products)[0].data['order_id']
+            with CaptureQueriesContext(connection) as queries, \
+                    mock.patch('orders.payment.MAIN_STORE_ID', marketplace.pk), \
+                    mock.patch('orders.views.send_order_paid_notifications.delay'):
+                response = self.client.post(reverse('orders:payment-create', args=(order_id,)))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            queries_count.append(len(queries))
+        self.assertEqual(queries_count[0], queries_count[1])
+
+        order = Order.objects.get(pk=order_id)
+        total = order.total_order_price
+        commission = sum(round(item.get_total_price() * 0.05) for item in order.order_items.all())
+        self.assertEqual(order.status, '2')
+        self.assertEqual(set(order.order_items.values_list('status', flat=True)), {'2'})
+        self.assertEqual(Transaction.objects.filter(related_order_item__order=order).count(), 20)
+        self.assertEqual(Transaction.objects.get(related_order=order).amount, total)
+
+        first_total = Order.objects.exclude(pk=order_id).get().total_order_price
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.balance, 10 ** 6 - first_total - total)
+        self.assertEqual(self.store.get_balance() + marketplace.get_balance(), first_total + total)
+        self.assertEqual(marketplace.get_balance(), round(first_total * 0.05) + commission)
+
+    def test_order_is_paid_only_once(self):
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(in_stock=4)
+        Card.objects.filter(pk=self.card.pk).update(balance=10 ** 6)
+        order_id = self.checkout([product])[0].data['order_id']
+
+        with mock.patch('orders.payment.MAIN_STORE_ID', self.store.pk), \
+                mock.patch('orders.views.send_order_paid_notifications.delay'):
+            responses = [self.client.post(reverse('orders:payment-create', args=(order_id,))) for _ in range(2)]
+        self.assertEqual([response.status_code for response in responses],
+                         [status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST])
+
+        # Повторная оплата не списывает ни деньги, ни остаток
+        self.card.refresh_from_db()
+        product.refresh_from_db()
+        self.assertEqual(self.card.balance, 10 ** 6 - Order.objects.get(pk=order_id).total_order_price)
+        self.assertEqual(product.in_stock, 2)
+        self.assertEqual(Transaction.objects.filter(related_order_id=order_id).count(), 1)
+
+    def test_slugs_are_reserved_in_bulk_without_database(self):
+        with self.assertNumQueries(0):
+            item_slugs = order_item_slugs.generate(500) + order_item_slugs.generate(500)
+            order_slug = order_slugs.generate()[0]
+
+        self.assertEqual(len(set(item_slugs)), 1000)
+        self.assertTrue(all(len(slug) == 18 and slug.isdigit() for slug in item_slugs))
+        self.assertRegex(order_slug, r'^\d{9}-\d{9}$')
+
+    def test_slugs_survive_lost_counters(self):
+        issued = set(order_item_slugs.generate(1000))
+        get_counters_connection().flushdb()
+
+        self.assertFalse(issued & set(order_item_slugs.generate(1000)))
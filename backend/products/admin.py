@@ -1,11 +1,12 @@
 from django.contrib import admin
 
-from .models import Product, Review, ProductImage, Answer
+from .models import Product, Review, ProductImage, Answer, ProductStats
 
 
 admin.site.register(Review)
 admin.site.register(ProductImage)
 admin.site.register(Answer)
+admin.site.register(ProductStats)
 
 
 class ProductImageInline(admin.TabularInline):
@@ -19,7 +19,11 @@ class ProductDocument(Document):
         'is_admin_store': fields.BooleanField(),
         'bio': fields.TextField(analyzer='custom_analyzer'),
     })
-    title = fields.TextField(analyzer='custom_analyzer')
+    title = fields.TextField(analyzer='custom_analyzer',
+                             fields={'exact': fields.KeywordField()})
+    slug = fields.KeywordField(index=False)
+    # Подсказки поисковой строки: префиксы названия, персонажа и фандома
+    suggest = fields.CompletionField(analyzer='suggest_analyzer')
     description = fields.TextField(analyzer='custom_analyzer')
     price = fields.IntegerField(attr='get_real_price')
     discount = fields.IntegerField()
@@ -41,6 +45,8 @@ class ProductDocument(Document):
     shoes_size = fields.TextField(analyzer='custom_analyzer',
                                   fields={'exact': fields.KeywordField()})
     timestamp = fields.DateField()
+    in_stock = fields.IntegerField()
+    is_active = fields.BooleanField()
     reviews_count = fields.IntegerField()
     average_score = fields.FloatField()
     total_ordered_quantity = fields.IntegerField()
@@ -57,6 +63,11 @@ class ProductDocument(Document):
                         'tokenizer': 'standard',
                         'filter': ['lowercase', 'asciifolding',
                                    'stop', 'stemmer',]
+                    },
+                    'suggest_analyzer': {
+                        'type': 'custom',
+                        'tokenizer': 'standard',
+                        'filter': ['lowercase', 'asciifolding']
                     }
                 }
             }
@@ -65,6 +76,34 @@ class ProductDocument(Document):
     class Django:
         model = Product
         related_models = [Store, Character, Fandom]
+        queryset_pagination = 1000
+
+    def get_queryset(self):
+        # Статистика подтягивается join-ом ProductStats в том же запросе, что и пачка товаров
+        return super().get_queryset().select_related('stats', 'seller', 'cosplay_character__fandom')
+
+    def prepare_reviews_count(self, instance):
+        stats = getattr(instance, 'stats', None)
+        return stats.reviews_count if stats else 0
+
+    def prepare_average_score(self, instance):
+        stats = getattr(instance, 'stats', None)
+        return stats.average_score if stats else 0
+
+    def prepare_total_ordered_quantity(self, instance):
+        stats = getattr(instance, 'stats', None)
+        return stats.total_ordered_quantity if stats else 0
+
+    def prepare_suggest(self, instance):
+        if not instance.is_active:
+            return []
+        character = instance.cosplay_character
+        inputs = [instance.title, character.name, character.fandom.name] if character else [instance.title]
+        stats = getattr(instance, 'stats', None)
+        return {
+            'input': inputs,
+            'weight': min(stats.total_ordered_quantity if stats else 0, 2 ** 31 - 1),
+        }
 
     def get_instances_from_related(self, related_instance):
         if isinstance(related_instance, Store):
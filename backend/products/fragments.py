@@ -0,0 +1,195 @@
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from rest_framework import serializers
+
+from common.redis import get_redis_connection
+from common.serializers import ProductSerializer
+from common.sparse_fields import prune_data
+
+from .indexing import RELATED_PRODUCT_LOOKUPS
+from .models import Product
+
+
+# Увеличивается при изменении формата карточки, старые фрагменты просто перестают читаться
+PRODUCT_CARD_VERSION = 2
+# Фрагмент ключуется версией своего товара: изменение товара увеличивает счётчик, а не удаляет ключ
+PRODUCT_CARD_KEY = f'products:card:v{PRODUCT_CARD_VERSION}:{{}}:{{}}'
+PRODUCT_CARD_VERSION_KEY = 'products:card-version:{}'
+PRODUCT_CARD_TIMEOUT = 60 * 60 * 24
+PRODUCT_CARD_MISSING_TIMEOUT = 60
+# Поля карточки с путями к медиа: в кэше они относительные, абсолютными становятся при отдаче
+PRODUCT_CARD_MEDIA_FIELDS = (
+    ('product_images', 'image'),
+    ('seller', 'logo'),
+    ('cosplay_character', 'image'),
+    ('cosplay_character', 'fandom', 'image'),
+)
+
+
+def make_media_absolute(data, path, request):
+    if isinstance(data, list):
+        return [make_media_absolute(item, path, request) for item in data]
+    if not isinstance(data, dict) or data.get(path[0]) is None:
+        return data
+
+    field, value = path[0], data[path[0]]
+    value = make_media_absolute(value, path[1:], request) if len(path) > 1 else request.build_absolute_uri(value)
+    return {**data, field: value}
+
+
+def render_product_card(card, request):
+    '''Copy of a cached card with absolute media URLs for the request'''
+    if request is None:
+        return card
+    for path in PRODUCT_CARD_MEDIA_FIELDS:
+        card = make_media_absolute(card, path, request)
+    return card
+
+
+def get_product_card_versions(product_ids):
+    '''{product_id: version} with one MGET, counters evicted from Redis start again from the current time'''
+    connection = get_redis_connection()
+    keys = [PRODUCT_CARD_VERSION_KEY.format(product_id) for product_id in product_ids]
+    versions = connection.mget(keys)
+
+    if None in versions:
+        # Начальное значение от времени, чтобы после вытеснения счётчика не вернуть старую версию
+        start = int(time.time() * 1000)
+        with connection.pipeline() as pipeline:
+            for key, version in zip(keys, versions):
+                if version is None:
+                    pipeline.set(key, start, nx=True)
+            pipeline.mget(keys)
+            versions = pipeline.execute()[-1]
+
+    return {product_id: int(version) for product_id, version in zip(product_ids, versions)}
+
+
+def get_product_cards_by_id(product_ids, request):
+    '''
+    Serialized ProductSerializer cards by product id, products that do not exist are left out.
+    Product versions and cached cards are read with one MGET each, the misses are loaded
+    with one query and cached. A card built from data a concurrent write has just replaced
+    is stored under the version that write retires, so it is never read.
+    Fragments do not depend on the request: media paths are stored relative and made absolute
+    for the request host on the way out, so a forged Host header cannot grow the cache.
+    '''
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return {}
+
+    versions = get_product_card_versions(product_ids)
+    keys = {product_id: PRODUCT_CARD_KEY.format(product_id, versions[product_id]) for product_id in product_ids}
+    fragments = cache.get_many(keys.values())
+    cards = {product_id: fragments[key] for product_id, key in keys.items() if key in fragments}
+
+    missing_ids = [product_id for product_id in product_ids if product_id not in cards]
+    if missing_ids:
+        products = Product.objects.for_cards().filter(pk__in=missing_ids)
+        for card in ProductSerializer(products, many=True, context={'request': None}).data:
+            cards[card['id']] = card
+
+        found, not_found = {}, {}
+        for product_id in missing_ids:
+            if cards.get(product_id):
+                found[keys[product_id]] = cards[product_id]
+            else:
+                # Несуществующие товары тоже кэшируются, но ненадолго
+                not_found[keys[product_id]] = cards[product_id] = False
+        cache.set_many(found, PRODUCT_CARD_TIMEOUT)
+        cache.set_many(not_found, PRODUCT_CARD_MISSING_TIMEOUT)
+
+    return {product_id: render_product_card(card, request) for product_id, card in cards.items() if card}
+
+
+def get_product_cards(product_ids, request, active_only=True):
+    '''Cards in the order of product_ids, hidden products are skipped unless active_only is False'''
+    cards = get_product_cards_by_id(product_ids, request)
+    return [
+        cards[product_id] for product_id in product_ids
+        if product_id in cards and (cards[product_id]['is_active'] or not active_only)
+    ]
+
+
+class ProductCardField(serializers.Field):
+    '''
+    Read-only product card taken from context['product_cards'] (see ProductCardsMixin),
+    the rest of the item (quantity, price) is serialized as usual on top of it.
+    Accepts a product or its id, so source='product_id' avoids loading the product at all.
+    The cards are never fetched per item: a context without them is an error.
+    '''
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+        # Выставляются common.sparse_fields.prune_fields для ?fields=product.title
+        self.sparse_include = None
+        self.sparse_omit = ()
+
+    def to_representation(self, value):
+        return self.compile_representation(self.context)(value)
+
+    def compile_representation(self, context):
+        '''Converter for common.compiled_serializers, the context is resolved once per response'''
+        if 'product_cards' not in context:
+            raise ImproperlyConfigured(
+                f'{type(self.parent).__name__}.{self.field_name} needs the product cards of all items in the '
+                f'serializer context, use ProductCardsMixin or get_product_cards_context()')
+        cards = context['product_cards']
+        include, omit = self.sparse_include, self.sparse_omit
+
+        def converter(value):
+            # Товара нет среди карточек, только если он удалён
+            card = cards.get(getattr(value, 'pk', value))
+            if card is None or (include is None and not omit):
+                return card
+            return prune_data(card, include, omit)
+
+        return converter
+
+
+def get_product_cards_context(request, product_ids):
+    '''Serializer context for ProductCardField outside of generic views'''
+    return {'request': request, 'product_cards': get_product_cards_by_id(product_ids, request)}
+
+
+class ProductCardsMixin:
+    '''
+    Prefetches the product cards of everything passed to get_serializer with one MGET.
+    Views serializing something else than a page of items with product_id override get_card_product_ids.
+    '''
+    def get_card_product_ids(self, instance):
+        return [item.product_id for item in instance]
+
+    def get_serializer(self, *args, **kwargs):
+        if args and 'context' not in kwargs:
+            kwargs['context'] = {
+                **self.get_serializer_context(),
+                **get_product_cards_context(self.request, self.get_card_product_ids(args[0])),
+            }
+        return super().get_serializer(*args, **kwargs)
+
+
+def invalidate_product_cards(product_ids):
+    '''Retires the current cards of the products after the transaction commits'''
+    keys = [PRODUCT_CARD_VERSION_KEY.format(product_id) for product_id in product_ids]
+    if not keys:
+        return
+
+    def bump():
+        start = int(time.time() * 1000)
+        with get_redis_connection().pipeline(transaction=False) as pipeline:
+            for key in keys:
+                pipeline.set(key, start, nx=True)
+                pipeline.incr(key)
+            pipeline.execute()
+
+    transaction.on_commit(bump)
+
+
+def invalidate_related_product_cards(instance):
+    '''Cards embed the seller, the character and the fandom'''
+    lookup = RELATED_PRODUCT_LOOKUPS[instance._meta.label_lower]
+    invalidate_product_cards(Product.objects.filter(**{lookup: [instance.pk]}).values_list('pk', flat=True))
@@ -0,0 +1,172 @@
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import signals
+from django_elasticsearch_dsl.apps import DEDConfig
+from django_elasticsearch_dsl.signals import BaseSignalProcessor
+from elasticsearch.helpers import bulk
+
+from common.redis import get_redis_connection
+
+from .documents import ProductDocument
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_QUEUE_KEY = 'search:products:index'
+RELATED_QUEUE_KEY = 'search:products:related'
+# Пока идёт полная переиндексация, изменения пишутся и в новый индекс
+REINDEX_TARGET_KEY = 'search:products:reindex:target'
+REINDEX_TOUCHED_KEY = 'search:products:reindex:touched'
+
+# Связанные модели раскрываются в id товаров уже в воркере, а не в запросе
+RELATED_PRODUCT_LOOKUPS = {
+    'stores.store': 'seller_id__in',
+    'fandoms.character': 'cosplay_character_id__in',
+    'fandoms.fandom': 'cosplay_character__fandom_id__in',
+}
+
+
+def enqueue_products(product_ids):
+    product_ids = [str(product_id) for product_id in product_ids]
+    if product_ids:
+        transaction.on_commit(lambda: get_redis_connection().sadd(INDEX_QUEUE_KEY, *product_ids))
+
+
+def enqueue_related(instance):
+    ref = f'{instance._meta.label_lower}:{instance.pk}'
+    transaction.on_commit(lambda: get_redis_connection().sadd(RELATED_QUEUE_KEY, ref))
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    '''
+    Signal processor that only enqueues product ids into Redis sets.
+    Repeated changes of the same product coalesce in the set and the
+    index_queued_products task sends them to Elasticsearch in one bulk request.
+    '''
+
+    def setup(self):
+        self.product_model = apps.get_model('products', 'Product')
+        self.related_models = [apps.get_model(label) for label in RELATED_PRODUCT_LOOKUPS]
+
+        for model in [self.product_model, *self.related_models]:
+            signals.post_save.connect(self.handle_save, sender=model)
+        signals.post_delete.connect(self.handle_delete, sender=self.product_model)
+
+    def teardown(self):
+        for model in [self.product_model, *self.related_models]:
+            signals.post_save.disconnect(self.handle_save, sender=model)
+        signals.post_delete.disconnect(self.handle_delete, sender=self.product_model)
+
+    def handle_save(self, sender, instance, raw=False, **kwargs):
+        if raw or not DEDConfig.autosync_enabled():
+            return
+
+        if sender is self.product_model:
+            enqueue_products([instance.pk])
+        else:
+            enqueue_related(instance)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        # Товара уже нет в базе, поэтому воркер удалит его документ из индекса
+        if DEDConfig.autosync_enabled():
+            enqueue_products([instance.pk])
+
+
+def pop_queued_product_ids(batch_size):
+    connection = get_redis_connection()
+    product_ids = {int(product_id) for product_id in connection.spop(INDEX_QUEUE_KEY, batch_size) or []}
+
+    related_refs = connection.spop(RELATED_QUEUE_KEY, batch_size) or []
+    related_pks = {}
+    for ref in related_refs:
+        label, pk = ref.decode().rsplit(':', 1)
+        related_pks.setdefault(label, []).append(int(pk))
+
+    Product = apps.get_model('products', 'Product')
+    for label, pks in related_pks.items():
+        lookup = RELATED_PRODUCT_LOOKUPS[label]
+        product_ids.update(Product.objects.filter(**{lookup: pks}).values_list('pk', flat=True))
+
+    return product_ids
+
+
+def requeue_product_ids(product_ids):
+    if product_ids:
+        get_redis_connection().sadd(INDEX_QUEUE_KEY, *[str(product_id) for product_id in product_ids])
+
+
+def index_products(product_ids, index=None):
+    '''Проиндексировать товары одним bulk-запросом, удалив из индекса отсутствующие в базе'''
+    document = ProductDocument()
+    index = index or document._index._name
+    products = list(document.get_queryset().filter(pk__in=product_ids))
+    deleted_ids = set(product_ids) - {product.pk for product in products}
+
+    actions = [{**document._prepare_action(product, 'index'), '_index': index} for product in products]
+    actions += [{'_op_type': 'delete', '_index': index, '_id': product_id} for product_id in deleted_ids]
+
+    if actions:
+        _, errors = bulk(document._get_connection(), actions, raise_on_error=False, ignore_status=(404,))
+        for error in errors:
+            logger.error('Failed to index product: %s', error)
+    return len(products), len(deleted_ids)
+
+
+def drain_index_queue(batch_size=None):
+    batch_size = batch_size or settings.SEARCH_INDEXING_BATCH_SIZE
+    indexed = deleted = 0
+
+    while True:
+        product_ids = pop_queued_product_ids(batch_size)
+        if not product_ids:
+            break
+
+        try:
+            batch_indexed, batch_deleted = index_products(product_ids)
+
+            reindex_target = get_redis_connection().get(REINDEX_TARGET_KEY)
+            if reindex_target:
+                get_redis_connection().sadd(REINDEX_TOUCHED_KEY, *product_ids)
+                index_products(product_ids, index=reindex_target.decode())
+        except Exception:
+            # Не теряем изменения: вернём id в очередь для следующего запуска
+            requeue_product_ids(product_ids)
+            raise
+
+        indexed += batch_indexed
+        deleted += batch_deleted
+
+    return indexed, deleted
+
+
+INDEXED_STATS_FIELDS = ('reviews_count', 'average_score', 'total_ordered_quantity')
+
+
+def update_indexed_stats(since=None, batch_size=None):
+    '''Частично обновить в индексе только поля статистики товаров, изменившейся после since'''
+    batch_size = batch_size or settings.SEARCH_INDEXING_BATCH_SIZE
+    ProductStats = apps.get_model('products', 'ProductStats')
+    document = ProductDocument()
+
+    indices = [document._index._name]
+    reindex_target = get_redis_connection().get(REINDEX_TARGET_KEY)
+    if reindex_target:
+        indices.append(reindex_target.decode())
+
+    stats = ProductStats.objects.order_by().values_list('product_id', *INDEXED_STATS_FIELDS)
+    if since is not None:
+        stats = stats.filter(updated_at__gt=since)
+
+    actions = (
+        {'_op_type': 'update', '_index': index, '_id': row[0], 'doc': dict(zip(INDEXED_STATS_FIELDS, row[1:]))}
+        for row in stats.iterator(chunk_size=batch_size)
+        for index in indices
+    )
+    updated, errors = bulk(document._get_connection(), actions, chunk_size=batch_size,
+                           raise_on_error=False, ignore_status=(404,))
+    for error in errors:
+        logger.error('Failed to update product stats in index: %s', error)
+    return updated
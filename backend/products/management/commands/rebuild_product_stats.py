@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from products.stats import refresh_product_stats
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair ProductStats from reviews and ordered products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help='Rebuild stats only for these product ids')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        refreshed = refresh_product_stats(options['ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Product stats rebuilt for {refreshed} products'))
@@ -0,0 +1,122 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections as db_connections
+from django.db.models import Max, Min
+from django.utils import timezone
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import streaming_bulk
+from elasticsearch_dsl.connections import connections as es_connections
+
+from common.redis import get_redis_connection
+from products.documents import ProductDocument
+from products.indexing import REINDEX_TARGET_KEY, REINDEX_TOUCHED_KEY, index_products
+
+
+def index_products_range(index_name, start_pk, end_pk, chunk_size):
+    # После fork у процесса должны быть свои соединения с Postgres и Elasticsearch:
+    # пул urllib3 клиента родителя уже использован и между процессами не делится
+    db_connections.close_all()
+    client = Elasticsearch(**settings.ELASTICSEARCH_DSL['default'])
+
+    document = ProductDocument()
+    products = document.get_queryset().filter(pk__gte=start_pk, pk__lt=end_pk).order_by('pk')
+    actions = ({**document._prepare_action(product, 'index'), '_index': index_name}
+               for product in products.iterator(chunk_size=chunk_size))
+
+    indexed = failed = 0
+    try:
+        for ok, _ in streaming_bulk(client, actions, chunk_size=chunk_size, raise_on_error=False):
+            if ok:
+                indexed += 1
+            else:
+                failed += 1
+    finally:
+        client.close()
+    return indexed, failed
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the products index into a new index and atomically switch the alias to it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--keep-old', action='store_true', help='Do not delete previous indices')
+
+    def handle(self, *args, **options):
+        alias = ProductDocument._index._name
+        index_name = f'{alias}-{timezone.now():%Y%m%d%H%M%S}'
+        client = es_connections.get_connection()
+        redis_connection = get_redis_connection()
+
+        # Загрузка идёт без refresh, он включается обратно перед переключением алиаса
+        new_index = ProductDocument._index.clone(name=index_name)
+        new_index.create()
+        client.indices.put_settings(index=index_name, settings={'index': {'refresh_interval': '-1'}})
+
+        redis_connection.delete(REINDEX_TOUCHED_KEY)
+        redis_connection.set(REINDEX_TARGET_KEY, index_name)
+        try:
+            started_at = time.monotonic()
+            indexed, failed = self.index_all(index_name, options['workers'], options['chunk_size'])
+
+            # Товары, изменённые во время загрузки, переиндексируются поверх прочитанных ранее версий
+            touched_ids = [int(pk) for pk in redis_connection.smembers(REINDEX_TOUCHED_KEY)]
+            if touched_ids:
+                index_products(touched_ids, index=index_name)
+
+            elapsed = time.monotonic() - started_at
+            client.indices.put_settings(index=index_name, settings={'index': {'refresh_interval': '1s'}})
+            client.indices.refresh(index=index_name)
+
+            old_indices = self.switch_alias(client, alias, index_name)
+        except Exception:
+            redis_connection.delete(REINDEX_TARGET_KEY)
+            client.indices.delete(index=index_name, ignore_unavailable=True)
+            raise
+        finally:
+            redis_connection.delete(REINDEX_TOUCHED_KEY)
+
+        redis_connection.delete(REINDEX_TARGET_KEY)
+        if not options['keep_old']:
+            for old_index in old_indices:
+                client.indices.delete(index=old_index, ignore_unavailable=True)
+
+        docs_per_second = indexed / elapsed if elapsed else indexed
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} products into {index_name} in {elapsed:.1f}s '
+            f'({docs_per_second:.0f} docs/sec, {failed} failed)'
+        ))
+
+    def index_all(self, index_name, workers, chunk_size):
+        bounds = ProductDocument().get_queryset().aggregate(min_pk=Min('pk'), max_pk=Max('pk'))
+        if bounds['min_pk'] is None:
+            return 0, 0
+
+        min_pk, max_pk = bounds['min_pk'], bounds['max_pk'] + 1
+        step = max((max_pk - min_pk) // (workers * 4), chunk_size)
+        ranges = [(index_name, start, min(start + step, max_pk), chunk_size)
+                  for start in range(min_pk, max_pk, step)]
+
+        db_connections.close_all()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            results = pool.starmap(index_products_range, ranges)
+
+        return sum(indexed for indexed, _ in results), sum(failed for _, failed in results)
+
+    def switch_alias(self, client, alias, index_name):
+        actions = [{'add': {'index': index_name, 'alias': alias}}]
+        old_indices = []
+
+        if client.indices.exists_alias(name=alias):
+            old_indices = list(client.indices.get_alias(name=alias))
+            actions += [{'remove': {'index': old_index, 'alias': alias}} for old_index in old_indices]
+        elif client.indices.exists(index=alias):
+            # Старый индекс с именем алиаса удаляется в том же атомарном запросе
+            actions.append({'remove_index': {'index': alias}})
+
+        client.indices.update_aliases(actions=actions)
+        return old_indices
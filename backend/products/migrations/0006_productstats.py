@@ -0,0 +1,63 @@
+# Generated by Django 4.2.5 on 2026-10-18 09:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_product_stats(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductStats = apps.get_model('products', 'ProductStats')
+    Review = apps.get_model('products', 'Review')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+
+    stats = {product_id: ProductStats(product_id=product_id)
+             for product_id in Product.objects.values_list('pk', flat=True)}
+
+    review_scores = Review.objects.order_by().values('product_id', 'score').annotate(
+        score_count=models.Count('id'))
+    for row in review_scores:
+        product_stats = stats[row['product_id']]
+        product_stats.reviews_count += row['score_count']
+        product_stats.score_sum += row['score'] * row['score_count']
+        setattr(product_stats, f"score_{row['score']}_count", row['score_count'])
+
+    ordered_quantities = OrderItem.objects.order_by().values('product_id').annotate(
+        quantity=models.Sum('quantity'))
+    for row in ordered_quantities:
+        stats[row['product_id']].total_ordered_quantity = row['quantity'] or 0
+
+    for product_stats in stats.values():
+        if product_stats.reviews_count:
+            product_stats.average_score = product_stats.score_sum / product_stats.reviews_count
+
+    ProductStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_alter_productimage_image'),
+        ('orders', '0005_alter_order_options_alter_orderitem_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='products.product')),
+                ('reviews_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.PositiveIntegerField(default=0)),
+                ('average_score', models.FloatField(default=0)),
+                ('total_ordered_quantity', models.PositiveIntegerField(default=0)),
+                ('score_1_count', models.PositiveIntegerField(default=0)),
+                ('score_2_count', models.PositiveIntegerField(default=0)),
+                ('score_3_count', models.PositiveIntegerField(default=0)),
+                ('score_4_count', models.PositiveIntegerField(default=0)),
+                ('score_5_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'product stats',
+            },
+        ),
+        migrations.RunPython(backfill_product_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_productstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productstats',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F, FloatField
+from django.db.models.functions import Coalesce
 from django.utils.text import slugify
 from django.utils.crypto import get_random_string
 from django.core.exceptions import ValidationError
@@ -51,6 +53,26 @@ SCORE_CHOICES = (
 )
 
 
+class ProductQuerySet(models.QuerySet):
+    def with_stats(self):
+        return self.select_related('stats').annotate(
+            reviews_count=Coalesce(F('stats__reviews_count'), 0),
+            average_score=Coalesce(F('stats__average_score'), 0, output_field=FloatField()),
+            total_ordered_quantity=Coalesce(F('stats__total_ordered_quantity'), 0),
+        )
+
+    def for_cards(self, stats=True, seller=True, character=True, fandom=True, images=True):
+        '''Joins and prefetches needed by ProductSerializer, parts can be skipped for sparse fieldsets'''
+        queryset = self.with_stats() if stats else self
+        if seller:
+            queryset = queryset.select_related('seller')
+        if character:
+            queryset = queryset.select_related('cosplay_character__fandom' if fandom else 'cosplay_character')
+        if images:
+            queryset = queryset.prefetch_related('product_images')
+        return queryset
+
+
 class Product(models.Model):
     """Product model"""
     slug = models.SlugField(unique=True, allow_unicode=True, max_length=255, editable=False, blank=True)
@@ -76,6 +98,8 @@ class Product(models.Model):
     in_stock = models.PositiveIntegerField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
@@ -139,6 +163,30 @@ class Review(models.Model):
         ordering = ['-timestamp']
 
 
+class ProductStats(models.Model):
+    """Incrementally maintained product reviews and orders statistics"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    reviews_count = models.PositiveIntegerField(default=0)
+    score_sum = models.PositiveIntegerField(default=0)
+    average_score = models.FloatField(default=0)
+    total_ordered_quantity = models.PositiveIntegerField(default=0)
+    score_1_count = models.PositiveIntegerField(default=0)
+    score_2_count = models.PositiveIntegerField(default=0)
+    score_3_count = models.PositiveIntegerField(default=0)
+    score_4_count = models.PositiveIntegerField(default=0)
+    score_5_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.product_id}: {self.reviews_count} reviews, {self.total_ordered_quantity} ordered'
+
+    def get_score_distribution(self):
+        return {score: getattr(self, f'score_{score}_count') for score, _ in SCORE_CHOICES}
+
+    class Meta:
+        verbose_name_plural = 'product stats'
+
+
 class Answer(models.Model):
     '''Answer model'''
     review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='answers')
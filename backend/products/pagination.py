@@ -0,0 +1,97 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def iter_search_ids(search, batch_size=1000):
+    '''Ids of every hit of the search, paged with search_after instead of a capped size'''
+    search = search.sort({'id': {'order': 'asc'}}).source(False).extra(size=batch_size)
+    search_after = None
+    while True:
+        page = search if search_after is None else search.extra(search_after=search_after)
+        hits = list(page.execute().hits)
+        for hit in hits:
+            yield int(hit.meta.id)
+        if len(hits) < batch_size:
+            return
+        search_after = list(hits[-1].meta.sort)
+
+
+class SearchAfterPagination(BasePagination):
+    '''
+    Pagination of an Elasticsearch search using search_after cursors.
+    The cursor stores the ordering and the sort values of the last hit on the page,
+    so page N costs the same as the first one and is not limited by max_result_window.
+    '''
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_search(self, search, request, ordering):
+        self.request = request
+        self.ordering = ordering
+
+        search_after = self.decode_cursor(request)
+        search = search.extra(size=self.page_size + 1, track_total_hits=True)
+        if search_after is not None:
+            search = search.extra(search_after=search_after)
+
+        response = search.execute()
+        hits = list(response.hits)
+
+        self.count = response.hits.total.value
+        self.has_next = len(hits) > self.page_size
+        hits = hits[:self.page_size]
+        self.last_sort_values = list(hits[-1].meta.sort) if hits else None
+
+        return [int(hit.meta.id) for hit in hits]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            ordering, sort_values = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if ordering != self.ordering or not isinstance(sort_values, list):
+            raise NotFound(self.invalid_cursor_message)
+        return sort_values
+
+    def encode_cursor(self, sort_values):
+        cursor = json.dumps([self.ordering, sort_values], separators=(',', ':'))
+        return urlsafe_b64encode(cursor.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_sort_values))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            # search_after умеет ходить только вперёд
+            ('previous', None),
+            ('results', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
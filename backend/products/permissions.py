@@ -10,9 +10,9 @@ from .models import Product, Review
 class IsSeller(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         employees = obj.seller.employees.all()
-        employees_users = [employee.user for employee in employees]
+        employees_users = [employee.user_id for employee in employees]
 
-        return request.user in employees_users       
+        return request.user.id in employees_users       
 
 
 class IsSellerOrAdminOrReadOnly(permissions.BasePermission):
@@ -24,9 +24,9 @@ class IsSellerOrAdminOrReadOnly(permissions.BasePermission):
             return True
 
         employees = obj.seller.employees.all()
-        employees_users = [employee.user for employee in employees]
+        employees_users = [employee.user_id for employee in employees]
 
-        return request.user in employees_users
+        return request.user.id in employees_users
     
 
 class IsCustomerOrAdminUser(permissions.BasePermission):
@@ -60,9 +60,9 @@ class IsSellerOrAdminUser(permissions.BasePermission):
             return True
 
         employees = obj.seller.employees.all()
-        employees_users = [employee.user for employee in employees]
+        employees_users = [employee.user_id for employee in employees]
 
-        return request.user in employees_users
+        return request.user.id in employees_users
     
 
 class IsSellerOrReadOnly(permissions.BasePermission):
@@ -71,7 +71,7 @@ class IsSellerOrReadOnly(permissions.BasePermission):
             return True
 
         employees = obj.seller.employees.all()
-        employees_users = [employee.user for employee in employees]
+        employees_users = [employee.user_id for employee in employees]
 
-        return request.user in employees_users
+        return request.user.id in employees_users
 
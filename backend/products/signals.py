@@ -0,0 +1,156 @@
+from collections import defaultdict
+
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django_elasticsearch_dsl.apps import DEDConfig
+
+from common.cache import bump_namespaces
+from fandoms.models import Character, Fandom
+from orders.models import OrderItem
+from stores.models import Store
+
+from .fragments import invalidate_product_cards, invalidate_related_product_cards
+from .indexing import enqueue_products
+from .models import Product, ProductImage, ProductStats, Review
+from .stats import apply_ordered_quantity_delta, apply_ordered_quantity_deltas, apply_review_delta
+
+
+# Пространства имён кэша ответов, которые устаревают при изменении модели
+RESPONSE_CACHE_NAMESPACES = {
+    Product: ('products', 'stores', 'fandoms'),
+    ProductImage: ('products', 'stores', 'fandoms'),
+    Review: ('products', 'stores', 'fandoms'),
+    OrderItem: ('products', 'stores', 'fandoms'),
+    Store: ('products', 'stores'),
+    Fandom: ('products', 'fandoms'),
+    Character: ('products', 'fandoms'),
+}
+
+
+@receiver(post_save, sender=Product)
+def create_product_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ProductStats.objects.get_or_create(product=instance)
+
+
+# Запоминаем исходные значения, чтобы при изменении применять к статистике только разницу.
+# Читаем из __dict__, чтобы не подгружать отложенные (.only/.defer) поля.
+@receiver(post_init, sender=Review)
+def remember_review_score(sender, instance, **kwargs):
+    instance._stats_product_id = instance.__dict__.get('product_id')
+    instance._stats_score = instance.__dict__.get('score')
+
+
+@receiver(post_save, sender=Review)
+def update_stats_on_review_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    if created:
+        apply_review_delta(instance.product_id, added_score=instance.score)
+    elif instance._stats_product_id != instance.product_id:
+        if instance._stats_product_id is not None:
+            apply_review_delta(instance._stats_product_id, removed_score=instance._stats_score)
+        apply_review_delta(instance.product_id, added_score=instance.score)
+    elif instance._stats_score is not None and instance._stats_score != instance.score:
+        apply_review_delta(instance.product_id, added_score=instance.score, removed_score=instance._stats_score)
+
+    instance._stats_product_id = instance.product_id
+    instance._stats_score = instance.score
+
+
+@receiver(post_delete, sender=Review)
+def update_stats_on_review_delete(sender, instance, **kwargs):
+    apply_review_delta(instance.product_id, removed_score=instance.score)
+
+
+@receiver(post_init, sender=OrderItem)
+def remember_order_item_quantity(sender, instance, **kwargs):
+    instance._stats_product_id = instance.__dict__.get('product_id')
+    instance._stats_quantity = instance.__dict__.get('quantity')
+
+
+@receiver(post_save, sender=OrderItem)
+def update_stats_on_order_item_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    if created:
+        apply_ordered_quantity_delta(instance.product_id, instance.quantity)
+    elif instance._stats_product_id != instance.product_id:
+        if instance._stats_product_id is not None:
+            apply_ordered_quantity_delta(instance._stats_product_id, -(instance._stats_quantity or 0))
+        apply_ordered_quantity_delta(instance.product_id, instance.quantity)
+    elif instance._stats_quantity is not None:
+        apply_ordered_quantity_delta(instance.product_id, instance.quantity - instance._stats_quantity)
+
+    instance._stats_product_id = instance.product_id
+    instance._stats_quantity = instance.quantity
+
+
+@receiver(post_delete, sender=OrderItem)
+def update_stats_on_order_item_delete(sender, instance, **kwargs):
+    apply_ordered_quantity_delta(instance.product_id, -instance.quantity)
+
+
+def order_items_bulk_created(order_items):
+    '''post_save обработчики позиций заказа для OrderItem.objects.bulk_create(), который сигналов не шлёт'''
+    quantity_deltas = defaultdict(int)
+    for order_item in order_items:
+        quantity_deltas[order_item.product_id] += order_item.quantity
+        order_item._stats_product_id = order_item.product_id
+        order_item._stats_quantity = order_item.quantity
+
+    apply_ordered_quantity_deltas(quantity_deltas)
+    if quantity_deltas:
+        bump_namespaces(*RESPONSE_CACHE_NAMESPACES[OrderItem])
+        invalidate_product_cards(list(quantity_deltas))
+
+
+def order_items_bulk_updated(order_items):
+    '''post_save обработчики позиций заказа для UPDATE статуса (оплата заказа), количество не меняется'''
+    product_ids = {order_item.product_id for order_item in order_items}
+    if product_ids:
+        bump_namespaces(*RESPONSE_CACHE_NAMESPACES[OrderItem])
+        invalidate_product_cards(list(product_ids))
+
+
+def products_stock_changed(product_ids):
+    '''post_save обработчики товаров после UPDATE остатков (резервирование на складе), который сигналов не шлёт'''
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+
+    bump_namespaces(*RESPONSE_CACHE_NAMESPACES[Product])
+    invalidate_product_cards(product_ids)
+    if DEDConfig.autosync_enabled():
+        enqueue_products(product_ids)
+
+
+def invalidate_cached_responses(sender, raw=False, **kwargs):
+    if not raw:
+        bump_namespaces(*RESPONSE_CACHE_NAMESPACES[sender])
+
+
+for model in RESPONSE_CACHE_NAMESPACES:
+    post_save.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'response_cache_{model.__name__}_save')
+    post_delete.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'response_cache_{model.__name__}_delete')
+
+
+def invalidate_product_card_fragments(sender, instance, raw=False, **kwargs):
+    '''Bumps the card versions of the affected products, cards under the old versions are never read again'''
+    if raw:
+        return
+
+    if sender is Product:
+        invalidate_product_cards([instance.pk])
+    elif sender in (Store, Character, Fandom):
+        invalidate_related_product_cards(instance)
+    else:
+        # Изображение, отзыв или позиция заказа меняют карточку своего товара
+        invalidate_product_cards([instance.product_id])
+
+
+for model in RESPONSE_CACHE_NAMESPACES:
+    post_save.connect(invalidate_product_card_fragments, sender=model, dispatch_uid=f'product_cards_{model.__name__}_save')
+    post_delete.connect(invalidate_product_card_fragments, sender=model, dispatch_uid=f'product_cards_{model.__name__}_delete')
@@ -0,0 +1,115 @@
+from django.db.models import Case, Count, F, FloatField, IntegerField, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Now, NullIf
+
+from orders.models import OrderItem
+
+from .models import Product, ProductStats, Review, SCORE_CHOICES
+
+
+SCORE_COUNT_FIELDS = {score: f'score_{score}_count' for score, _ in SCORE_CHOICES}
+
+
+def apply_review_delta(product_id, added_score=None, removed_score=None):
+    '''Применить изменение отзывов к статистике товара одним UPDATE'''
+    count_delta = (added_score is not None) - (removed_score is not None)
+    score_delta = (added_score or 0) - (removed_score or 0)
+    changes = {}
+
+    if added_score is not None:
+        field = SCORE_COUNT_FIELDS[added_score]
+        changes[field] = F(field) + 1
+    if removed_score is not None:
+        field = SCORE_COUNT_FIELDS[removed_score]
+        changes[field] = changes.get(field, F(field)) - 1
+
+    # В UPDATE правая часть вычисляется по старым значениям строки,
+    # поэтому среднее пересчитывается в том же запросе
+    updated = ProductStats.objects.filter(product_id=product_id).update(
+        reviews_count=F('reviews_count') + count_delta,
+        score_sum=F('score_sum') + score_delta,
+        average_score=Coalesce(
+            Cast(F('score_sum') + score_delta, FloatField()) / NullIf(F('reviews_count') + count_delta, 0),
+            0, output_field=FloatField()
+        ),
+        updated_at=Now(),
+        **changes
+    )
+
+    if not updated and added_score is not None:
+        refresh_product_stats([product_id])
+
+
+def apply_ordered_quantity_delta(product_id, quantity_delta):
+    '''Применить изменение количества заказанного товара к статистике'''
+    if not quantity_delta:
+        return
+
+    updated = ProductStats.objects.filter(product_id=product_id).update(
+        total_ordered_quantity=F('total_ordered_quantity') + quantity_delta,
+        updated_at=Now(),
+    )
+
+    if not updated and quantity_delta > 0:
+        refresh_product_stats([product_id])
+
+
+def apply_ordered_quantity_deltas(quantity_deltas):
+    '''apply_ordered_quantity_delta для нескольких товаров одним UPDATE, {product_id: delta}'''
+    quantity_deltas = {product_id: delta for product_id, delta in quantity_deltas.items() if delta}
+    if not quantity_deltas:
+        return
+
+    updated = ProductStats.objects.filter(product_id__in=quantity_deltas).update(
+        total_ordered_quantity=F('total_ordered_quantity') + Case(
+            *[When(product_id=product_id, then=Value(delta)) for product_id, delta in quantity_deltas.items()],
+            default=Value(0), output_field=IntegerField()
+        ),
+        updated_at=Now(),
+    )
+
+    if updated < len(quantity_deltas):
+        existing = set(ProductStats.objects.filter(product_id__in=quantity_deltas).values_list('product_id', flat=True))
+        missing = [product_id for product_id, delta in quantity_deltas.items() if product_id not in existing and delta > 0]
+        if missing:
+            refresh_product_stats(missing)
+
+
+def refresh_product_stats(product_ids=None, batch_size=1000):
+    '''Пересчитать статистику товаров с нуля (бэкфилл и исправление расхождений)'''
+    products = Product.objects.order_by('pk').values_list('pk', flat=True)
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    product_ids = list(products)
+
+    refreshed = 0
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        stats = {product_id: ProductStats(product_id=product_id) for product_id in batch}
+
+        review_scores = Review.objects.filter(product_id__in=batch).order_by().values(
+            'product_id', 'score').annotate(score_count=Count('id'))
+        for row in review_scores:
+            product_stats = stats[row['product_id']]
+            product_stats.reviews_count += row['score_count']
+            product_stats.score_sum += row['score'] * row['score_count']
+            setattr(product_stats, SCORE_COUNT_FIELDS[row['score']], row['score_count'])
+
+        ordered_quantities = OrderItem.objects.filter(product_id__in=batch).order_by().values(
+            'product_id').annotate(quantity=Sum('quantity'))
+        for row in ordered_quantities:
+            stats[row['product_id']].total_ordered_quantity = row['quantity'] or 0
+
+        for product_stats in stats.values():
+            if product_stats.reviews_count:
+                product_stats.average_score = product_stats.score_sum / product_stats.reviews_count
+
+        ProductStats.objects.bulk_create(
+            stats.values(),
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['reviews_count', 'score_sum', 'average_score',
+                           'total_ordered_quantity', 'updated_at', *SCORE_COUNT_FIELDS.values()],
+        )
+        refreshed += len(batch)
+
+    return refreshed
@@ -1,9 +1,14 @@
+from datetime import timedelta
+
+from django.core.cache import cache
 from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.template.loader import render_to_string
+from django.utils import timezone
 
 from backend.celery import app
+from .indexing import drain_index_queue, update_indexed_stats
 from .models import Product
 
 User = get_user_model()
@@ -25,4 +30,25 @@ def send_daily_offer_email():
         }
         message = render_to_string('email_template.html', context)
         
-        send_async_email.delay(subject, message, [user.email])
\ No newline at end of file
+        send_async_email.delay(subject, message, [user.email])
+
+@app.task(ignore_result=True)
+def index_queued_products():
+    # Не запускаем параллельные выгрузки: следующий запуск подхватит остаток очереди
+    if not cache.add('search:products:index:lock', 1, timeout=60):
+        return
+    try:
+        drain_index_queue()
+    finally:
+        cache.delete('search:products:index:lock')
+
+
+@app.task(ignore_result=True)
+def sync_product_stats_to_index():
+    # Берём с запасом: строки статистики получают updated_at на момент начала транзакции
+    started_at = timezone.now()
+    last_synced_at = cache.get('search:products:stats:synced_at')
+    since = last_synced_at - timedelta(minutes=1) if last_synced_at else None
+
+    update_indexed_stats(since)
+    cache.set('search:products:stats:synced_at', started_at, timeout=None)
@@ -1,11 +1,30 @@
+from unittest import mock
+
 from rest_framework.test import APITestCase
 from rest_framework import status
-from django.db.models import Count, Avg, Sum, F, Case, When, FloatField
-from django.db.models.functions import Coalesce
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.urls import reverse
+from elasticsearch_dsl import Search
+from elasticsearch_dsl.response import Response as SearchResponse
 
-from .models import Product
+from .documents import ProductDocument
+from .fragments import PRODUCT_CARD_KEY, get_product_card_versions
+from .indexing import INDEX_QUEUE_KEY, RELATED_QUEUE_KEY, drain_index_queue, update_indexed_stats
+from .models import Product, ProductStats, Review
+from .pagination import iter_search_ids
+from .stats import refresh_product_stats
+from common.redis import get_redis_connection
 from common.serializers import ProductSerializer
+from common.testing import create_catalog, create_character, create_product, create_store, create_user
+from cards.models import Card
+from cart.models import CartItem
+from favorites.models import Favorite
+from orders.models import Order, OrderItem
+from stores.models import Store
+from users.models import Address
 
 
 class ProductTests(APITestCase):
@@ -13,18 +32,244 @@ class ProductTests(APITestCase):
         url = reverse('products:product-list')
         response = self.client.get(url)
 
-        queryset = Product.objects.select_related(
-            'seller', 'cosplay_character__fandom').annotate(
-            reviews_count=Count('reviews', distinct=True),
-            average_score=Coalesce(Avg('reviews__score'), 0, output_field=FloatField()),
-            total_ordered_quantity=Coalesce(Sum('ordered_products__quantity'), 0),
-            actual_price=Case(
-                When(discount__gt=0, then=F('price') - (F('price') * F('discount') / 100)),
-                default=F('price'),
-                output_field=FloatField()
-            )
-        ).prefetch_related('reviews', 'product_images').all()
+        queryset = Product.objects.with_stats().select_related(
+            'seller', 'cosplay_character__fandom'
+        ).prefetch_related('reviews', 'product_images').filter(is_active=True)
         serializer_data = ProductSerializer(queryset, many=True).data
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer_data)
+        self.assertEqual(response.data['results'], serializer_data)
+
+
+class ProductStatsTests(TestCase):
+    def setUp(self):
+        self.seller = create_user('seller')
+        self.customer = create_user('customer')
+        self.product = create_product(create_store(self.seller), create_character())
+
+    def get_stats(self):
+        return ProductStats.objects.get(product=self.product)
+
+    def test_reviews_update_stats(self):
+        review = Review.objects.create(customer=self.customer, product=self.product, score=5, text='Great')
+        Review.objects.create(customer=self.seller, product=self.product, score=2, text='Bad')
+        stats = self.get_stats()
+        self.assertEqual((stats.reviews_count, stats.score_sum, stats.average_score), (2, 7, 3.5))
+
+        review.score = 3
+        review.save()
+        stats = self.get_stats()
+        self.assertEqual((stats.score_sum, stats.score_3_count, stats.score_5_count), (5, 1, 0))
+
+        review.delete()
+        stats = self.get_stats()
+        self.assertEqual((stats.reviews_count, stats.average_score), (1, 2.0))
+        self.assertEqual(stats.get_score_distribution(), {1: 0, 2: 1, 3: 0, 4: 0, 5: 0})
+
+    def test_order_items_update_stats(self):
+        order = Order.objects.create(customer=self.customer, name='Customer', phone_number='79999999999',
+                                     email='customer@example.com', total_order_price=3000, status=1,
+                                     address=Address.objects.create(address='Address'),
+                                     card=Card.objects.create(card_number='1234567812345678'))
+        item = OrderItem.objects.create(order=order, product=self.product, quantity=3, price=1000, status=1)
+        self.assertEqual(self.get_stats().total_ordered_quantity, 3)
+
+        item.quantity = 1
+        item.save()
+        self.assertEqual(self.get_stats().total_ordered_quantity, 1)
+
+        order.delete()
+        self.assertEqual(self.get_stats().total_ordered_quantity, 0)
+
+    def test_refresh_repairs_stats(self):
+        Review.objects.create(customer=self.customer, product=self.product, score=4, text='Good')
+        ProductStats.objects.filter(product=self.product).update(reviews_count=10, average_score=1)
+
+        refresh_product_stats([self.product.id])
+        stats = self.get_stats()
+        self.assertEqual((stats.reviews_count, stats.average_score, stats.score_4_count), (1, 4.0, 1))
+
+        product = Product.objects.with_stats().get(pk=self.product.pk)
+        self.assertEqual((product.reviews_count, product.average_score), (1, 4.0))
+
+
+@override_settings(ELASTICSEARCH_DSL_AUTOSYNC=True)
+class ProductIndexQueueTests(TestCase):
+    def setUp(self):
+        get_redis_connection().delete(INDEX_QUEUE_KEY, RELATED_QUEUE_KEY)
+        _, self.store, self.character, _ = create_catalog()
+
+    @mock.patch('products.indexing.bulk', return_value=(0, []))
+    def test_changes_are_coalesced_into_one_bulk_request(self, bulk):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = create_product(self.store, self.character)
+            product.title = 'Renamed product'
+            product.save()
+            deleted_product = create_product(self.store, self.character, 'Deleted product')
+            deleted_product_id = deleted_product.id
+            deleted_product.delete()
+            self.store.save()
+
+        self.assertEqual(drain_index_queue(), (1, 1))
+        bulk.assert_called_once()
+        actions = {(action['_op_type'], action['_id']) for action in bulk.call_args.args[1]}
+        self.assertEqual(actions, {('index', product.id), ('delete', deleted_product_id)})
+        self.assertEqual(get_redis_connection().scard(INDEX_QUEUE_KEY), 0)
+
+    @mock.patch('products.indexing.bulk', return_value=(0, []))
+    def test_stats_fields_are_indexed(self, bulk):
+        product = create_product(self.store, self.character)
+        Review.objects.create(customer=self.store.owner, product=product, score=4, text='Good')
+
+        document = ProductDocument().get_queryset().get(pk=product.pk)
+        prepared = ProductDocument().prepare(document)
+        self.assertEqual((prepared['reviews_count'], prepared['average_score']), (1, 4.0))
+
+        update_indexed_stats()
+        actions = list(bulk.call_args.args[1])
+        self.assertEqual(actions[0]['_id'], product.id)
+        self.assertEqual(actions[0]['doc'], {'reviews_count': 1, 'average_score': 4.0, 'total_ordered_quantity': 0})
+
+
+class ProductFacetsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get_search_response(self, search):
+        buckets = {'buckets': [{'key': 'Wig', 'doc_count': 2}]}
+        return SearchResponse(search, {
+            'hits': {'total': {'value': 2, 'relation': 'eq'}, 'hits': []},
+            'aggregations': {
+                'product_types': buckets, 'sizes': {'buckets': []}, 'shoes_sizes': {'buckets': []},
+                'fandoms': {'buckets': []}, 'fandom_types': {'buckets': []}, 'sellers': {'buckets': []},
+                'price_stats': {'count': 2, 'min': 500.0, 'max': 1500.0, 'avg': 1000.0, 'sum': 2000.0},
+                'price_histogram': {'buckets': [{'key': 0.0, 'doc_count': 1}, {'key': 1000.0, 'doc_count': 1}]},
+            },
+        })
+
+    def test_facets_are_built_from_one_cached_aggregation(self):
+        with mock.patch.object(Search, 'execute', autospec=True,
+                               side_effect=self.get_search_response) as execute:
+            url = reverse('products:product-facets')
+            response = self.client.get(url, {'q': 'Naruto  wig', 'price__gte': 100})
+            cached_response = self.client.get(url, {'price__gte': 100, 'q': ' naruto wig'})
+
+        execute.assert_called_once()
+        body = execute.call_args.args[0].to_dict()
+        self.assertEqual(body['size'], 0)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['product_types'], [{'value': 'Wig', 'count': 2}])
+        self.assertEqual(response.data['price']['histogram'][1], {'from': 1000, 'to': 2000, 'count': 1})
+        self.assertEqual(cached_response.data, response.data)
+
+
+class SearchIdsTests(TestCase):
+    def get_search_response(self, search):
+        # 5 попаданий, отсортированных по id, страницами после search_after
+        body = search.to_dict()
+        after = body.get('search_after', [0])[0]
+        ids = [product_id for product_id in range(1, 6) if product_id > after][:body['size']]
+        return SearchResponse(search, {'hits': {'total': {'value': 5, 'relation': 'eq'}, 'hits': [
+            {'_id': str(product_id), '_score': None, 'sort': [product_id]} for product_id in ids
+        ]}})
+
+    def test_all_hits_are_collected_past_the_batch_size(self):
+        with mock.patch.object(Search, 'execute', autospec=True, side_effect=self.get_search_response) as execute:
+            self.assertEqual(list(iter_search_ids(Search(index='products'), batch_size=2)), [1, 2, 3, 4, 5])
+        self.assertEqual(execute.call_count, 3)
+
+
+class ProductSuggestTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get_search_response(self, search):
+        return SearchResponse(search, {
+            'hits': {'total': {'value': 0, 'relation': 'eq'}, 'hits': []},
+            'suggest': {'products': [{'text': 'nar', 'offset': 0, 'length': 3, 'options': [
+                {'text': 'Naruto', '_id': '1', '_score': 5.0,
+                 '_source': {'id': 1, 'title': 'Naruto Wig', 'slug': 'naruto-wig'}},
+            ]}]},
+        })
+
+    def test_popular_prefix_is_served_from_cache(self):
+        with mock.patch.object(Search, 'execute', autospec=True,
+                               side_effect=self.get_search_response) as execute:
+            url = reverse('products:product-suggest')
+            response = self.client.get(url, {'q': 'Nar'})
+            cached_response = self.client.get(url, {'q': 'nar '})
+
+        execute.assert_called_once()
+        completion = execute.call_args.args[0].to_dict()['suggest']['products']
+        self.assertEqual(completion['text'], 'nar')
+        self.assertEqual(completion['completion']['size'], 8)
+        self.assertEqual(response.data, [{'text': 'Naruto', 'id': 1, 'title': 'Naruto Wig', 'slug': 'naruto-wig'}])
+        self.assertEqual(cached_response.data, response.data)
+
+
+class ProductBatchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = create_catalog(3)[3]
+
+    def test_cards_are_served_from_fragments_until_product_changes(self):
+        url = reverse('products:product-batch')
+        ids = f'{self.products[2].id},{self.products[0].id},0'
+        response = self.client.get(url, {'ids': ids})
+        self.assertEqual([card['title'] for card in response.data], ['Product 2', 'Product 0'])
+
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(url, {'ids': ids})
+        self.assertEqual(cached_response.data, response.data)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].title = 'Renamed product'
+            self.products[0].save()
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'ids': ids})
+        self.assertEqual([card['title'] for card in response.data], ['Product 2', 'Renamed product'])
+        self.assertEqual(self.client.get(url, {'ids': 'a,b'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_late_fill_of_retired_card_is_never_read(self):
+        product = self.products[0]
+        # Читатель собрал карточку до коммита изменения, а положил в кэш уже после него
+        version = get_product_card_versions([product.id])[product.id]
+        stale_card = ProductSerializer(Product.objects.for_cards().get(pk=product.pk), context={'request': None}).data
+        with self.captureOnCommitCallbacks(execute=True):
+            product.price = 500
+            product.save()
+        cache.set(PRODUCT_CARD_KEY.format(product.id, version), stale_card)
+
+        card = self.client.get(reverse('products:product-batch'), {'ids': product.id}).data[0]
+        self.assertEqual(card['price'], 500)
+
+    def test_fragments_do_not_depend_on_host(self):
+        Store.objects.filter(pk=self.products[0].seller_id).update(logo='store_logos/logo.png')
+        url = reverse('products:product-batch')
+        for host in ('shop.example.com', 'forged.example.com'):
+            card = self.client.get(url, {'ids': self.products[0].id}, HTTP_HOST=host).data[0]
+            self.assertEqual(card['seller']['logo'], f'http://{host}/django-media/store_logos/logo.png')
+
+        # В кэше одна карточка с относительным путём, сколько бы хостов ни запрашивало товар
+        product_id = self.products[0].id
+        fragment = cache.get(PRODUCT_CARD_KEY.format(product_id, get_product_card_versions([product_id])[product_id]))
+        self.assertEqual(fragment['seller']['logo'], '/django-media/store_logos/logo.png')
+
+    def test_cart_and_favorites_reuse_cached_cards(self):
+        user = create_user('customer')
+        CartItem.objects.create(user=user, product=self.products[1], quantity=2)
+        Favorite.objects.create(user=user, product=self.products[1])
+        self.client.force_authenticate(user)
+        card = self.client.get(reverse('products:product-batch'), {'ids': self.products[1].id}).data[0]
+
+        with CaptureQueriesContext(connection) as queries:
+            cart_item = self.client.get(reverse('cart:cart-list')).data['cart_items'][0]
+        # Товар загружается только ради цены, без продавца, персонажа и изображений
+        self.assertFalse(any('JOIN' in query['sql'] or 'productimage' in query['sql'] for query in queries))
+        self.assertEqual(cart_item['product'], card)
+        self.assertEqual(cart_item['quantity'], 2)
+
+        favorite = self.client.get(reverse('favorites:favorite-list')).data['results'][0]
+        self.assertEqual(favorite['product'], card)
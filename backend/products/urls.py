@@ -1,12 +1,15 @@
 from django.urls import path
 from . import views
-from django.views.decorators.cache import cache_page
+from common.cache import cache_response
 
 
 app_name = 'products'
 
 urlpatterns = [    
-    path('', cache_page(60)(views.ProductListView.as_view()), name='product-list'),
+    path('', cache_response('products')(views.ProductListView.as_view()), name='product-list'),
+    path('batch/', views.ProductBatchView.as_view(), name='product-batch'),
+    path('facets/', views.ProductFacetsView.as_view(), name='product-facets'),
+    path('suggest/', views.ProductSuggestView.as_view(), name='product-suggest'),
     path('<slug:slug>/', views.ProductDetailView.as_view(), name='product-detail'),
     path('<int:pk>/reviews/create/', views.ReviewCreateView.as_view(), name='review-create'),
     path('<int:product_id>/reviews/<int:pk>/', views.ReviewDetailView.as_view(), name='review-detail'),
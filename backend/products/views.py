@@ -1,9 +1,13 @@
-from django.db.models import Count, Avg, Sum, F, Case, When, FloatField
-from django.db.models.functions import Coalesce
+import hashlib
+from urllib.parse import urlencode
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404
 
-from rest_framework import generics
+from rest_framework import generics, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from common.serializers import (
     ProductSerializer,
@@ -11,23 +15,22 @@ from common.serializers import (
     ReviewSerializer,
     AnswerSerializer
 )
+from common.eager_loading import EagerLoadingMixin
+from common.sparse_fields import SparseFieldsetMixin
 
 from .documents import ProductDocument
+from .fragments import get_product_cards
 from .models import Product, Review, Answer
+from .pagination import SearchAfterPagination
 from .serializers import ReviewCreateSerializer
 from . import permissions
 
 User = get_user_model()
 
 
-class ProductListView(generics.ListAPIView):
-    serializer_class = ProductSerializer
-    ordering_fields = [
-        'timestamp', 'average_score', 'total_ordered_quantity',
-        'reviews_count', 'actual_price', 'discount', 'title', 'in_stock',
-        '-timestamp', '-average_score', '-total_ordered_quantity',
-        '-reviews_count', '-actual_price', '-discount', '-title', '-in_stock'
-    ]
+class ProductSearchMixin:
+    '''Filtering and full-text search of active products in Elasticsearch'''
+    range_operators = ('gte', 'lte', 'gt', 'lt')
     filter_fields = [
         'id', 'price__gte', 'price__lte', 'discount__gte', 'average_score__gte',
         'cosplay_character__name__exact', 'cosplay_character__fandom__name__exact',
@@ -43,20 +46,16 @@ class ProductListView(generics.ListAPIView):
         'seller.name', 'seller.organization_name'
     ]
 
-    def get_queryset(self):
+    def get_search(self):
         search_query = self.request.query_params.get('q', '')
-        order_by = self.request.query_params.get('ordering', '-total_ordered_quantity')
-        ordering = order_by if order_by in self.ordering_fields else '-total_ordered_quantity'
         filters = {k: v for k, v in self.request.query_params.items() if k in self.filter_fields}
 
-        search = ProductDocument.search().extra(size=1000)
+        search = ProductDocument.search().filter('term', is_active=True).source(False)
 
         # Filtering
         for field, value in filters.items():
-            if field in ['price__gte', 'price__lte',
-                         'discount__lte', 'discount__gte',
-                         'average_score__gte', 'average_score__lte']:
-                field_name, operator = field.rsplit('__', 1)
+            field_name, _, operator = field.rpartition('__')
+            if operator in self.range_operators:
                 search = search.filter('range', **{field_name: {operator: value}})
             else:
                 search = search.filter('term', **{field: value})
@@ -68,34 +67,177 @@ class ProductListView(generics.ListAPIView):
                                   fields=self.search_fields,
                                   fuzziness="auto")
 
-        results = search.execute()
-        product_ids = [hit.id for hit in results]
+        return search
+
+
+class ProductListView(SparseFieldsetMixin, ProductSearchMixin, generics.ListAPIView):
+    serializer_class = ProductSerializer
+    pagination_class = SearchAfterPagination
+    # Сортировка выполняется в Elasticsearch, id добавляется для однозначности курсора
+    sort_fields = {
+        'timestamp': 'timestamp',
+        'average_score': 'average_score',
+        'total_ordered_quantity': 'total_ordered_quantity',
+        'reviews_count': 'reviews_count',
+        'actual_price': 'price',
+        'price': 'price',
+        'discount': 'discount',
+        'title': 'title.exact',
+        'in_stock': 'in_stock',
+        'relevance': '_score',
+    }
+
+    def get_ordering(self):
+        search_query = self.request.query_params.get('q', '')
+        default_ordering = 'relevance' if search_query else '-total_ordered_quantity'
+        ordering = self.request.query_params.get('ordering', default_ordering)
+        if ordering.lstrip('-') not in self.sort_fields:
+            return default_ordering
+        return ordering
+
+    def get_sort(self, ordering):
+        field = self.sort_fields[ordering.lstrip('-')]
+        if field == '_score':
+            direction = 'asc' if ordering.startswith('-') else 'desc'
+        else:
+            direction = 'desc' if ordering.startswith('-') else 'asc'
+        return [{field: {'order': direction}}, {'timestamp': {'order': 'desc'}}, {'id': {'order': 'desc'}}]
+
+    def get_queryset(self):
+        return Product.objects.for_cards(
+            stats=self.needs_field('reviews_count', 'average_score', 'total_ordered_quantity'),
+            seller=self.needs_field('seller'),
+            character=self.needs_field('cosplay_character'),
+            fandom=self.needs_field('cosplay_character.fandom'),
+            images=self.needs_field('product_images'),
+        ).filter(is_active=True)
+
+    def list(self, request, *args, **kwargs):
+        ordering = self.get_ordering()
+        search = self.get_search().sort(*self.get_sort(ordering))
+
+        # Из Postgres загружаются только товары текущей страницы в порядке выдачи Elasticsearch
+        product_ids = self.paginator.paginate_search(search, request, ordering)
+        if self.get_sparse_fieldset() == (None, ()):
+            # Полные карточки собираются из общего кэша фрагментов
+            return self.paginator.get_paginated_response(get_product_cards(product_ids, request))
+
+        products = self.get_queryset().in_bulk(product_ids)
+        page = [products[product_id] for product_id in product_ids if product_id in products]
+
+        serializer = self.get_serializer(page, many=True)
+        return self.paginator.get_paginated_response(serializer.data)
+
+
+class ProductFacetsView(ProductSearchMixin, APIView):
+    '''Returns filter sidebar facets for the same query and filters as the product list'''
+    terms_facets = {
+        'product_types': 'product_type.exact',
+        'sizes': 'size.exact',
+        'shoes_sizes': 'shoes_size.exact',
+        'fandoms': 'cosplay_character.fandom.name.exact',
+        'fandom_types': 'cosplay_character.fandom.fandom_type',
+        'sellers': 'seller.name.exact',
+    }
+    price_interval = 1000
+    cache_timeout = 60 * 5
+
+    def get_cache_key(self):
+        params = {k: v for k, v in self.request.query_params.items() if k in self.filter_fields}
+        params['q'] = ' '.join(self.request.query_params.get('q', '').lower().split())
+        normalized_query = urlencode(sorted(params.items()))
+        return f'products:facets:{hashlib.md5(normalized_query.encode()).hexdigest()}'
+
+    def get(self, request):
+        cache_key = self.get_cache_key()
+        data = cache.get(cache_key)
+
+        if data is None:
+            search = self.get_search().extra(size=0, track_total_hits=True)
+            for name, field in self.terms_facets.items():
+                search.aggs.bucket(name, 'terms', field=field, size=50)
+            search.aggs.metric('price_stats', 'stats', field='price')
+            search.aggs.bucket('price_histogram', 'histogram', field='price',
+                               interval=self.price_interval, min_doc_count=1)
+
+            response = search.execute()
+            aggregations = response.aggregations
+            data = {'count': response.hits.total.value}
+            for name in self.terms_facets:
+                data[name] = [{'value': bucket.key, 'count': bucket.doc_count}
+                              for bucket in aggregations[name].buckets]
+            data['price'] = {
+                'min': aggregations.price_stats.min,
+                'max': aggregations.price_stats.max,
+                'histogram': [{'from': int(bucket.key), 'to': int(bucket.key) + self.price_interval,
+                               'count': bucket.doc_count}
+                              for bucket in aggregations.price_histogram.buckets],
+            }
+            cache.set(cache_key, data, self.cache_timeout)
+
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ProductSuggestView(APIView):
+    '''Search box suggestions by title, character and fandom prefix'''
+    max_prefix_length = 50
+    max_suggestions = 8
+    cache_timeout = 60 * 10
+
+    def get(self, request):
+        prefix = ' '.join(request.query_params.get('q', '').lower().split())[:self.max_prefix_length]
+        if not prefix:
+            return Response([], status=status.HTTP_200_OK)
+
+        # Популярные префиксы отдаются из Redis, не доходя до Elasticsearch
+        cache_key = f'products:suggest:{hashlib.md5(prefix.encode()).hexdigest()}'
+        data = cache.get(cache_key)
+
+        if data is None:
+            search = ProductDocument.search().extra(size=0).source(['id', 'title', 'slug'])
+            search = search.suggest('products', prefix, completion={
+                'field': 'suggest',
+                'size': self.max_suggestions,
+                'skip_duplicates': True,
+            })
+            response = search.execute()
+            data = [{
+                'text': option.text,
+                'id': option._source.id,
+                'title': option._source.title,
+                'slug': option._source.slug,
+            } for option in response.suggest.products[0].options]
+            cache.set(cache_key, data, self.cache_timeout)
+
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ProductBatchView(APIView):
+    '''Product cards by ids (?ids=1,2,3) in one request, in the requested order'''
+    max_ids = 50
+
+    def get(self, request):
+        try:
+            product_ids = list(dict.fromkeys(
+                int(product_id) for product_id in request.query_params.get('ids', '').split(',') if product_id
+            ))
+        except ValueError:
+            return Response({'ids': 'Expected a comma-separated list of product ids.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if len(product_ids) > self.max_ids:
+            return Response({'ids': f'No more than {self.max_ids} ids per request.'},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-        return Product.objects.select_related(
-            'seller', 'cosplay_character__fandom').annotate(
-            reviews_count=Count('reviews', distinct=True),
-            average_score=Coalesce(Avg('reviews__score'), 0, output_field=FloatField()),
-            total_ordered_quantity=Coalesce(Sum('ordered_products__quantity'), 0),
-            actual_price=Case(
-                When(discount__gt=0, then=F('price') - (F('price') * F('discount') / 100)),
-                default=F('price'),
-                output_field=FloatField()
-            )
-        ).prefetch_related('reviews', 'product_images'
-                           ).filter(is_active=True, pk__in=product_ids).order_by(ordering, '-timestamp')
+        return Response(get_product_cards(product_ids, request), status=status.HTTP_200_OK)
 
 
-class ProductDetailView(generics.RetrieveAPIView):
+class ProductDetailView(EagerLoadingMixin, generics.RetrieveAPIView):
     serializer_class = ProductDetailSerializer
-    queryset = Product.objects.select_related(
+    queryset = Product.objects.with_stats().select_related(
         'seller', 'cosplay_character__fandom',
     ).prefetch_related(
-        'reviews__customer', 'reviews__answers__seller',
-        'product_images', 'seller__employees') \
-        .annotate(
-        reviews_count=Count('reviews', distinct=True),
-        average_score=Coalesce(Avg('reviews__score'), 0, output_field=FloatField()),
-        total_ordered_quantity=Coalesce(Sum('ordered_products__quantity'), 0)
+        'reviews__customer', 'product_images'
     ).filter(is_active=True)
     lookup_field = 'slug'
 
@@ -110,7 +252,7 @@ class ReviewCreateView(generics.CreateAPIView):
         serializer.save(customer=user, product=product)
 
 
-class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ReviewDetailView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ReviewSerializer
     permission_classes = (permissions.IsAuthorOrAdminOrReadOnly,)
 
@@ -118,17 +260,18 @@ class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
         product = get_object_or_404(Product, pk=self.kwargs['product_id'])
 
         return Review.objects.select_related('product', 'customer'
-                                             ).prefetch_related('answers__seller'
+                                             ).prefetch_related('answers'
                                                                 ).filter(product=product)
 
 
-class AnswerDetailView(generics.RetrieveUpdateDestroyAPIView):
+class AnswerDetailView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = AnswerSerializer
     permission_classes = (permissions.IsSellerOrReadOnly,)
+    extra_eager_loading = ('seller__employees',)
 
     def get_queryset(self):
         product = get_object_or_404(Product, pk=self.kwargs['product_id'])
 
-        return Answer.objects.select_related('seller', 'review__product'
+        return Answer.objects.select_related('seller'
                                              ).prefetch_related('seller__employees'
                                                                 ).filter(review__product=product)
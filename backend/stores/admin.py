@@ -1,7 +1,8 @@
 from django.contrib import admin
 
-from .models import Store, Employee
+from .models import Store, Employee, StoreBalanceShard
 
 
 admin.site.register(Store)
 admin.site.register(Employee)
+admin.site.register(StoreBalanceShard)
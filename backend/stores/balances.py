@@ -0,0 +1,49 @@
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Store, StoreBalanceShard
+
+
+def get_amount_case(amounts, field='pk'):
+    return Case(*[When(**{field: key}, then=Value(amount)) for key, amount in amounts.items()],
+                default=Value(0), output_field=IntegerField())
+
+
+def credit_stores(amounts):
+    '''
+    Add {store_id: amount} to the stores with one UPDATE on a random shard.
+    Every payment credits the marketplace store with its commission, so a single balance
+    row would serialize all payments on its lock; concurrent payments land on different shards.
+    '''
+    amounts = {store_id: amount for store_id, amount in amounts.items() if amount}
+    if not amounts:
+        return
+
+    shard = random.randrange(settings.STORE_BALANCE_SHARDS)
+    # Шарды создаются при первом начислении, существующие INSERT пропускает без блокировки
+    StoreBalanceShard.objects.bulk_create(
+        [StoreBalanceShard(store_id=store_id, shard=shard) for store_id in amounts], ignore_conflicts=True)
+    StoreBalanceShard.objects.filter(store_id__in=amounts, shard=shard).update(
+        amount=F('amount') + get_amount_case(amounts, 'store_id'))
+
+
+def compact_store_balances(batch_size=1000):
+    '''Fold the credited shards into Store.balance, number of compacted shards'''
+    with transaction.atomic():
+        # Шарды, в которые прямо сейчас идёт начисление, пропускаются до следующего запуска
+        shards = list(StoreBalanceShard.objects.select_for_update(skip_locked=True).filter(
+            amount__gt=0).order_by('pk')[:batch_size])
+        if not shards:
+            return 0
+
+        amounts = defaultdict(int)
+        for shard in shards:
+            amounts[shard.store_id] += shard.amount
+        StoreBalanceShard.objects.filter(pk__in=[shard.pk for shard in shards]).update(amount=0)
+        Store.objects.filter(pk__in=amounts).update(balance=F('balance') + get_amount_case(amounts))
+
+    return len(shards)
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.5 on 2026-10-18 09:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0005_alter_store_logo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreBalanceShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('amount', models.PositiveIntegerField(default=0)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_shards', to='stores.store')),
+            ],
+            options={
+                'unique_together': {('store', 'shard')},
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models, transaction
+from django.db.models import Sum
 from django.core.validators import MinLengthValidator
 from django.utils.text import slugify
 
@@ -40,6 +41,13 @@ class Store(models.Model):
 
 	def __str__(self):
 		return self.name
+
+	def get_balance(self):
+		'''Compacted balance plus the credits still spread over the balance shards'''
+		pending_balance = getattr(self, 'pending_balance', None)
+		if pending_balance is None:
+			pending_balance = self.balance_shards.aggregate(total=Sum('amount'))['total'] or 0
+		return self.balance + pending_balance
 	
 	def save(self, *args, **kwargs):
 		if not self.slug:
@@ -68,4 +76,17 @@ class Employee(models.Model):
 	
 	class Meta:
 		unique_together = ('user', 'store')
-		ordering = ['-is_owner', '-is_admin', 'hired_at']
\ No newline at end of file
+		ordering = ['-is_owner', '-is_admin', 'hired_at']
+
+
+class StoreBalanceShard(models.Model):
+	'''Part of the store balance credited by payments, folded into Store.balance by compaction'''
+	store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='balance_shards')
+	shard = models.PositiveSmallIntegerField()
+	amount = models.PositiveIntegerField(default=0)
+
+	def __str__(self):
+		return f'{self.store.name} #{self.shard}: {self.amount}'
+
+	class Meta:
+		unique_together = ('store', 'shard')
@@ -4,6 +4,8 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
 from orders.serializers import OrderSimpleSerializer
+from common.compiled_serializers import CompiledListSerializer
+from common.sparse_fields import SparseFieldsetSerializerMixin
 from common.serializers import (
     ProductSerializer,
     ProductSimpleSerializer,
@@ -51,6 +53,7 @@ class StoreCreateSerializer(serializers.ModelSerializer):
 
 class StoreDetailPrivateSerializer(serializers.ModelSerializer):
     owner = serializers.SlugRelatedField(slug_field='username', read_only=True)
+    balance = serializers.IntegerField(source='get_balance', read_only=True)
 
     class Meta:
         model = Store
@@ -79,7 +82,7 @@ class StoreDetailPrivateSerializer(serializers.ModelSerializer):
         return value
         
 
-class StoreDetailPublicSerializer(serializers.ModelSerializer):
+class StoreDetailPublicSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     store_products = ProductSerializer(many=True)
     products_count = serializers.IntegerField()
     store_average_score = serializers.SerializerMethodField()
@@ -146,6 +149,7 @@ class StoreOrdersListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = OrderItem
+        list_serializer_class = CompiledListSerializer
         fields = ('id', 'slug', 'order', 'product', 'quantity', 
                   'price', 'total_price', 'status', 'created_at', 'updated_at')
         
@@ -156,6 +160,7 @@ class StoreTransactionsListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Transaction
+        list_serializer_class = CompiledListSerializer
         fields = ('id', 'uuid', 'transaction_type', 'amount',
                   'status', 'timestamp', 'related_order_item', 'store')
 
@@ -167,6 +172,7 @@ class AdminStoreTransactionsListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Transaction
+        list_serializer_class = CompiledListSerializer
         fields = ('id', 'uuid', 'transaction_type', 'amount', 'status', 'timestamp',
                   'related_order_item', 'related_seller', 'store')
         
@@ -184,6 +190,8 @@ class StoreProductListSerializer(ProductSerializer):
      
     class Meta:
         model = Product
+        list_serializer_class = CompiledListSerializer
+        eager_loading = ProductSerializer.Meta.eager_loading
         fields = ('id', 'slug', 'title', 'product_images', 'cosplay_character', 'seller',
 	              'price', 'real_price', 'discount', 'product_type', 'in_stock',
 				  'is_active', 'timestamp', 'reviews_count', 'average_score',
@@ -201,6 +209,7 @@ class StoreProductDetailSerializer(ProductDetailSerializer):
      
     class Meta:
         model = Product
+        eager_loading = ProductSerializer.Meta.eager_loading
         fields = ('id', 'slug', 'title', 'product_images', 'cosplay_character', 'seller',
 	              'price', 'real_price', 'discount', 'product_type', 'description', 
 				  'in_stock', 'is_active', 'size', 'shoes_size', 'timestamp', 'reviews_count',
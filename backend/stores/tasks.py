@@ -5,6 +5,8 @@ from backend.celery import app
 from twilio.rest import Client
 from orders.models import OrderItem, Order, ORDER_ITEM_STATUS_CHOICES
 
+from .balances import compact_store_balances
+
 
 def send_sms(message_body, to_phone_number):
     # Отправка SMS
@@ -110,4 +112,15 @@ def update_full_order_status(order_id):
     elif status_counts[4] == (len(order_item_statuses) - status_counts[0]):
         order.status = 4
 
-    order.save()
\ No newline at end of file
+    order.save()
+
+
+@app.task
+def compact_store_balance_shards(batch_size=1000):
+    # Начисления из шардов переносятся в Store.balance пачками
+    compacted = 0
+    while True:
+        count = compact_store_balances(batch_size)
+        compacted += count
+        if count < batch_size:
+            return compacted
@@ -0,0 +1,27 @@
+from django.test import TestCase
+
+from .balances import compact_store_balances, credit_stores
+from .models import StoreBalanceShard
+from common.testing import create_store, create_user
+
+
+class StoreBalanceTests(TestCase):
+    def setUp(self):
+        self.stores = [create_store(create_user(f'owner{number}'), f'Store {number}', number) for number in (1, 2)]
+
+    def test_credits_are_compacted_into_balance(self):
+        first, second = self.stores
+        credit_stores({first.pk: 100, second.pk: 0})
+        credit_stores({first.pk: 50, second.pk: 30})
+        self.assertFalse(StoreBalanceShard.objects.filter(store=second, amount=0).exists())
+
+        # Начисления лежат в шардах, пока компактизация не перенесёт их в Store.balance
+        first.refresh_from_db()
+        self.assertEqual((first.balance, first.get_balance()), (0, 150))
+        self.assertTrue(compact_store_balances())
+        self.assertFalse(StoreBalanceShard.objects.filter(amount__gt=0).exists())
+        self.assertEqual(compact_store_balances(), 0)
+
+        for store, balance in zip(self.stores, (150, 30)):
+            store.refresh_from_db()
+            self.assertEqual((store.balance, store.get_balance()), (balance, balance))
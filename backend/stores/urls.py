@@ -1,13 +1,14 @@
 from django.urls import path
 from . import views
+from common.cache import cache_response
 
 
 app_name = 'stores'
 
 urlpatterns = [    
-    path('', views.StoreListView.as_view(), name='store-list'),
+    path('', cache_response('stores')(views.StoreListView.as_view()), name='store-list'),
     path('create/', views.StoreCreateView.as_view(), name='store-create'),
-    path('<slug:slug>/', views.StoreDetailPublicView.as_view(), name='store-detail-public'),
+    path('<slug:slug>/', cache_response('stores')(views.StoreDetailPublicView.as_view()), name='store-detail-public'),
     path('<slug:slug>/edit/', views.StoreDetailPrivateView.as_view(), name='store-detail-private'),
     path('<slug:slug>/delete/', views.StoreDeleteView.as_view(), name='store-delete'),
     path('<slug:slug>/employees/', views.EmployeeListView.as_view(), name='employee-list'),
@@ -1,9 +1,9 @@
 from django.db import transaction
 from django.db.models import (
-    Count, Avg, Q, Prefetch, Sum, FloatField,
+    Count, Q, Prefetch, Sum, FloatField,
     F, ExpressionWrapper, IntegerField, Case, When
 )
-from django.db.models.functions import Coalesce
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.shortcuts import get_object_or_404
 
 from rest_framework import generics, status, filters, parsers
@@ -13,10 +13,15 @@ from rest_framework.decorators import api_view, permission_classes
 from django_filters.rest_framework import DjangoFilterBackend
 from django_elasticsearch_dsl.search import Search
 
+from products.fragments import get_product_cards
+from products.pagination import iter_search_ids
 from products.models import Product, Review, ProductImage
 from products.serializers import ProductCreateSerializer, AnswerCreateSerializer
 from orders.models import OrderItem, ORDER_ITEM_STATUS_CHOICES
 from cards.models import Transaction
+from common.eager_loading import EagerLoadingMixin
+from common.pagination import KeysetPagination
+from common.sparse_fields import SparseFieldsetMixin
 from common.serializers import StoreListSerializer
 
 from .models import Store, Employee
@@ -40,10 +45,12 @@ class StoreCreateView(generics.CreateAPIView):
         store = serializer.save(owner=user)
 
 
-class StoreDetailPrivateView(generics.RetrieveUpdateAPIView):
+class StoreDetailPrivateView(EagerLoadingMixin, generics.RetrieveUpdateAPIView):
     serializer_class = serializers.StoreDetailPrivateSerializer
     permission_classes = (permissions.IsOwnerOrStoreAdminOrAdminReadOnly,)
-    queryset = Store.objects.select_related('owner').all()
+    # Баланс складывается из Store.balance и ещё не свёрнутых шардов
+    queryset = Store.objects.select_related('owner').annotate(
+        pending_balance=Coalesce(Sum('balance_shards__amount'), 0)).all()
     lookup_field = 'slug'
 
 
@@ -81,27 +88,18 @@ class StoreDetailPublicView(generics.RetrieveAPIView):
         order_by = self.request.query_params.get('ordering', '-total_ordered_quantity')
         ordering = order_by if order_by in self.ordering_fields else '-total_ordered_quantity'
 
-        search = Search(index='products').extra(size=100)
-
         if search_query:
-            search = search.query("multi_match",
-                                  query=search_query,
-                                  fields=self.search_fields,
-                                  fuzziness="auto")
-        
-        results = search.execute()
-        product_ids = [hit.id for hit in results]
-
-        filters['pk__in'] = product_ids
+            # Все найденные товары магазина, курсором search_after, а не первые size попаданий
+            store_ids = Store.objects.filter(slug=self.kwargs['slug']).values_list('id', flat=True)[:1]
+            search = Search(index='products').filter('terms', **{'seller.id': list(store_ids)}).query(
+                "multi_match", query=search_query, fields=self.search_fields, fuzziness="auto")
+            filters['pk__in'] = list(iter_search_ids(search))
 
         return Store.objects.prefetch_related(
             Prefetch(
                 'store_products',
-                queryset=Product.objects.select_related('seller', 'cosplay_character__fandom'
-                    ).prefetch_related('product_images').annotate(
-                        reviews_count=Count('reviews', distinct=True),
-                        average_score=Coalesce(Avg('reviews__score'), 0, output_field=FloatField()),
-                        total_ordered_quantity=Coalesce(Sum('ordered_products__quantity'), 0),
+                # Нужны только id (и внешний ключ для prefetch) для сортировки и пагинации, карточки берутся из кэша фрагментов
+                queryset=Product.objects.with_stats().only('id', 'seller').annotate(
                         actual_price=Case( 
                             When(discount__gt=0, then=F('price') - (F('price') * F('discount') / 100)),
                             default=F('price'),
@@ -111,7 +109,8 @@ class StoreDetailPublicView(generics.RetrieveAPIView):
             )
             ).annotate(
                 products_count=Count('store_products', filter=Q(store_products__is_active=True)),
-                store_average_score=Avg('store_products__reviews__score')
+                store_average_score=Cast(Sum('store_products__stats__score_sum'), FloatField()) / NullIf(
+                    Sum('store_products__stats__reviews_count'), 0)
             ).all()
     
     def get(self, request, *args, **kwargs):
@@ -120,29 +119,46 @@ class StoreDetailPublicView(generics.RetrieveAPIView):
 
         page = self.paginate_queryset(products)
         if page is not None:
-            serializer = serializers.StoreDetailPublicSerializer(self.object)
+            serializer = serializers.StoreDetailPublicSerializer(self.object, omit=('store_products',),
+                                                                 context={'request': request})
             data = serializer.data
-            data['store_products'] = serializers.ProductSerializer(page, many=True).data
+            data['store_products'] = get_product_cards([product.id for product in page], request)
             return self.get_paginated_response(data)
 
-        serializer = serializers.StoreDetailPublicSerializer(self.object, context={'request': request})
-        return Response(serializer.data)
+        serializer = serializers.StoreDetailPublicSerializer(self.object, omit=('store_products',),
+                                                             context={'request': request})
+        data = serializer.data
+        data['store_products'] = get_product_cards([product.id for product in products], request)
+        return Response(data)
     
 
-class StoreListView(generics.ListAPIView):
+class StoreListView(SparseFieldsetMixin, EagerLoadingMixin, generics.ListAPIView):
     serializer_class = StoreListSerializer
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter)
     filterset_fields = {'is_verified': ['exact'], 'organization_type': ['exact']}
     ordering = ['-is_admin_store', '-is_verified', 'name']
     ordering_fields = ['is_verified', 'name', 'products_count', 'store_average_score']
     search_fields = ['name', 'organization_name']
-    queryset = Store.objects.annotate(
-        products_count=Count('store_products', filter=Q(store_products__is_active=True)),
-        store_average_score=Coalesce(Avg('store_products__reviews__score'), 0, output_field=FloatField())).all()
+
+    def get_queryset(self):
+        # Агрегаты считаются, только если они попадают в ответ или в сортировку
+        ordering = self.request.query_params.get(filters.OrderingFilter.ordering_param, '')
+        ordering_fields = {field.strip().lstrip('-') for field in ordering.split(',')}
+        queryset = Store.objects.all()
+        if self.needs_field('products_count') or 'products_count' in ordering_fields:
+            queryset = queryset.annotate(
+                products_count=Count('store_products', filter=Q(store_products__is_active=True)))
+        if self.needs_field('store_average_score') or 'store_average_score' in ordering_fields:
+            queryset = queryset.annotate(store_average_score=Coalesce(
+                Cast(Sum('store_products__stats__score_sum'), FloatField()) / NullIf(
+                    Sum('store_products__stats__reviews_count'), 0),
+                0, output_field=FloatField()))
+        return queryset
     
 
-class StoreTransactionListView(generics.ListAPIView):
+class StoreTransactionListView(EagerLoadingMixin, generics.ListAPIView):
     permission_classes = (permissions.IsEmployee,)
+    pagination_class = KeysetPagination
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
     filterset_fields = {
         'transaction_type': ['exact'],
@@ -152,18 +168,18 @@ class StoreTransactionListView(generics.ListAPIView):
     ordering = ['-timestamp']
     ordering_fields = ['amount', 'timestamp', 'status', 'transaction_type']
 
+    @property
+    def keyset_ordering(self):
+        # OR-фильтр магазина площадки индекс transaction_seller_keyset_idx не покрывает, там только страницы
+        return None if self.store.is_admin_store else ('-timestamp', '-id')
+
     def get_queryset(self):
         store = self.store
+        # Связи для сериализатора добавляет EagerLoadingMixin
         if store.is_admin_store:
-            return Transaction.objects.select_related(
-                'card__user', 'related_order_item__product__cosplay_character__fandom', 'related_seller'
-                ).prefetch_related('related_order_item__product__product_images'
-                ).filter(Q(related_seller=store) | Q(transaction_type="Comission"))
+            return Transaction.objects.filter(Q(related_seller=store) | Q(transaction_type="Comission"))
         else:
-            return Transaction.objects.select_related(
-                'card__user', 'related_order_item__product__cosplay_character__fandom', 'related_seller'
-                ).prefetch_related('related_order_item__product__product_images'
-                ).filter(related_seller=store)
+            return Transaction.objects.filter(related_seller=store)
 
     def get_serializer_class(self, *args, **kwargs):
         store = self.store
@@ -187,7 +203,7 @@ class EmployeeCreateView(generics.CreateAPIView):
         new_employee = serializer.save(store=store)
 
 
-class EmployeeListView(generics.ListAPIView):
+class EmployeeListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = serializers.EmployeeSerializer
     permission_classes = (permissions.IsEmployee,)
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter)
@@ -205,7 +221,7 @@ class EmployeeListView(generics.ListAPIView):
             'user', 'store').filter(store=store)
     
 
-class EmployeeDetailView(generics.RetrieveUpdateDestroyAPIView):
+class EmployeeDetailView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = serializers.EmployeeSerializer
     permission_classes = (permissions.IsOwnerOrStoreAdminOrEmployeeReadOnly,)
     lookup_field = 'user__username'
@@ -216,7 +232,7 @@ class EmployeeDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Employee.objects.select_related('user', 'store').filter(store=store)
     
 
-class StoreOrderListView(generics.ListAPIView):
+class StoreOrderListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = serializers.StoreOrdersListSerializer
     permission_classes = (permissions.IsEmployee,)
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
@@ -239,7 +255,7 @@ class StoreOrderListView(generics.ListAPIView):
                     F('price') * F('quantity'), output_field=IntegerField()))
 
 
-class StoreProductListView(generics.ListAPIView):
+class StoreProductListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = serializers.StoreProductListSerializer
     permission_classes = (permissions.IsEmployee,)
     filter_backends = (filters.OrderingFilter,)
@@ -275,23 +291,13 @@ class StoreProductListView(generics.ListAPIView):
         search_query = self.request.query_params.get('q', '')
         filters = {k: v for k, v in self.request.query_params.items() if k in self.filter_fields}
 
-        search = Search(index='products').extra(size=1000)
-
         if search_query:
-            search = search.query("multi_match",
-                                  query=search_query,
-                                  fields=self.search_fields,
-                                  fuzziness="auto")
-        
-        results = search.execute()
-        product_ids = [hit.id for hit in results]
-        filters['pk__in'] = product_ids
+            search = Search(index='products').filter('term', **{'seller.id': store.pk}).query(
+                "multi_match", query=search_query, fields=self.search_fields, fuzziness="auto")
+            filters['pk__in'] = list(iter_search_ids(search))
 
-        return Product.objects.select_related('cosplay_character__fandom', 'seller'
+        return Product.objects.with_stats().select_related('cosplay_character__fandom', 'seller'
             ).prefetch_related('product_images').annotate(
-                reviews_count=Count('reviews', distinct=True),
-                average_score=Coalesce(Avg('reviews__score'), 0, output_field=FloatField()),
-                total_ordered_quantity=Coalesce(Sum('ordered_products__quantity'), 0),
                 total_orders=Count('ordered_products'),
                 total_orders_done=Count('ordered_products', filter=Q(ordered_products__status=5)),
                 total_orders_processing=Count('ordered_products', filter=Q(ordered_products__status__in=[1, 2, 3, 4])),
@@ -304,23 +310,19 @@ class StoreProductListView(generics.ListAPIView):
             ).filter(seller=store, **filters)
     
 
-class StoreProductDetailView(generics.RetrieveUpdateDestroyAPIView):
+class StoreProductDetailView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = serializers.StoreProductDetailSerializer
     permission_classes = (permissions.IsOwnerOrStoreAdminOrEmployeeRetrieveUpdateOnly,)
     lookup_field = 'slug'
 
     def get_queryset(self):
         store = self.store
-        return Product.objects.select_related('cosplay_character__fandom', 'seller'
+        return Product.objects.with_stats().select_related('cosplay_character__fandom', 'seller'
                 ).prefetch_related('reviews__customer',
-                                   'reviews__answers__seller', 
                                    'product_images',
                                    'ordered_products'
                 ).annotate(
-                    reviews_count=Count('reviews', distinct=True),
-                    average_score=Coalesce(Avg('reviews__score'), 0, output_field=FloatField()),
                     total_orders=Count('ordered_products'),
-                    total_ordered_quantity=Coalesce(Sum('ordered_products__quantity'), 0),
                     total_orders_done=Count('ordered_products', filter=Q(ordered_products__status=5)),
                     total_orders_processing=Count('ordered_products', filter=Q(ordered_products__status__in=[1, 2, 3, 4])),
                     total_orders_cancelled=Count('ordered_products', filter=Q(ordered_products__status=0))
@@ -4,6 +4,7 @@ from rest_framework import generics, filters
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 
+from common.eager_loading import EagerLoadingMixin
 from stores.models import Employee
 from common.serializers import UserSimpleSerializer
 
@@ -14,7 +15,7 @@ from .models import Address
 
 User = get_user_model()
 
-class UserListView(generics.ListAPIView):
+class UserListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = UserSimpleSerializer
     queryset = User.objects.filter(is_active=True)
     filter_backends = (filters.OrderingFilter, filters.SearchFilter)
@@ -22,7 +23,7 @@ class UserListView(generics.ListAPIView):
     ordering = ['username']
 
 
-class InactiveUserListView(generics.ListAPIView):
+class InactiveUserListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = UserSimpleSerializer
     queryset = User.objects.filter(is_active=False)
     permission_classes = (IsAdminUser,)
@@ -43,7 +44,7 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
         return serializers.UserDetailPublicSerializer
 
 
-class InactiveUserDetailView(generics.RetrieveUpdateDestroyAPIView):
+class InactiveUserDetailView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = serializers.UserDetailPrivateSerializer
     permission_classes = (IsAdminUser,)
     queryset = User.objects.filter(is_active=False)
@@ -59,24 +60,25 @@ class AddressCreateView(generics.CreateAPIView):
         serializer.save(user=user) 
 
 
-class AddressListView(generics.ListAPIView):
+class AddressListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = serializers.AddressSerializer
     permission_classes = (IsAuthenticated,)
     ordering = ['created_at']
 
     def get_queryset(self):
         user = self.request.user
-        return Address.objects.select_related('user').filter(user=user)
+        return Address.objects.filter(user=user)
     
 
-class AddressDetailView(generics.RetrieveUpdateDestroyAPIView):
+class AddressDetailView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = serializers.AddressSerializer
     queryset = Address.objects.select_related('user').all()
     permission_classes = (IsOwner,)
     lookup_field = 'uuid'
+    extra_eager_loading = ('user',)
 
 
-class UserStoresListView(generics.ListAPIView):
+class UserStoresListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = serializers.UserStoresListSerializer
     permission_classes = (IsAuthenticated,)
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter)